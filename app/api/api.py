@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.endpoints import fipe, infracoes
+from app.api.endpoints import admin, fipe, infracoes
 from app.core.config import settings
 
 api_router = APIRouter()
@@ -23,6 +23,7 @@ def api_v1_root():
                 "listar": "/api/v1/infracoes/",
                 "pesquisar": "/api/v1/infracoes/pesquisa",
                 "detalhe": "/api/v1/infracoes/{codigo}",
+                "lote": "/api/v1/infracoes/lote",
             },
             "fipe": {
                 "marcas": "/api/v1/fipe/marcas?tipo=cars",
@@ -30,6 +31,13 @@ def api_v1_root():
                 "anos": "/api/v1/fipe/anos?marca=Audi&modelo=A3&tipo=cars",
                 "ipva": "/api/v1/fipe/ipva?estado=SP&marca=Audi&modelo=A3&ano=2020&tipo=cars",
             },
+            "admin": {
+                "importar_dataset": "/api/v1/admin/dataset/importar",
+                "consultas_lentas": "/api/v1/admin/busca/consultas-lentas",
+                "etapas_busca": "/api/v1/admin/busca/etapas",
+                "profiler": "/api/v1/admin/profiler",
+                "alocacoes": "/api/v1/admin/memoria/alocacoes",
+            },
             "sistema": {"health_check": "/health", "root": "/"},
         },
         "documentacao": "/docs",
@@ -48,3 +56,9 @@ api_router.include_router(
     prefix="/fipe",
     tags=["fipe"],
 )
+
+api_router.include_router(
+    admin.router,
+    prefix="/admin",
+    tags=["admin"],
+)
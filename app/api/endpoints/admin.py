@@ -0,0 +1,166 @@
+import secrets
+from pathlib import Path
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.core import alocacoes
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.profiler import ProfilerOcupado, perfilar
+from app.db.database import get_db
+from app.db.ingest import MODOS_IMPORTACAO, TAMANHO_LOTE_PADRAO, importar_csv
+from app.search import timing
+
+
+def verificar_admin_key(x_admin_key: str = Header("")):
+    """Valida a chave administrativa (endpoints desabilitados sem ADMIN_API_KEY)."""
+    if not settings.ADMIN_API_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Administração desabilitada"
+        )
+    if not secrets.compare_digest(x_admin_key.encode(), settings.ADMIN_API_KEY.encode()):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso negado")
+
+
+router = APIRouter(
+    tags=["admin"],
+    dependencies=[Depends(verificar_admin_key)],
+    responses={
+        403: {"description": "Chave administrativa inválida"},
+        404: {"description": "Administração desabilitada"},
+    },
+)
+
+
+@router.post(
+    "/dataset/importar",
+    summary="Importar catálogo do CSV",
+    description=(
+        "Carrega o CSV configurado em DATASET_CSV_PATH para a tabela de infrações "
+        "em uma transação e reconstrói o índice de busca uma única vez."
+    ),
+)
+def importar_dataset(
+    modo: str = Query("upsert", description="upsert ou substituir"),
+    lote: int = Query(TAMANHO_LOTE_PADRAO, ge=100, le=50000, description="Linhas por lote"),
+    db: Session = Depends(get_db)
+):
+    """Importa o CSV do servidor (o arquivo não é enviado no corpo: ~5MB > limite de request)."""
+    if modo not in MODOS_IMPORTACAO:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Modo inválido. Use: upsert ou substituir"
+        )
+
+    caminho = Path(settings.DATASET_CSV_PATH)
+    if not caminho.is_file():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Arquivo do dataset não encontrado: {caminho.name}"
+        )
+
+    try:
+        return importar_csv(db, caminho, modo=modo, tamanho_lote=lote)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except SQLAlchemyError as e:
+        logger.error(f"Erro no banco de dados ao importar dataset: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Erro ao acessar o banco de dados. Por favor, tente novamente mais tarde."
+        )
+
+
+@router.get(
+    "/busca/consultas-lentas",
+    summary="Consultas de busca lentas",
+    description=(
+        "Últimas buscas acima de SEARCH_SLOW_QUERY_MS (mais recentes primeiro), "
+        "com o tempo de cada etapa e as expansões usadas na consulta."
+    ),
+)
+def consultas_lentas(limite: int = Query(50, ge=1, le=1000, description="Máximo de consultas")):
+    return timing.consultas_lentas(limite)
+
+
+@router.get(
+    "/busca/etapas",
+    summary="Tempos por etapa da busca",
+    description="Percentis de cada etapa de /pesquisa, /smart e /autocomplete na janela pedida.",
+)
+def etapas_busca(
+    janela: Optional[int] = Query(None, ge=1, description="Segundos (padrão: METRICS_WINDOW_SECONDS)")
+):
+    return {
+        "window_seconds": min(janela or settings.METRICS_WINDOW_SECONDS, settings.METRICS_WINDOW_SECONDS),
+        "etapas": timing.resumo_etapas(janela),
+    }
+
+
+@router.post(
+    "/profiler",
+    response_class=PlainTextResponse,
+    summary="Profiler por amostragem",
+    description=(
+        "Amostra as pilhas de todas as threads deste worker por N segundos e devolve "
+        "o resultado no formato collapsed (flamegraph.pl, speedscope). Uma coleta por vez."
+    ),
+    responses={409: {"description": "Coleta já em andamento"}},
+)
+def executar_profiler(
+    segundos: float = Query(10, gt=0, le=60, description="Duração da coleta"),
+    intervalo_ms: float = Query(10, ge=1, le=1000, description="Intervalo entre amostras"),
+    linhas: bool = Query(False, description="Separar frames por linha de código"),
+    incluir_ociosas: bool = Query(False, description="Incluir threads esperando I/O ou trabalho"),
+):
+    """Bloqueia uma thread do threadpool durante a coleta; a thread do próprio request é ignorada."""
+    try:
+        amostrador = perfilar(segundos, intervalo_ms / 1000, linhas=linhas, incluir_ociosas=incluir_ociosas)
+    except ProfilerOcupado as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+    logger.info(f"Profiler: {amostrador.amostras} amostras em {segundos}s, {len(amostrador.pilhas)} pilhas distintas")
+    return PlainTextResponse(
+        amostrador.collapsed(),
+        headers={
+            "X-Profiler-Samples": str(amostrador.amostras),
+            "X-Profiler-Interval-Ms": f"{intervalo_ms:g}",
+        },
+    )
+
+
+@router.post(
+    "/memoria/alocacoes",
+    summary="Diff de alocações (tracemalloc)",
+    description=(
+        "Liga o tracemalloc se necessário, compara dois snapshots tirados com N segundos "
+        "de intervalo e devolve os pontos de alocação que mais cresceram, por arquivo:linha "
+        "e por subsistema. Se o rastreamento foi ligado aqui, é desligado ao final."
+    ),
+    responses={409: {"description": "Comparação já em andamento"}},
+)
+def diff_alocacoes(
+    segundos: float = Query(10, gt=0, le=300, description="Intervalo entre os snapshots"),
+    top: int = Query(30, ge=1, le=200, description="Pontos de alocação retornados"),
+    manter: bool = Query(False, description="Manter o rastreamento ligado ao final"),
+):
+    try:
+        return alocacoes.diff_alocacoes(segundos, top=top, manter=manter)
+    except alocacoes.RastreamentoOcupado as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.get("/memoria/rastreamento", summary="Estado do tracemalloc")
+def estado_rastreamento():
+    return alocacoes.estado()
+
+
+@router.delete("/memoria/rastreamento", summary="Desligar o tracemalloc")
+def parar_rastreamento():
+    alocacoes.parar()
+    return alocacoes.estado()
@@ -1,5 +1,6 @@
-from fastapi import APIRouter, HTTPException, Query, status
+from fastapi import APIRouter, HTTPException, Query, Request, status
 
+from app.core import response_cache
 from app.fipe.database import FipeDB
 from app.fipe.ipva import ALIQUOTAS_IPVA, calcular_ipva
 
@@ -26,12 +27,17 @@ def _validar_tipo(tipo: str) -> str:
 
 
 @router.get("/marcas")
-def listar_marcas(tipo: str = Query("cars", description="cars, motorcycles ou trucks")):
+def listar_marcas(request: Request, tipo: str = Query("cars", description="cars, motorcycles ou trucks")):
     tipo = _validar_tipo(tipo)
-    db = FipeDB()
-    rows = db.listar_marcas(tipo=tipo)
-    marcas = [r.get("marca") for r in rows if r.get("marca")]
-    return {"tipo": tipo, "total": len(marcas), "marcas": marcas}
+    # Tabela FIPE só muda quando o crawler roda; o TTL do cache "api" limita a defasagem
+    chave = response_cache.chave_resposta("fipe_marcas", "fipe", tipo=tipo)
+    entrada = response_cache.obter(chave)
+    if entrada is None:
+        db = FipeDB()
+        rows = db.listar_marcas(tipo=tipo)
+        marcas = [r.get("marca") for r in rows if r.get("marca")]
+        entrada = response_cache.armazenar(chave, {"tipo": tipo, "total": len(marcas), "marcas": marcas})
+    return response_cache.responder(request, entrada)
 
 
 @router.get("/modelos")
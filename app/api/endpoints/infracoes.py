@@ -1,18 +1,35 @@
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Sequence
 from functools import lru_cache
+import csv
+import io
+import json
 import re
 import time
+import zlib
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, Query, Path, HTTPException, status, Response, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.db.database import get_db
 from app.models.infracao_model import InfracaoModel
-from app.schemas.infracao_schema import InfracaoPesquisaResponse, InfracaoSchema
+from app.schemas.infracao_schema import (
+    InfracaoPesquisaResponse,
+    InfracaoSchema,
+    InfracaoLoteRequest,
+    InfracaoLoteResponse,
+    InfracaoLoteAgregado,
+)
 from app.services import search_service
+from app.search.in_memory import ORDENACOES, get_dataset_version, get_index
+from app.core.compressao import codificacoes_aceitas
+from app.core.http_cache import cabecalhos_cache, etag_corresponde, gerar_etag, nao_modificado
+from app.core import response_cache
+from app.search import analytics
+from app.search.timing import medir_busca
 from app.core.logger import logger
 
 # Constantes
@@ -21,6 +38,15 @@ CACHE_TTL_LISTA = 300  # 5 minutos
 CACHE_TTL_DETALHE = 3600  # 1 hora
 MAX_QUERY_LENGTH = 200
 MIN_QUERY_LENGTH = 2
+EXPORT_CHUNK_ROWS = 500
+EXPORT_CAMPOS = (
+    "codigo", "descricao", "responsavel", "valor_multa",
+    "orgao_autuador", "artigos_ctb", "pontos", "gravidade",
+)
+EXPORT_FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
 
 router = APIRouter(
     tags=["infrações"],
@@ -119,6 +145,14 @@ def validar_parametros_paginacao(skip: int, limit: int) -> None:
             detail="O parâmetro 'limit' não pode ser maior que 100"
         )
 
+def validar_ordenacao(ordenar: str) -> None:
+    """Valida o critério de ordenação dos resultados."""
+    if ordenar not in ORDENACOES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Ordenação inválida. Use uma de: {', '.join(ORDENACOES)}"
+        )
+
 def validar_dados_infracao(infracao: InfracaoSchema) -> None:
     """Valida os dados de uma infração."""
     if not infracao.codigo or len(infracao.codigo) < 4:
@@ -169,6 +203,14 @@ def validar_dados_infracao(infracao: InfracaoSchema) -> None:
             detail="Gravidade deve ter pelo menos 3 caracteres"
         )
 
+def limite_pontos_suspensao(gravissimas: int) -> int:
+    """Limite de pontos em 12 meses para suspensão da CNH (art. 261, I, do CTB)."""
+    if gravissimas >= 2:
+        return 20
+    if gravissimas == 1:
+        return 30
+    return 40
+
 def registrar_metrica(request: Request, inicio: float, endpoint: str) -> None:
     """Registra métricas de tempo de resposta e uso."""
     tempo_resposta = time.time() - inicio
@@ -221,6 +263,41 @@ def processar_resultados(result: Any) -> Tuple[List[Dict[str, Any]], int]:
         
     return resultados, len(resultados)
 
+def gerar_export(docs: Sequence[Any], formato: str, comprimir: bool) -> Iterator[bytes]:
+    """
+    Gera o catálogo em blocos de EXPORT_CHUNK_ROWS linhas.
+
+    Memória constante: cada bloco é serializado, (opcionalmente) comprimido com
+    sync flush e descartado. `docs` é a lista do índice capturada no início,
+    então um rebuild concorrente não mistura versões no meio do download.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None  # wbits=31 -> gzip
+
+    def _saida(dados: bytes) -> bytes:
+        if compressor is None:
+            return dados
+        return compressor.compress(dados) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n") if formato == "csv" else None
+    if writer is not None:
+        writer.writerow(EXPORT_CAMPOS)
+
+    for inicio in range(0, len(docs), EXPORT_CHUNK_ROWS):
+        for d in docs[inicio:inicio + EXPORT_CHUNK_ROWS]:
+            valores = [getattr(d, campo) for campo in EXPORT_CAMPOS]
+            if writer is not None:
+                writer.writerow(valores)
+            else:
+                buffer.write(json.dumps(dict(zip(EXPORT_CAMPOS, valores)), ensure_ascii=False))
+                buffer.write("\n")
+        yield _saida(buffer.getvalue().encode("utf-8"))
+        buffer.seek(0)
+        buffer.truncate()
+
+    if compressor is not None:
+        yield compressor.flush()
+
 @lru_cache(maxsize=MAX_CACHE_SIZE)
 def converter_row_para_schema(
     codigo: str,
@@ -323,13 +400,16 @@ def listar_infracoes(
     inicio = time.time()
     try:
         validar_parametros_paginacao(skip, limit)
+
+        etag = gerar_etag(get_dataset_version(db), "listar", skip, limit)
+        if etag_corresponde(request, etag):
+            return nao_modificado(etag, CACHE_TTL_LISTA)
         
         sql = f"{SQL_SELECT_INFRACOES} ORDER BY \"Código de Infração\" LIMIT :limit OFFSET :skip"
         result = db.execute(text(sql), {"limit": limit, "skip": skip})
         
         # Adiciona cache headers
-        response.headers["Cache-Control"] = f"public, max-age={CACHE_TTL_LISTA}"
-        response.headers["Vary"] = "Accept-Encoding"
+        response.headers.update(cabecalhos_cache(etag, CACHE_TTL_LISTA))
         
         infracoes = [converter_row_objeto(row) for row in result]
         registrar_metrica(request, inicio, "listar_infracoes")
@@ -384,41 +464,64 @@ def pesquisar(
     query: Optional[str] = Query(None, min_length=MIN_QUERY_LENGTH, max_length=MAX_QUERY_LENGTH, description="Termo de pesquisa"),
     skip: int = Query(0, ge=0, description="Número de registros para pular"),
     limit: int = Query(10, gt=0, le=100, description="Número máximo de registros para retornar"),
-    db: Session = Depends(get_db),
-    response: Response = None
+    ordenar: str = Query("relevancia", description=f"Ordenação: {', '.join(ORDENACOES)}"),
+    db: Session = Depends(get_db)
 ):
     """Pesquisa infrações por código ou descrição. Aceita tanto 'q' quanto 'query' como parâmetros de pesquisa."""
     inicio = time.time()
+    # Usar 'q' se fornecido, senão usar 'query'
+    search_term = q if q is not None else query
     try:
-        # Usar 'q' se fornecido, senão usar 'query'
-        search_term = q if q is not None else query
-        
-        # Verificar se pelo menos um dos parâmetros de pesquisa foi fornecido
-        if search_term is None:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="O termo de pesquisa é obrigatório (use 'q' ou 'query')"
+        with medir_busca("pesquisa", search_term) as tempos:
+            # Verificar se pelo menos um dos parâmetros de pesquisa foi fornecido
+            if search_term is None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="O termo de pesquisa é obrigatório (use 'q' ou 'query')"
+                )
+
+            with tempos.etapa("validacao"):
+                validar_parametros_paginacao(skip, limit)
+                validar_query_pesquisa(search_term)
+                validar_ordenacao(ordenar)
+
+            # Termo normalizado como a busca o enxerga: "Alcool " e "alcool" compartilham a ETag
+            termo_normalizado = " ".join(search_term.lower().split())
+            with tempos.etapa("indice"):
+                versao = get_dataset_version(db)
+            etag = gerar_etag(versao, "pesquisa", termo_normalizado, skip, limit, ordenar)
+            if etag_corresponde(request, etag):
+                return tempos.aplicar(nao_modificado(etag, CACHE_TTL_LISTA))
+
+            # Corpo já serializado e comprimido de uma pesquisa idêntica
+            with tempos.etapa("cache"):
+                chave = response_cache.chave_resposta(
+                    "pesquisa", versao, q=search_term, skip=skip, limit=limit, ordenar=ordenar
+                )
+                entrada = response_cache.obter(chave)
+            if entrada is not None:
+                analytics.registrar_query(search_term, entrada.meta.get("total", 0), (time.time() - inicio) * 1000)
+                registrar_metrica(request, inicio, "pesquisar")
+                return tempos.aplicar(
+                    response_cache.responder(request, entrada, cabecalhos_cache(etag, CACHE_TTL_LISTA))
+                )
+
+            resultado = search_service.pesquisar_infracoes(search_term, limit=limit, skip=skip, db=db, ordenar=ordenar)
+
+            with tempos.etapa("conversao"):
+                resultado_pesquisa = InfracaoPesquisaResponse(
+                    resultados=[converter_dict_para_schema(item) for item in resultado.get("resultados", [])],
+                    total=resultado.get("total", 0),
+                    mensagem=resultado.get("mensagem"),
+                    sugestao=resultado.get("sugestao")
+                )
+            with tempos.etapa("serializacao"):
+                entrada = response_cache.armazenar(chave, resultado_pesquisa, meta={"total": resultado_pesquisa.total})
+
+            registrar_metrica(request, inicio, "pesquisar")
+            return tempos.aplicar(
+                response_cache.responder(request, entrada, cabecalhos_cache(etag, CACHE_TTL_LISTA))
             )
-        
-        validar_parametros_paginacao(skip, limit)
-        validar_query_pesquisa(search_term)
-        
-        resultado = search_service.pesquisar_infracoes(search_term, limit=limit, skip=skip, db=db)
-        
-        # Adiciona cache headers
-        if response:
-            response.headers["Cache-Control"] = f"public, max-age={CACHE_TTL_LISTA}"
-            response.headers["Vary"] = "Accept-Encoding"
-        
-        resultado_pesquisa = InfracaoPesquisaResponse(
-            resultados=[converter_dict_para_schema(item) for item in resultado.get("resultados", [])],
-            total=resultado.get("total", 0),
-            mensagem=resultado.get("mensagem"),
-            sugestao=resultado.get("sugestao")
-        )
-        
-        registrar_metrica(request, inicio, "pesquisar")
-        return resultado_pesquisa
 
     except SQLAlchemyError as e:
         logger.error(f"Erro ao pesquisar infrações: {str(e)}")
@@ -456,130 +559,66 @@ def explorador_infracoes(
     pontos_min: Optional[int] = Query(None, ge=0, le=20, description="Pontos mínimos"),
     pontos_max: Optional[int] = Query(None, ge=0, le=20, description="Pontos máximos"),
     busca: Optional[str] = Query(None, description="Busca textual na descrição"),
+    ordenar: str = Query("gravidade", description=f"Ordenação: {', '.join(ORDENACOES)}"),
     db: Session = Depends(get_db)
 ):
     """Explorador com filtros e paginação"""
     inicio = time.time()
     try:
         validar_parametros_paginacao(skip, limit)
+        validar_ordenacao(ordenar)
 
-        # Criar filtros (apenas com valores válidos)
-        filtros = {}
-        if gravidade:
-            filtros["gravidade"] = gravidade
-        if responsavel:
-            filtros["responsavel"] = responsavel
-        if orgao:
-            filtros["orgao"] = orgao
-        if pontos_min is not None:
-            filtros["pontos_min"] = pontos_min
-        if pontos_max is not None:
-            filtros["pontos_max"] = pontos_max
-        if busca:
-            filtros["busca"] = busca
-
-        # SEMPRE usar ordenação por gravidade
-        from sqlalchemy import text
-
-        # Construir WHERE clause se há filtros
-        where_conditions = []
-        params = {"limit": limit, "skip": skip}
-
-        if filtros.get("gravidade"):
-            where_conditions.append("\"Gravidade\" LIKE :gravidade")
-            params["gravidade"] = f"%{filtros['gravidade']}%"
-
-        if filtros.get("responsavel"):
-            where_conditions.append("\"Responsável\" LIKE :responsavel")
-            params["responsavel"] = f"%{filtros['responsavel']}%"
-
-        if filtros.get("orgao"):
-            where_conditions.append("\"Órgão Autuador\" LIKE :orgao")
-            params["orgao"] = f"%{filtros['orgao']}%"
-
-        if filtros.get("busca"):
-            where_conditions.append("\"Infração\" LIKE :busca")
-            params["busca"] = f"%{filtros['busca']}%"
-
-        if filtros.get("pontos_min") is not None:
-            where_conditions.append("CAST(\"Pontos\" AS INTEGER) >= :pontos_min")
-            params["pontos_min"] = filtros["pontos_min"]
-
-        if filtros.get("pontos_max") is not None:
-            where_conditions.append("CAST(\"Pontos\" AS INTEGER) <= :pontos_max")
-            params["pontos_max"] = filtros["pontos_max"]
-
-        where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
-
-        # Query sempre com ordenação por gravidade
-        sql_query = f"""
-        SELECT
-            "Código de Infração" as codigo,
-            "Infração" as descricao,
-            "Responsável" as responsavel,
-            "Valor da multa" as valor_multa,
-            "Órgão Autuador" as orgao_autuador,
-            "Artigos do CTB" as artigos_ctb,
-            "Pontos" as pontos,
-            "Gravidade" as gravidade
-        FROM bdbautos
-        WHERE {where_clause}
-        ORDER BY
-            CASE "Gravidade"
-                WHEN 'Gravissima3X' THEN 1
-                WHEN 'Gravissima2X' THEN 2
-                WHEN 'Gravissima' THEN 3
-                WHEN 'Grave' THEN 4
-                WHEN 'Media' THEN 5
-                WHEN 'Leve' THEN 6
-                WHEN 'Nao ha' THEN 6
-                ELSE 7
-            END ASC,
-            "Código de Infração" ASC
-        LIMIT :limit OFFSET :skip
-        """
-
-        resultado_db = db.execute(text(sql_query), params)
-        rows = resultado_db.fetchall()
-
-        # Converter resultados
-        resultados = []
-        for row in rows:
-            # Tratar "Nao ha" como "Leve" para exibição
-            gravidade_display = "Leve" if row.gravidade == "Nao ha" else str(row.gravidade)
+        # "relevancia" não faz sentido sem termo de busca: usa a ordem padrão.
+        if ordenar == "relevancia":
+            ordenar = "gravidade"
+
+        # Filtros e ordenação direto no índice in-memory (ordens pré-computadas no build).
+        idx = get_index(db)
+        chave = response_cache.chave_resposta(
+            "explorador", idx.version, skip=skip, limit=limit, gravidade=gravidade,
+            responsavel=responsavel, orgao=orgao, pontos_min=pontos_min,
+            pontos_max=pontos_max, busca=busca, ordenar=ordenar,
+        )
+        entrada = response_cache.obter(chave)
+        if entrada is not None:
+            registrar_metrica(request, inicio, "explorador")
+            return response_cache.responder(request, entrada)
+
+        ids = idx.filter_ids(
+            gravidade=gravidade,
+            responsavel=responsavel,
+            orgao=orgao,
+            busca=busca,
+            pontos_min=pontos_min,
+            pontos_max=pontos_max,
+        )
+        ordenados = idx.ordered(ids, ordenar)
+        total = len(ordenados)
 
+        resultados = []
+        for i in ordenados[skip : skip + limit]:
+            d = idx.docs[i]
             resultados.append({
-                "codigo": str(row.codigo),
-                "descricao": str(row.descricao),
-                "responsavel": str(row.responsavel),
-                "valor_multa": float(row.valor_multa) if row.valor_multa not in ['Nao ha', None] else 0.0,
-                "orgao_autuador": str(row.orgao_autuador),
-                "artigos_ctb": str(row.artigos_ctb),
-                "pontos": int(row.pontos) if str(row.pontos).isdigit() else 0,
-                "gravidade": gravidade_display
+                "codigo": d.codigo,
+                "descricao": d.descricao,
+                "responsavel": d.responsavel,
+                "valor_multa": d.valor_multa,
+                "orgao_autuador": d.orgao_autuador,
+                "artigos_ctb": d.artigos_ctb,
+                "pontos": d.pontos,
+                "gravidade": d.gravidade
             })
 
-        # Contar total
-        count_query = f"SELECT COUNT(*) as total FROM bdbautos WHERE {where_clause}"
-        count_params = {k: v for k, v in params.items() if k not in ['limit', 'skip']}
-        count_result = db.execute(text(count_query), count_params)
-        total = count_result.scalar()
-
-        resultado = {
-            "resultados": resultados,
-            "total": total,
-            "mensagem": None
-        }
-
         resultado_explorador = InfracaoPesquisaResponse(
-            resultados=[converter_dict_para_schema(item) for item in resultado.get("resultados", [])],
-            total=resultado.get("total", 0),
-            mensagem=resultado.get("mensagem"),
+            resultados=[converter_dict_para_schema(item) for item in resultados],
+            total=total,
+            mensagem=None,
             sugestao=None
         )
 
+        entrada = response_cache.armazenar(chave, resultado_explorador)
         registrar_metrica(request, inicio, "explorador")
-        return resultado_explorador
+        return response_cache.responder(request, entrada)
 
     except HTTPException as e:
         raise
@@ -603,26 +642,31 @@ def autocomplete_endpoint(
     from app.search.in_memory import get_index
     from app.search.normalizer import normalizar
 
-    # Base: termos do dicionário (sinônimos/termos prioritários).
-    base = autocomplete(q, limite=limite)
-    vistos = {normalizar(item.get("termo", "")) for item in base}
+    with medir_busca("autocomplete", q) as tempos:
+        # Base: termos do dicionário (sinônimos/termos prioritários).
+        with tempos.etapa("dicionario"):
+            base = autocomplete(q, limite=limite)
+            vistos = {normalizar(item.get("termo", "")) for item in base}
 
-    # Extra: termos frequentes do DB (último token digitado).
-    try:
-        idx = get_index(db)
-        last_token = (q or "").strip().split()[-1] if (q or "").strip() else ""
-        prefix = normalizar(last_token)
-        if prefix:
-            for term, _count in idx.lexicon.top_terms:
-                if len(base) >= limite:
-                    break
-                if term.startswith(prefix) and term not in vistos:
-                    base.append({"termo": term, "tipo": "db"})
-                    vistos.add(term)
-    except Exception:
-        pass
+        # Extra: termos frequentes do DB (último token digitado).
+        with tempos.etapa("termos_db"):
+            try:
+                idx = get_index(db)
+                last_token = (q or "").strip().split()[-1] if (q or "").strip() else ""
+                prefix = normalizar(last_token)
+                if prefix:
+                    for term, _count in idx.lexicon.top_terms:
+                        if len(base) >= limite:
+                            break
+                        if term.startswith(prefix) and term not in vistos:
+                            base.append({"termo": term, "tipo": "db"})
+                            vistos.add(term)
+            except Exception:
+                pass
 
-    return base[:limite]
+        with tempos.etapa("serializacao"):
+            resposta = JSONResponse(base[:limite])
+        return tempos.aplicar(resposta)
 
 
 @router.get("/smart", summary="Sugestões + preview (estilo Google)")
@@ -639,169 +683,184 @@ def smart_endpoint(
 
     Importante: NÃO registra analytics (preview pode disparar muitas vezes).
     """
-    validar_query_pesquisa(q)
-
-    from app.search.in_memory import get_index
-    from app.search.normalizer import normalizar
-    from app.search.autocomplete import autocomplete as dict_autocomplete
-    from app.search.dictionaries.terms import SINONIMOS, COMBINACOES_PERMITIDAS
-
-    idx = get_index(db)
-
-    q_raw = q or ""
-    ends_with_space = bool(re.search(r"\s$", q_raw))
-    q_rstrip = q_raw.rstrip()
-    q_norm = normalizar(q_rstrip)
-    toks = q_norm.split() if q_norm else []
-
-    # Para sugestões, trabalhamos com "head" + prefixo do último token.
-    if ends_with_space:
-        head_norm = " ".join(toks)
-        last_prefix_norm = ""
-    else:
-        head_norm = " ".join(toks[:-1]) if len(toks) > 1 else ""
-        last_prefix_norm = toks[-1] if toks else ""
-
-    # Sugestão de correção do último token (did-you-mean), sem aplicar automaticamente.
-    sugestao_correcao: Optional[str] = None
-    try:
-        from app.search.spell import corretor
-        if last_prefix_norm and len(last_prefix_norm) >= 3:
-            if (last_prefix_norm not in idx.lexicon.vocab) and (not last_prefix_norm.isdigit()):
-                sug_tok = corretor.sugerir(last_prefix_norm)
-                if sug_tok and str(sug_tok) != last_prefix_norm:
-                    full = f"{head_norm} {sug_tok}".strip() if head_norm else str(sug_tok)
-                    sugestao_correcao = full.strip() or None
-    except Exception:
-        sugestao_correcao = None
-
-    sugestoes: List[Dict[str, str]] = []
-    vistos = set()
-
-    def _add_sugestao(termo: str, tipo: str) -> None:
-        termo = (termo or "").strip()
-        if not termo:
-            return
-        key = normalizar(termo)
-        if not key or key in vistos:
-            return
-        vistos.add(key)
-        sugestoes.append({"termo": termo, "tipo": tipo})
-
-    # Correção sugerida (aparece no topo das sugestões, estilo Google).
-    if sugestao_correcao:
-        _add_sugestao(sugestao_correcao, "correcao")
-
-    # 1) Códigos (quando a entrada parece "codigo")
-    if re.fullmatch(r"[0-9\-\s]+", (q_raw.strip() or "")):
-        prefix_digits = re.sub(r"[^0-9]", "", q_raw)
-        if prefix_digits:
-            for d in idx.docs:
-                codigo = getattr(d, "codigo", "") or ""
-                codigo_digits = re.sub(r"[^0-9]", "", codigo)
-                if codigo_digits.startswith(prefix_digits):
-                    _add_sugestao(codigo, "codigo")
-                    if len(sugestoes) >= limite_sugestoes:
-                        break
-
-    # 2) Frases do DB (bigrams/trigrams frequentes)
-    phrase_prefix = (q_norm + " ") if ends_with_space and q_norm else q_norm
-    if phrase_prefix:
-        for phrase, count in idx.lexicon.top_phrases:
-            if len(sugestoes) >= limite_sugestoes:
-                break
-            # Evita frases raras (ruído)
-            if int(count or 0) < 3:
-                continue
-            if str(phrase).startswith(phrase_prefix):
-                _add_sugestao(str(phrase), "frase_db")
-
-    # 3) Frases do dicionário (SINONIMOS com espaço + COMBINACOES_PERMITIDAS)
-    if phrase_prefix and len(sugestoes) < limite_sugestoes:
-        for k in SINONIMOS.keys():
-            if len(sugestoes) >= limite_sugestoes:
-                break
-            if " " not in str(k):
-                continue
-            if normalizar(str(k)).startswith(phrase_prefix):
-                _add_sugestao(str(k), "frase_dict")
-        for combo in COMBINACOES_PERMITIDAS:
-            if len(sugestoes) >= limite_sugestoes:
-                break
+    with medir_busca("smart", q) as tempos:
+        with tempos.etapa("validacao"):
+            validar_query_pesquisa(q)
+
+        from app.search.in_memory import get_index
+        from app.search.normalizer import normalizar
+        from app.search.autocomplete import autocomplete as dict_autocomplete
+        from app.search.dictionaries.terms import SINONIMOS, COMBINACOES_PERMITIDAS
+
+        with tempos.etapa("indice"):
+            idx = get_index(db)
+
+        q_raw = q or ""
+        ends_with_space = bool(re.search(r"\s$", q_raw))
+        q_rstrip = q_raw.rstrip()
+        q_norm = normalizar(q_rstrip)
+        toks = q_norm.split() if q_norm else []
+
+        # Para sugestões, trabalhamos com "head" + prefixo do último token.
+        if ends_with_space:
+            head_norm = " ".join(toks)
+            last_prefix_norm = ""
+        else:
+            head_norm = " ".join(toks[:-1]) if len(toks) > 1 else ""
+            last_prefix_norm = toks[-1] if toks else ""
+
+        # Sugestão de correção do último token (did-you-mean), sem aplicar automaticamente.
+        with tempos.etapa("correcao"):
+            sugestao_correcao: Optional[str] = None
             try:
-                ph = " ".join(str(x).strip() for x in combo if str(x).strip())
+                from app.search.spell import corretor
+                if last_prefix_norm and len(last_prefix_norm) >= 3:
+                    if (last_prefix_norm not in idx.lexicon.vocab) and (not last_prefix_norm.isdigit()):
+                        sug_tok = corretor.sugerir(last_prefix_norm)
+                        if sug_tok and str(sug_tok) != last_prefix_norm:
+                            full = f"{head_norm} {sug_tok}".strip() if head_norm else str(sug_tok)
+                            sugestao_correcao = full.strip() or None
             except Exception:
-                ph = ""
-            if ph and normalizar(ph).startswith(phrase_prefix):
-                _add_sugestao(ph, "frase_permitida")
-
-    # 4) Termos (completar último token) combinando dicionário + DB
-    if last_prefix_norm and len(last_prefix_norm) >= 2 and len(sugestoes) < limite_sugestoes:
-        base = dict_autocomplete(last_prefix_norm, limite=limite_sugestoes)
-        for item in base:
-            if len(sugestoes) >= limite_sugestoes:
-                break
-            # Evitar ruído: o modo "contem" tende a sugerir termos irrelevantes.
-            if (item or {}).get("tipo") == "contem":
-                continue
-            termo = (item or {}).get("termo", "")
-            full = f"{head_norm} {termo}".strip() if head_norm else str(termo)
-            _add_sugestao(full, f"termo_{(item or {}).get('tipo', 'dict')}")
-
-        # Complemento: termos frequentes do DB (filtra ultra-comuns para reduzir ruído)
-        n_docs = max(len(idx.docs), 1)
-        for term, _count in idx.lexicon.top_terms:
-            if len(sugestoes) >= limite_sugestoes:
-                break
-            term = str(term)
-            if not term.startswith(last_prefix_norm):
-                continue
-            df = int(idx.lexicon.df.get(term, 0) or 0)
-            if (df / n_docs) > 0.85 and len(last_prefix_norm) < 4:
-                continue
-            full = f"{head_norm} {term}".strip() if head_norm else term
-            _add_sugestao(full, "termo_db")
-
-    # === PREVIEW ===
-    docs_page, total, sugestao = idx.search(q_raw, limit=limite_preview, skip=0)
-    if not sugestao and sugestao_correcao:
-        sugestao = sugestao_correcao
-
-    resultados_preview: List[Dict[str, Any]] = []
-    for d in docs_page:
-        resultados_preview.append(
-            {
-                # Retornar texto "cru" (JSON). O frontend renderiza com `textContent`.
-                "codigo": str(getattr(d, "codigo", "") or ""),
-                "descricao": str(getattr(d, "descricao", "") or ""),
-                "responsavel": str(getattr(d, "responsavel", "") or ""),
-                "valor_multa": float(getattr(d, "valor_multa", 0.0) or 0.0),
-                "orgao_autuador": str(getattr(d, "orgao_autuador", "") or ""),
-                "artigos_ctb": str(getattr(d, "artigos_ctb", "") or ""),
-                "pontos": int(getattr(d, "pontos", 0) or 0),
-                "gravidade": str(getattr(d, "gravidade", "") or ""),
-            }
-        )
-
-    return {
-        "sugestoes": sugestoes[:limite_sugestoes],
-        "preview": {
-            "resultados": resultados_preview,
-            "total": int(total or 0),
-            "mensagem": None,
-            "sugestao": sugestao,
-        },
-    }
+                sugestao_correcao = None
+
+        with tempos.etapa("sugestoes"):
+            sugestoes: List[Dict[str, str]] = []
+            vistos = set()
+
+            def _add_sugestao(termo: str, tipo: str) -> None:
+                termo = (termo or "").strip()
+                if not termo:
+                    return
+                key = normalizar(termo)
+                if not key or key in vistos:
+                    return
+                vistos.add(key)
+                sugestoes.append({"termo": termo, "tipo": tipo})
+
+            # Correção sugerida (aparece no topo das sugestões, estilo Google).
+            if sugestao_correcao:
+                _add_sugestao(sugestao_correcao, "correcao")
+
+            # 1) Códigos (quando a entrada parece "codigo")
+            if re.fullmatch(r"[0-9\-\s]+", (q_raw.strip() or "")):
+                prefix_digits = re.sub(r"[^0-9]", "", q_raw)
+                if prefix_digits:
+                    for d in idx.docs:
+                        codigo = getattr(d, "codigo", "") or ""
+                        codigo_digits = re.sub(r"[^0-9]", "", codigo)
+                        if codigo_digits.startswith(prefix_digits):
+                            _add_sugestao(codigo, "codigo")
+                            if len(sugestoes) >= limite_sugestoes:
+                                break
+
+            # 2) Frases do DB (bigrams/trigrams frequentes)
+            phrase_prefix = (q_norm + " ") if ends_with_space and q_norm else q_norm
+            if phrase_prefix:
+                for phrase, count in idx.lexicon.top_phrases:
+                    if len(sugestoes) >= limite_sugestoes:
+                        break
+                    # Evita frases raras (ruído)
+                    if int(count or 0) < 3:
+                        continue
+                    if str(phrase).startswith(phrase_prefix):
+                        _add_sugestao(str(phrase), "frase_db")
+
+            # 3) Frases do dicionário (SINONIMOS com espaço + COMBINACOES_PERMITIDAS)
+            if phrase_prefix and len(sugestoes) < limite_sugestoes:
+                for k in SINONIMOS.keys():
+                    if len(sugestoes) >= limite_sugestoes:
+                        break
+                    if " " not in str(k):
+                        continue
+                    if normalizar(str(k)).startswith(phrase_prefix):
+                        _add_sugestao(str(k), "frase_dict")
+                for combo in COMBINACOES_PERMITIDAS:
+                    if len(sugestoes) >= limite_sugestoes:
+                        break
+                    try:
+                        ph = " ".join(str(x).strip() for x in combo if str(x).strip())
+                    except Exception:
+                        ph = ""
+                    if ph and normalizar(ph).startswith(phrase_prefix):
+                        _add_sugestao(ph, "frase_permitida")
+
+            # 4) Termos (completar último token) combinando dicionário + DB
+            if last_prefix_norm and len(last_prefix_norm) >= 2 and len(sugestoes) < limite_sugestoes:
+                base = dict_autocomplete(last_prefix_norm, limite=limite_sugestoes)
+                for item in base:
+                    if len(sugestoes) >= limite_sugestoes:
+                        break
+                    # Evitar ruído: o modo "contem" tende a sugerir termos irrelevantes.
+                    if (item or {}).get("tipo") == "contem":
+                        continue
+                    termo = (item or {}).get("termo", "")
+                    full = f"{head_norm} {termo}".strip() if head_norm else str(termo)
+                    _add_sugestao(full, f"termo_{(item or {}).get('tipo', 'dict')}")
+
+                # Complemento: termos frequentes do DB (filtra ultra-comuns para reduzir ruído)
+                n_docs = max(len(idx.docs), 1)
+                for term, _count in idx.lexicon.top_terms:
+                    if len(sugestoes) >= limite_sugestoes:
+                        break
+                    term = str(term)
+                    if not term.startswith(last_prefix_norm):
+                        continue
+                    df = int(idx.lexicon.df.get(term, 0) or 0)
+                    if (df / n_docs) > 0.85 and len(last_prefix_norm) < 4:
+                        continue
+                    full = f"{head_norm} {term}".strip() if head_norm else term
+                    _add_sugestao(full, "termo_db")
+
+        # === PREVIEW ===
+        docs_page, total, sugestao = idx.search(q_raw, limit=limite_preview, skip=0)
+        tempos.resultados = int(total or 0)
+        if not sugestao and sugestao_correcao:
+            sugestao = sugestao_correcao
+
+        with tempos.etapa("formatacao"):
+            resultados_preview: List[Dict[str, Any]] = []
+            for d in docs_page:
+                resultados_preview.append(
+                    {
+                        # Retornar texto "cru" (JSON). O frontend renderiza com `textContent`.
+                        "codigo": str(getattr(d, "codigo", "") or ""),
+                        "descricao": str(getattr(d, "descricao", "") or ""),
+                        "responsavel": str(getattr(d, "responsavel", "") or ""),
+                        "valor_multa": float(getattr(d, "valor_multa", 0.0) or 0.0),
+                        "orgao_autuador": str(getattr(d, "orgao_autuador", "") or ""),
+                        "artigos_ctb": str(getattr(d, "artigos_ctb", "") or ""),
+                        "pontos": int(getattr(d, "pontos", 0) or 0),
+                        "gravidade": str(getattr(d, "gravidade", "") or ""),
+                    }
+                )
+
+        with tempos.etapa("serializacao"):
+            resposta = JSONResponse(
+                {
+                    "sugestoes": sugestoes[:limite_sugestoes],
+                    "preview": {
+                        "resultados": resultados_preview,
+                        "total": int(total or 0),
+                        "mensagem": None,
+                        "sugestao": sugestao,
+                    },
+                }
+            )
+        return tempos.aplicar(resposta)
 
 
 @router.get("/termos-populares", summary="Termos populares de busca")
 def termos_populares_endpoint(
+    request: Request,
     limite: int = Query(20, ge=1, le=50),
     db: Session = Depends(get_db),
 ):
     """Retorna termos populares/sugeridos para busca."""
-    from app.search.in_memory import get_index
     idx = get_index(db)
+    chave = response_cache.chave_resposta("termos_populares", idx.version, limite=limite)
+    entrada = response_cache.obter(chave)
+    if entrada is not None:
+        return response_cache.responder(request, entrada)
 
     termos = []
     for term, _count in idx.lexicon.top_terms:
@@ -810,7 +869,7 @@ def termos_populares_endpoint(
         if term.isdigit():
             continue
         termos.append(term)
-    return termos
+    return response_cache.responder(request, response_cache.armazenar(chave, termos))
 
 
 @router.get("/analytics/estatisticas", summary="Estatísticas de busca")
@@ -844,6 +903,169 @@ def analytics_queries_sem_resultado(
     return obter_queries_sem_resultado(limite)
 
 
+@router.get(
+    "/export",
+    summary="Exportar catálogo completo",
+    description="Exporta todas as infrações em NDJSON ou CSV, em streaming, direto do índice em memória.",
+    responses={
+        200: {"description": "Catálogo exportado com sucesso"},
+        304: {"description": "Catálogo não mudou desde a versão informada em If-None-Match"}
+    }
+)
+def exportar_infracoes(
+    request: Request,
+    formato: str = Query("ndjson", description="Formato de saída: ndjson ou csv"),
+    db: Session = Depends(get_db)
+):
+    """Exporta o catálogo inteiro em uma passada, sem paginação por OFFSET."""
+    if formato not in EXPORT_FORMATOS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato inválido. Use: ndjson ou csv"
+        )
+
+    try:
+        idx = get_index(db)
+        docs = idx.docs
+        comprimir = "gzip" in codificacoes_aceitas(request.headers.get("accept-encoding", ""))
+
+        # A versão do dataset só muda em escritas administrativas.
+        etag = gerar_etag(idx.version, "export", formato, comprimir)
+        if etag_corresponde(request, etag):
+            return nao_modificado(etag, CACHE_TTL_LISTA)
+
+        headers = cabecalhos_cache(etag, CACHE_TTL_LISTA)
+
+        headers["Content-Disposition"] = f'attachment; filename="infracoes.{formato}"'
+        if comprimir:
+            headers["Content-Encoding"] = "gzip"
+
+        return StreamingResponse(
+            gerar_export(docs, formato, comprimir),
+            media_type=EXPORT_FORMATOS[formato],
+            headers=headers
+        )
+
+    except SQLAlchemyError as e:
+        logger.error(f"Erro ao exportar infrações: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Erro ao acessar o banco de dados. Por favor, tente novamente mais tarde."
+        )
+
+
+@router.post(
+    "/lote",
+    response_model=InfracaoLoteResponse,
+    summary="Consultar infrações em lote",
+    description="Resolve uma lista de códigos em uma única chamada, opcionalmente somando valores e pontos.",
+    responses={
+        200: {
+            "description": "Consulta em lote realizada com sucesso",
+            "content": {
+                "application/json": {
+                    "example": {
+                        "resultados": [{
+                            "codigo": "51691",
+                            "descricao": "Dirigir sob influência de álcool",
+                            "responsavel": "Condutor",
+                            "valor_multa": 2934.70,
+                            "orgao_autuador": "Estadual",
+                            "artigos_ctb": "165",
+                            "pontos": 7,
+                            "gravidade": "Gravissima10X"
+                        }],
+                        "nao_encontrados": ["99999"],
+                        "total": 1,
+                        "agregado": {
+                            "quantidade": 1,
+                            "total_valor_multa": 2934.70,
+                            "total_pontos": 7,
+                            "gravissimas": 1,
+                            "limite_pontos_suspensao": 30,
+                            "atinge_limite_suspensao": False
+                        }
+                    }
+                }
+            }
+        }
+    }
+)
+def consultar_lote(
+    request: Request,
+    lote: InfracaoLoteRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Consulta em lote pelo mapa de códigos do índice in-memory (sem SQL por código).
+
+    Códigos repetidos aparecem uma vez em `resultados`, mas cada ocorrência
+    conta no agregado (um relatório pode ter a mesma infração mais de uma vez).
+    """
+    inicio = time.time()
+    try:
+        idx = get_index(db)
+
+        resultados: List[InfracaoSchema] = []
+        nao_encontrados: List[str] = []
+        vistos = set()
+        quantidade = 0
+        total_valor = 0.0
+        total_pontos = 0
+        gravissimas = 0
+
+        for codigo in lote.codigos:
+            codigo_sem_hifen = (codigo or "").strip().replace('-', '')
+            doc = idx.get_by_code(codigo_sem_hifen) if validar_codigo_infracao(codigo_sem_hifen) else None
+            if doc is None:
+                nao_encontrados.append(codigo)
+                continue
+
+            quantidade += 1
+            total_valor += doc.valor_multa
+            total_pontos += doc.pontos
+            if "gravissima" in doc.gravidade_norm:
+                gravissimas += 1
+
+            if doc.codigo in vistos:
+                continue
+            vistos.add(doc.codigo)
+            resultados.append(converter_row_objeto(doc))
+
+        agregado = None
+        if lote.agregar:
+            limite = limite_pontos_suspensao(gravissimas)
+            agregado = InfracaoLoteAgregado(
+                quantidade=quantidade,
+                total_valor_multa=round(total_valor, 2),
+                total_pontos=total_pontos,
+                gravissimas=gravissimas,
+                limite_pontos_suspensao=limite,
+                atinge_limite_suspensao=total_pontos >= limite
+            )
+
+        registrar_metrica(request, inicio, "consultar_lote")
+        return InfracaoLoteResponse(
+            resultados=resultados,
+            nao_encontrados=nao_encontrados,
+            total=len(resultados),
+            agregado=agregado
+        )
+
+    except SQLAlchemyError as e:
+        logger.error(f"Erro na consulta em lote: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Erro ao acessar o banco de dados. Por favor, tente novamente mais tarde."
+        )
+    except Exception as e:
+        logger.error(f"Erro inesperado na consulta em lote: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Erro interno do servidor. Por favor, tente novamente mais tarde."
+        )
+
+
 @router.get(
     "/{codigo}",
     response_model=InfracaoSchema,
@@ -903,6 +1125,10 @@ def obter_infracao(
                 detail="Formato de código inválido. Use o formato XXXX-X ou XXXXX"
             )
 
+        etag = gerar_etag(get_dataset_version(db), "detalhe", codigo_sem_hifen)
+        if etag_corresponde(request, etag):
+            return nao_modificado(etag, CACHE_TTL_DETALHE)
+
         # Usar o código sem hífen na consulta
         sql = f"{SQL_SELECT_INFRACOES} WHERE \"Código de Infração\" = :codigo LIMIT 1"
         result = db.execute(text(sql), {"codigo": codigo_sem_hifen})
@@ -917,8 +1143,7 @@ def obter_infracao(
         # Resto do código continua igual...
         
         # Adiciona cache headers para resultados individuais
-        response.headers["Cache-Control"] = f"public, max-age={CACHE_TTL_DETALHE}"
-        response.headers["Vary"] = "Accept-Encoding"
+        response.headers.update(cabecalhos_cache(etag, CACHE_TTL_DETALHE))
         
         infracao = converter_row_objeto(row)
         registrar_metrica(request, inicio, "obter_infracao")
@@ -0,0 +1,192 @@
+"""
+Rastreamento de alocações sob demanda (tracemalloc) com diff de snapshots.
+
+O tracemalloc fica desligado por padrão: ligado, cada alocação de objeto
+Python paga o registro do traceback. Um administrador liga o rastreamento,
+tira dois snapshots com alguns segundos de intervalo e recebe os pontos de
+alocação que mais cresceram, por arquivo:linha e por subsistema (índice de
+busca, caches, middlewares...). Com TRACEMALLOC_ENABLED=true o rastreamento
+começa no startup, e o detector de vazamentos do PerformanceMonitor passa a
+registrar nos logs onde a memória cresceu.
+"""
+import os
+import sysconfig
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logger import logger
+
+# Prefixo do caminho (relativo ao projeto ou a site-packages) -> subsistema
+SUBSISTEMAS = (
+    ("app/search/in_memory.py", "indice_busca"),
+    ("app/search/spell.py", "corretor"),
+    ("app/search/timing.py", "metricas"),
+    ("app/search/", "busca"),
+    ("app/core/cache_manager.py", "caches"),
+    ("app/core/response_cache.py", "caches"),
+    ("app/core/compressao.py", "caches"),
+    ("app/middleware/", "middlewares"),
+    ("app/core/histograma.py", "metricas"),
+    ("app/core/prometheus.py", "metricas"),
+    ("app/db/", "banco"),
+    ("app/fipe/", "fipe"),
+    ("app/", "app"),
+    ("sqlalchemy/", "sqlalchemy"),
+    ("starlette/", "framework"),
+    ("fastapi/", "framework"),
+    ("anyio/", "framework"),
+    ("uvicorn/", "framework"),
+    ("pydantic/", "pydantic"),
+    ("stdlib/", "stdlib"),
+)
+
+_RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) + os.sep
+_STDLIB = sysconfig.get_paths()["stdlib"] + os.sep
+
+# Alocações do próprio tracemalloc e do mecanismo de import não interessam
+_FILTROS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class RastreamentoOcupado(RuntimeError):
+    """Já existe uma comparação de snapshots em andamento."""
+
+
+def _caminho_curto(caminho: str) -> str:
+    if caminho.startswith(_RAIZ):
+        return caminho[len(_RAIZ):]
+    marcador = "site-packages" + os.sep
+    i = caminho.rfind(marcador)
+    if i >= 0:
+        return caminho[i + len(marcador):]
+    if caminho.startswith(_STDLIB):
+        return "stdlib/" + caminho[len(_STDLIB):]
+    return caminho
+
+
+def subsistema(caminho: str) -> str:
+    curto = _caminho_curto(caminho).replace(os.sep, "/")
+    for prefixo, nome in SUBSISTEMAS:
+        if curto.startswith(prefixo):
+            return nome
+    return "outros"
+
+
+def iniciar(frames: int = settings.TRACEMALLOC_FRAMES) -> bool:
+    """Liga o tracemalloc (True se foi ligado agora)."""
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(frames)
+    logger.info(f"Memory tracing iniciado ({frames} frame(s) por alocação)")
+    return True
+
+
+def parar():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        logger.info("Memory tracing parado")
+
+
+def snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_FILTROS)
+
+
+def comparar(antes: tracemalloc.Snapshot, depois: tracemalloc.Snapshot, top: int = 30) -> Dict:
+    """Crescimento entre dois snapshots, por arquivo:linha e por subsistema."""
+    diferencas = depois.compare_to(antes, "lineno")
+
+    por_subsistema: Dict[str, Dict[str, int]] = defaultdict(lambda: {"size_diff": 0, "count_diff": 0, "size": 0})
+    for diff in diferencas:
+        frame = diff.traceback[0]
+        grupo = por_subsistema[subsistema(frame.filename)]
+        grupo["size_diff"] += diff.size_diff
+        grupo["count_diff"] += diff.count_diff
+        grupo["size"] += diff.size
+
+    crescimento = sorted(diferencas, key=lambda d: d.size_diff, reverse=True)[:top]
+    return {
+        "total_size_diff": sum(d.size_diff for d in diferencas),
+        "top": [
+            {
+                "local": f"{_caminho_curto(d.traceback[0].filename)}:{d.traceback[0].lineno}",
+                "subsistema": subsistema(d.traceback[0].filename),
+                "size_diff": d.size_diff,
+                "count_diff": d.count_diff,
+                "size": d.size,
+                "count": d.count,
+            }
+            for d in crescimento
+            if d.size_diff > 0
+        ],
+        "subsistemas": dict(sorted(por_subsistema.items(), key=lambda item: item[1]["size_diff"], reverse=True)),
+    }
+
+
+_lock = threading.Lock()
+
+
+def diff_alocacoes(segundos: float, top: int = 30, manter: bool = False) -> Dict:
+    """
+    Liga o rastreamento se preciso, compara snapshots tirados com `segundos`
+    de intervalo e, se ligou o rastreamento aqui, desliga ao final (a menos
+    que `manter`). Alocações anteriores ao início do rastreamento não aparecem.
+    """
+    if not _lock.acquire(blocking=False):
+        raise RastreamentoOcupado("Comparação de snapshots já em andamento")
+    try:
+        iniciado_aqui = iniciar()
+        try:
+            antes = snapshot()
+            time.sleep(segundos)
+            depois = snapshot()
+            resultado = comparar(antes, depois, top)
+            atual, pico = tracemalloc.get_traced_memory()
+            resultado.update({
+                "segundos": segundos,
+                "traced_memory_bytes": atual,
+                "traced_peak_bytes": pico,
+                "tracing_started_now": iniciado_aqui,
+            })
+            return resultado
+        finally:
+            if iniciado_aqui and not manter:
+                parar()
+    finally:
+        _lock.release()
+
+
+def estado() -> Dict:
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+    atual, pico = tracemalloc.get_traced_memory()
+    return {
+        "tracing": True,
+        "frames": tracemalloc.get_traceback_limit(),
+        "traced_memory_bytes": atual,
+        "traced_peak_bytes": pico,
+        "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+    }
+
+
+def resumir_crescimento(antes: Optional[tracemalloc.Snapshot], depois: tracemalloc.Snapshot,
+                        top: int = 5) -> List[str]:
+    """Linhas curtas para log: maiores crescimentos (ou maiores alocações sem snapshot anterior)."""
+    if antes is None:
+        estatisticas = depois.statistics("lineno")[:top]
+        return [
+            f"{_caminho_curto(s.traceback[0].filename)}:{s.traceback[0].lineno} "
+            f"[{subsistema(s.traceback[0].filename)}] {s.size / 1024:.1f}KB"
+            for s in estatisticas
+        ]
+    return [
+        f"{item['local']} [{item['subsistema']}] +{item['size_diff'] / 1024:.1f}KB"
+        for item in comparar(antes, depois, top)["top"]
+    ]
@@ -0,0 +1,170 @@
+"""
+Pipeline de assets estáticos: fingerprint, variantes comprimidas e manifesto.
+
+`python -m app.tools.build_assets` copia os arquivos de `app/static` para
+`app/static/dist` com o hash do conteúdo no nome (`js/script.3f2a9c1b0d.js`),
+grava as variantes `.gz`/`.br` dos arquivos de texto e o `manifest.json`
+(caminho original -> caminho com hash).
+
+Os templates usam `asset_url('js/script.js')`: com manifesto, a URL aponta
+para o arquivo versionado (cache imutável de 1 ano); sem manifesto, cai no
+caminho original e tudo continua funcionando como antes.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import stat
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Scope
+
+from app.core.compressao import codificacoes_aceitas, escrever_variantes
+from app.core.logger import logger
+
+STATIC_DIR = Path(__file__).resolve().parents[1] / "static"
+DIST_NOME = "dist"
+MANIFESTO_NOME = "manifest.json"
+
+EXTENSOES_ASSETS = {".css", ".js", ".svg", ".png", ".ico", ".jpg", ".jpeg", ".webp", ".woff", ".woff2"}
+EXTENSOES_COMPRIMIVEIS = {".css", ".js", ".svg", ".json", ".txt", ".xml"}
+
+CACHE_CONTROL_IMUTAVEL = "public, max-age=31536000, immutable"
+
+
+def _nome_com_hash(relativo: Path, conteudo: bytes) -> Path:
+    resumo = hashlib.sha1(conteudo).hexdigest()[:10]
+    return relativo.with_name(f"{relativo.stem}.{resumo}{relativo.suffix}")
+
+
+def construir_assets(static_dir: Path = STATIC_DIR) -> Dict[str, str]:
+    """Gera `dist/` com os assets versionados e retorna o manifesto."""
+    dist = static_dir / DIST_NOME
+    temporario = static_dir / f"{DIST_NOME}.tmp"
+    if temporario.exists():
+        shutil.rmtree(temporario)
+
+    manifesto: Dict[str, str] = {}
+    for origem in sorted(static_dir.rglob("*")):
+        relativo = origem.relative_to(static_dir)
+        if not origem.is_file() or relativo.parts[0] in (DIST_NOME, temporario.name):
+            continue
+        if origem.suffix.lower() not in EXTENSOES_ASSETS:
+            continue
+
+        conteudo = origem.read_bytes()
+        destino_relativo = _nome_com_hash(relativo, conteudo)
+        destino = temporario / destino_relativo
+        if origem.suffix.lower() in EXTENSOES_COMPRIMIVEIS:
+            escrever_variantes(destino, conteudo)
+        else:
+            destino.parent.mkdir(parents=True, exist_ok=True)
+            destino.write_bytes(conteudo)
+        manifesto[relativo.as_posix()] = destino_relativo.as_posix()
+
+    (temporario / MANIFESTO_NOME).write_text(
+        json.dumps(manifesto, indent=2, sort_keys=True), encoding="utf-8"
+    )
+
+    if dist.exists():
+        shutil.rmtree(dist)
+    os.replace(temporario, dist)
+    carregar_manifesto.cache_clear()
+    logger.info(f"Assets gerados: {len(manifesto)} arquivos em {dist}")
+    return manifesto
+
+
+@lru_cache(maxsize=1)
+def carregar_manifesto() -> Dict[str, str]:
+    """Manifesto gerado pelo build (vazio se o build ainda não rodou)."""
+    caminho = STATIC_DIR / DIST_NOME / MANIFESTO_NOME
+    try:
+        return json.loads(caminho.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Manifesto de assets inválido ({caminho}): {e}")
+        return {}
+
+
+def asset_url(caminho: str) -> str:
+    """URL pública de um asset: versionada se houver manifesto, original caso contrário."""
+    caminho = caminho.lstrip("/")
+    versionado = carregar_manifesto().get(caminho)
+    if versionado:
+        return f"/static/{DIST_NOME}/{versionado}"
+    return f"/static/{caminho}"
+
+
+def configurar_templates(templates: Jinja2Templates) -> Jinja2Templates:
+    """Disponibiliza `asset_url` nos templates."""
+    templates.env.globals["asset_url"] = asset_url
+    return templates
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles que entrega a variante `.br`/`.gz` gerada no build quando o
+    cliente aceita, em vez de deixar o GZipMiddleware recomprimir a cada
+    requisição. Arquivos versionados (`/static/dist/...`) recebem cache imutável.
+    """
+
+    def file_response(
+        self,
+        full_path: os.PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        caminho = os.fspath(full_path)
+        imutavel = f"{os.sep}{DIST_NOME}{os.sep}" in caminho
+
+        response: Optional[Response] = None
+        if imutavel:
+            response = self._variante_comprimida(caminho, scope, request_headers, status_code)
+        if response is None:
+            response = FileResponse(
+                caminho, status_code=status_code, stat_result=stat_result, method=scope["method"]
+            )
+        if imutavel:
+            response.headers["Cache-Control"] = CACHE_CONTROL_IMUTAVEL
+            response.headers["Vary"] = "Accept-Encoding"
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+    @staticmethod
+    def _variante_comprimida(
+        caminho: str, scope: Scope, request_headers: Headers, status_code: int
+    ) -> Optional[Response]:
+        aceitas = codificacoes_aceitas(request_headers.get("accept-encoding", ""))
+        for codificacao, extensao in (("br", ".br"), ("gzip", ".gz")):
+            if codificacao not in aceitas:
+                continue
+            try:
+                stat_variante = os.stat(caminho + extensao)
+            except OSError:
+                continue
+            if not stat.S_ISREG(stat_variante.st_mode):
+                continue
+            media_type = mimetypes.guess_type(caminho)[0] or "text/plain"
+            response = FileResponse(
+                caminho + extensao,
+                status_code=status_code,
+                stat_result=stat_variante,
+                method=scope["method"],
+                media_type=media_type,
+            )
+            response.headers["Content-Encoding"] = codificacao
+            return response
+        return None
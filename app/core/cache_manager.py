@@ -1,18 +1,25 @@
 """
 Cache Manager Inteligente para MultasGO - Solução para Memory Leaks
 Controla uso de memória, TTL e limpeza automática de caches.
+
+Sob pressão de memória a remoção considera o custo de reconstrução: cada
+entrada (e cada subsistema registrado, como o índice de busca) tem um custo
+estimado em ms e um tamanho em bytes, e saem primeiro as entradas baratas e
+grandes (menor custo por byte). Subsistemas fixos nunca são descartados.
 """
 import time
 import gc
 import psutil
 import threading
-from typing import Dict, Any, Optional, Callable
+from typing import Dict, Any, List, Optional, Callable, Tuple, Union
 from collections import OrderedDict
 from dataclasses import dataclass
 from functools import wraps
 
 from app.core.config import settings
 from app.core.logger import logger
+from app.core.tamanho import medir_bytes
+from app.core.timing_wheel import TimingWheel
 
 
 @dataclass
@@ -23,6 +30,37 @@ class CacheEntry:
     last_accessed: float
     access_count: int
     memory_size: int
+    cost: float = 1.0  # Custo estimado de reconstrução (ms)
+    expires_at: float = float("inf")  # Instante de expiração (inf = sem TTL)
+    referenced: bool = False  # Bit de referência do CLOCK (ShardedSmartCache)
+
+
+# Entradas menos recentes examinadas a cada remoção por limite do próprio cache
+AMOSTRA_DESPEJO = 8
+
+
+def _prioridade(cost: float, memory_size: int) -> float:
+    """Custo por byte: menor = melhor candidata a sair."""
+    return cost / max(memory_size, 1)
+
+
+@dataclass
+class Subsistema:
+    """Estrutura fora dos SmartCaches que participa da política de memória."""
+    name: str
+    size_fn: Callable[[], int]
+    cost_ms: Union[float, Callable[[], float]]
+    release_fn: Optional[Callable[[], None]] = None
+    pinned: bool = False
+
+    def size(self) -> int:
+        try:
+            return int(self.size_fn())
+        except Exception:
+            return 0
+
+    def cost(self) -> float:
+        return float(self.cost_ms() if callable(self.cost_ms) else self.cost_ms)
 
 
 class SmartCache:
@@ -31,8 +69,8 @@ class SmartCache:
 
     Features:
     - Limite de memória configurável
-    - TTL por entrada
-    - LRU eviction
+    - TTL por entrada (expiração conduzida por timing wheel, sem varreduras)
+    - Remoção LRU ponderada pelo custo de reconstrução
     - Estatísticas de uso
     - Limpeza automática
     """
@@ -40,10 +78,12 @@ class SmartCache:
     def __init__(self,
                  max_memory_mb: int = 100,
                  default_ttl: int = 300,
-                 cleanup_interval: int = 1800):
+                 cleanup_interval: int = 1800,
+                 default_cost: float = 1.0):
         self.max_memory_bytes = max_memory_mb * 1024 * 1024
         self.default_ttl = default_ttl
         self.cleanup_interval = cleanup_interval
+        self.default_cost = default_cost
 
         self._cache: OrderedDict[str, CacheEntry] = OrderedDict()
         self._lock = threading.RLock()
@@ -51,9 +91,12 @@ class SmartCache:
         self._hits = 0
         self._misses = 0
         self._evictions = 0
+        self._expirations = 0
         self._last_cleanup = time.time()
+        # Chave -> prazo; entradas vencidas saem em O(1) amortizado a cada escrita/limpeza
+        self._wheel = TimingWheel(resolucao=1.0)
 
-        logger.info(f"SmartCache inicializado - Limite: {max_memory_mb}MB, TTL: {default_ttl}s")
+        logger.debug(f"SmartCache inicializado - Limite: {max_memory_mb}MB, TTL: {default_ttl}s")
 
     def get(self, key: str) -> Optional[Any]:
         """Obtém valor do cache."""
@@ -65,9 +108,10 @@ class SmartCache:
             entry = self._cache[key]
             current_time = time.time()
 
-            # Verificar TTL
-            if current_time - entry.created_at > self.default_ttl:
+            # Verificar TTL (vencida mas ainda não recolhida pelo wheel)
+            if current_time >= entry.expires_at:
                 self._remove_entry(key)
+                self._expirations += 1
                 self._misses += 1
                 return None
 
@@ -81,16 +125,24 @@ class SmartCache:
 
             return entry.value
 
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        """Armazena valor no cache."""
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, cost: Optional[float] = None) -> None:
+        """
+        Armazena valor no cache.
+
+        `ttl`: segundos até expirar (padrão do cache se None; <= 0 = sem expiração).
+        `cost`: ms para reconstruir o valor (padrão do cache se None).
+        """
         if ttl is None:
             ttl = self.default_ttl
+        if cost is None:
+            cost = self.default_cost
 
         # Estimar tamanho da memória
         memory_size = self._estimate_size(value)
 
         with self._lock:
             current_time = time.time()
+            self._expire(current_time)
 
             # Remover entrada existente se houver
             if key in self._cache:
@@ -104,7 +156,7 @@ class SmartCache:
             # Liberar espaço se necessário
             while (self._memory_usage + memory_size > self.max_memory_bytes and
                    len(self._cache) > 0):
-                self._evict_lru()
+                self._evict_cheapest()
 
             # Adicionar nova entrada
             entry = CacheEntry(
@@ -112,16 +164,16 @@ class SmartCache:
                 created_at=current_time,
                 last_accessed=current_time,
                 access_count=0,
-                memory_size=memory_size
+                memory_size=memory_size,
+                cost=cost
             )
+            if ttl > 0:
+                entry.expires_at = current_time + ttl
+                self._wheel.agendar(key, entry.expires_at)
 
             self._cache[key] = entry
             self._memory_usage += memory_size
 
-            # Limpeza periódica
-            if current_time - self._last_cleanup > self.cleanup_interval:
-                self._cleanup_expired()
-
     def delete(self, key: str) -> bool:
         """Remove entrada do cache."""
         with self._lock:
@@ -134,8 +186,8 @@ class SmartCache:
         """Limpa todo o cache."""
         with self._lock:
             self._cache.clear()
+            self._wheel.limpar()
             self._memory_usage = 0
-            gc.collect()
             logger.info("Cache completamente limpo")
 
     def _remove_entry(self, key: str) -> None:
@@ -143,41 +195,97 @@ class SmartCache:
         if key in self._cache:
             entry = self._cache.pop(key)
             self._memory_usage -= entry.memory_size
+            self._wheel.cancelar(key)
 
     def _evict_lru(self) -> None:
         """Remove a entrada menos recentemente usada."""
         if self._cache:
-            key, _ = self._cache.popitem(last=False)  # Remove o primeiro (LRU)
+            key, entry = self._cache.popitem(last=False)  # Remove o primeiro (LRU)
+            self._memory_usage -= entry.memory_size
+            self._wheel.cancelar(key)
             self._evictions += 1
             logger.debug(f"Entrada LRU removida: {key}")
 
+    def _evict_cheapest(self) -> None:
+        """Entre as AMOSTRA_DESPEJO menos recentes, remove a de menor custo por byte."""
+        vitima = None
+        menor = None
+        for i, (key, entry) in enumerate(self._cache.items()):
+            if i >= AMOSTRA_DESPEJO:
+                break
+            prioridade = _prioridade(entry.cost, entry.memory_size)
+            if menor is None or prioridade < menor:
+                vitima, menor = key, prioridade
+        if vitima is not None:
+            self.evict(vitima)
+
+    def evict(self, key: str) -> int:
+        """Remove `key` contando como remoção por memória; retorna os bytes liberados."""
+        with self._lock:
+            entry = self._cache.pop(key, None)
+            if entry is None:
+                return 0
+            self._memory_usage -= entry.memory_size
+            self._wheel.cancelar(key)
+            self._evictions += 1
+            return entry.memory_size
+
+    def eviction_candidates(self) -> List[Tuple[float, float, str, int]]:
+        """(custo por byte, último acesso, chave, bytes) de cada entrada."""
+        with self._lock:
+            return [
+                (_prioridade(entry.cost, entry.memory_size), entry.last_accessed, key, entry.memory_size)
+                for key, entry in self._cache.items()
+            ]
+
+    def _expire(self, current_time: float) -> int:
+        """Remove as entradas cujo prazo passou (só as que o wheel devolve)."""
+        expired = 0
+        for key in self._wheel.avancar(current_time):
+            entry = self._cache.pop(key, None)
+            if entry is not None:
+                self._memory_usage -= entry.memory_size
+                expired += 1
+        self._expirations += expired
+        return expired
+
     def _cleanup_expired(self) -> None:
         """Remove entradas expiradas."""
         current_time = time.time()
-        expired_keys = []
-
-        for key, entry in self._cache.items():
-            if current_time - entry.created_at > self.default_ttl:
-                expired_keys.append(key)
-
-        for key in expired_keys:
-            self._remove_entry(key)
+        expired = self._expire(current_time)
 
-        if expired_keys:
-            logger.info(f"Limpeza: {len(expired_keys)} entradas expiradas removidas")
+        if expired:
+            logger.info(f"Limpeza: {expired} entradas expiradas removidas")
 
         self._last_cleanup = current_time
-        gc.collect()  # Força garbage collection
+
+    def cleanup_expired(self) -> None:
+        """Remove entradas expiradas (com o lock)."""
+        with self._lock:
+            self._cleanup_expired()
 
     def _estimate_size(self, obj: Any) -> int:
-        """Estima o tamanho em bytes de um objeto."""
-        try:
-            import sys
-            if hasattr(obj, '__dict__'):
-                return sys.getsizeof(obj) + sum(sys.getsizeof(v) for v in obj.__dict__.values())
-            return sys.getsizeof(obj)
-        except:
-            return 1024  # Estimativa padrão de 1KB
+        """
+        Estima o tamanho em bytes de um objeto, percorrendo o que ele referencia
+        (containers, atributos e slots). Calculado uma vez, na inserção.
+        """
+        return medir_bytes(obj)
+
+    def get_counters(self) -> Dict[str, int]:
+        """
+        Contadores brutos sem pegar o lock (leituras de inteiros atômicas no CPython).
+        Usado pela exportação de métricas, que não pode bloquear as requisições.
+        """
+        return {
+            "entries": len(self._cache),
+            "memory_bytes": self._memory_usage,
+            "memory_limit_bytes": self.max_memory_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+            "shards": 1,
+        }
 
     def get_stats(self) -> Dict[str, Any]:
         """Retorna estatísticas do cache."""
@@ -187,6 +295,8 @@ class SmartCache:
 
             return {
                 "entries": len(self._cache),
+                "memory_usage_bytes": self._memory_usage,
+                "avg_entry_bytes": self._memory_usage // len(self._cache) if self._cache else 0,
                 "memory_usage_mb": round(self._memory_usage / 1024 / 1024, 2),
                 "memory_limit_mb": round(self.max_memory_bytes / 1024 / 1024, 2),
                 "memory_usage_percent": round(self._memory_usage / self.max_memory_bytes * 100, 2),
@@ -194,52 +304,315 @@ class SmartCache:
                 "misses": self._misses,
                 "hit_rate_percent": round(hit_rate, 2),
                 "evictions": self._evictions,
+                "expirations": self._expirations,
                 "last_cleanup": self._last_cleanup
             }
 
 
+class _SegmentoClock(SmartCache):
+    """
+    Segmento de ShardedSmartCache. A leitura só marca o bit de referência da
+    entrada (sem reordenar a fila); a ordem de recência é aproximada pelo
+    CLOCK na hora de remover.
+    """
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            current_time = time.time()
+            if current_time >= entry.expires_at:
+                self._remove_entry(key)
+                self._expirations += 1
+                self._misses += 1
+                return None
+
+            entry.last_accessed = current_time
+            entry.access_count += 1
+            entry.referenced = True
+            self._hits += 1
+            return entry.value
+
+    def _evict_cheapest(self) -> None:
+        """
+        O ponteiro percorre a fila a partir da frente: entradas com o bit ligado
+        ganham segunda chance (bit zerado, vão para o fim); entre as primeiras
+        AMOSTRA_DESPEJO sem referência, sai a de menor custo por byte.
+        """
+        while self._cache:
+            vitima = None
+            menor = None
+            sem_referencia = 0
+            segunda_chance = []
+            for key, entry in self._cache.items():
+                if entry.referenced:
+                    segunda_chance.append(key)
+                    continue
+                prioridade = _prioridade(entry.cost, entry.memory_size)
+                if menor is None or prioridade < menor:
+                    vitima, menor = key, prioridade
+                sem_referencia += 1
+                if sem_referencia >= AMOSTRA_DESPEJO:
+                    break
+            for key in segunda_chance:
+                self._cache[key].referenced = False
+                self._cache.move_to_end(key)
+            if vitima is not None:
+                self.evict(vitima)
+                return
+
+    def liberar_uma(self) -> int:
+        """Remove uma entrada pelo CLOCK (com o lock); retorna os bytes liberados."""
+        with self._lock:
+            if not self._cache:
+                return 0
+            antes = self._memory_usage
+            self._evict_cheapest()
+            return antes - self._memory_usage
+
+
+class ShardedSmartCache:
+    """
+    SmartCache particionado em segmentos independentes (lock striping).
+
+    A chave escolhe o segmento pelo hash; cada segmento tem lock, timing wheel
+    e contadores próprios, então threads do threadpool que acessam chaves
+    diferentes raramente disputam o mesmo lock. Leituras não reordenam nada
+    (CLOCK). O limite de memória é do cache inteiro: um valor é recusado só se
+    não couber no total, e acima do total sai uma entrada do segmento que
+    ocupa mais memória (um lock por vez). Acertos, memória e limites são
+    somados nas estatísticas, com a mesma interface do SmartCache.
+    """
+
+    def __init__(self,
+                 max_memory_mb: int = 100,
+                 default_ttl: int = 300,
+                 cleanup_interval: int = 1800,
+                 default_cost: float = 1.0,
+                 shards: int = 8):
+        self.shards = max(1, shards)
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self.default_ttl = default_ttl
+        self.cleanup_interval = cleanup_interval
+        self.default_cost = default_cost
+
+        # Cada segmento aceita até o limite total; o total é controlado em set()
+        self._segmentos: List[_SegmentoClock] = [
+            _SegmentoClock(max_memory_mb, default_ttl, cleanup_interval, default_cost)
+            for _ in range(self.shards)
+        ]
+
+        logger.info(f"ShardedSmartCache inicializado - Limite: {max_memory_mb}MB, "
+                    f"{self.shards} segmentos, TTL: {default_ttl}s")
+
+    def _segmento(self, key: str) -> _SegmentoClock:
+        return self._segmentos[hash(key) % self.shards]
+
+    @property
+    def _memory_usage(self) -> int:
+        return sum(segmento._memory_usage for segmento in self._segmentos)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Obtém valor do cache."""
+        return self._segmento(key).get(key)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, cost: Optional[float] = None) -> None:
+        """Armazena valor no segmento da chave (ver SmartCache.set)."""
+        self._segmento(key).set(key, value, ttl=ttl, cost=cost)
+        self._reduzir()
+
+    def _reduzir(self) -> None:
+        """Remove entradas do maior segmento enquanto o total passar do limite."""
+        while self._memory_usage > self.max_memory_bytes:
+            maior = max(self._segmentos, key=lambda segmento: segmento._memory_usage)
+            if not maior.liberar_uma():
+                break
+
+    def delete(self, key: str) -> bool:
+        """Remove entrada do cache."""
+        return self._segmento(key).delete(key)
+
+    def evict(self, key: str) -> int:
+        """Remove `key` contando como remoção por memória; retorna os bytes liberados."""
+        return self._segmento(key).evict(key)
+
+    def clear(self) -> None:
+        """Limpa todos os segmentos."""
+        for segmento in self._segmentos:
+            segmento.clear()
+
+    def eviction_candidates(self) -> List[Tuple[float, float, str, int]]:
+        """(custo por byte, último acesso, chave, bytes) de cada entrada."""
+        candidatos = []
+        for segmento in self._segmentos:
+            candidatos.extend(segmento.eviction_candidates())
+        return candidatos
+
+    def cleanup_expired(self) -> None:
+        """Remove entradas expiradas de cada segmento (um lock por vez)."""
+        for segmento in self._segmentos:
+            segmento.cleanup_expired()
+
+    _cleanup_expired = cleanup_expired
+
+    def get_counters(self) -> Dict[str, int]:
+        """Soma dos contadores dos segmentos, sem pegar locks."""
+        total = {"entries": 0, "memory_bytes": 0, "hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        for segmento in self._segmentos:
+            contadores = segmento.get_counters()
+            for campo in total:
+                total[campo] += contadores[campo]
+        total["memory_limit_bytes"] = self.max_memory_bytes
+        total["shards"] = self.shards
+        return total
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estatísticas globais do cache (somadas entre os segmentos)."""
+        por_segmento = [segmento.get_stats() for segmento in self._segmentos]
+        entries = sum(s["entries"] for s in por_segmento)
+        memory = sum(s["memory_usage_bytes"] for s in por_segmento)
+        hits = sum(s["hits"] for s in por_segmento)
+        misses = sum(s["misses"] for s in por_segmento)
+        total_requests = hits + misses
+
+        return {
+            "entries": entries,
+            "memory_usage_bytes": memory,
+            "avg_entry_bytes": memory // entries if entries else 0,
+            "memory_usage_mb": round(memory / 1024 / 1024, 2),
+            "memory_limit_mb": round(self.max_memory_bytes / 1024 / 1024, 2),
+            "memory_usage_percent": round(memory / self.max_memory_bytes * 100, 2),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate_percent": round(hits / total_requests * 100 if total_requests else 0, 2),
+            "evictions": sum(s["evictions"] for s in por_segmento),
+            "expirations": sum(s["expirations"] for s in por_segmento),
+            "last_cleanup": max(s["last_cleanup"] for s in por_segmento),
+            "shards": self.shards,
+            "shard_entries": [s["entries"] for s in por_segmento],
+        }
+
+
+CacheLike = Union[SmartCache, ShardedSmartCache]
+
+
 class CacheManager:
     """
     Gerenciador global de caches da aplicação.
     """
 
     def __init__(self):
-        self.caches: Dict[str, SmartCache] = {}
+        self.caches: Dict[str, CacheLike] = {}
+        self.subsystems: Dict[str, Subsistema] = {}
         self._monitor_thread = None
         self._monitoring = False
+        self.pressure_evictions = 0
+        self.pressure_freed_bytes = 0
 
         # Criar caches padrão
         self.search_cache = self.create_cache(
             "search",
-            max_memory_mb=settings.MAX_CACHE_MEMORY_MB // 2,  # 50% para search
-            default_ttl=settings.CACHE_TTL
+            max_memory_mb=settings.MAX_CACHE_MEMORY_MB // 4,  # 25% para search
+            default_ttl=settings.CACHE_TTL,
+            shards=settings.CACHE_SHARDS
         )
 
         self.data_cache = self.create_cache(
             "data",
             max_memory_mb=settings.MAX_CACHE_MEMORY_MB // 4,  # 25% para data
-            default_ttl=settings.CACHE_TTL * 2
+            default_ttl=settings.CACHE_TTL * 2,
+            shards=settings.CACHE_SHARDS
         )
 
         self.api_cache = self.create_cache(
             "api",
             max_memory_mb=settings.MAX_CACHE_MEMORY_MB // 4,  # 25% para API
-            default_ttl=settings.CACHE_TTL
+            default_ttl=settings.CACHE_TTL,
+            shards=settings.CACHE_SHARDS
+        )
+
+        # HTML renderizado; a chave inclui a versão do dataset, então o TTL é longo
+        self.paginas_cache = self.create_cache(
+            "paginas",
+            max_memory_mb=settings.MAX_CACHE_MEMORY_MB // 4,  # 25% para páginas
+            default_ttl=settings.CACHE_TTL * 12,
+            default_cost=20.0,  # Renderização de template
+            shards=settings.CACHE_SHARDS
         )
 
         self.start_monitoring()
 
-    def create_cache(self, name: str, **kwargs) -> SmartCache:
-        """Cria um novo cache nomeado."""
-        cache = SmartCache(**kwargs)
+    def create_cache(self, name: str, shards: int = 1, **kwargs) -> CacheLike:
+        """Cria um novo cache nomeado (particionado se `shards` > 1)."""
+        if shards > 1:
+            cache = ShardedSmartCache(shards=shards, **kwargs)
+        else:
+            cache = SmartCache(**kwargs)
         self.caches[name] = cache
-        logger.info(f"Cache '{name}' criado")
+        logger.info(f"Cache '{name}' criado ({shards} segmento(s))")
         return cache
 
-    def get_cache(self, name: str) -> Optional[SmartCache]:
+    def get_cache(self, name: str) -> Optional[CacheLike]:
         """Obtém cache por nome."""
         return self.caches.get(name)
 
+    def register_subsystem(self, name: str, size_fn: Callable[[], int],
+                           cost_ms: Union[float, Callable[[], float]],
+                           release_fn: Optional[Callable[[], None]] = None,
+                           pinned: bool = False) -> None:
+        """
+        Registra uma estrutura para a política de memória. `pinned` (ou sem
+        `release_fn`) só aparece nas estatísticas: nunca é descartada.
+        """
+        self.subsystems[name] = Subsistema(name, size_fn, cost_ms, release_fn, pinned)
+
+    def evict_by_cost(self, target_bytes: int) -> int:
+        """
+        Libera ~`target_bytes` removendo primeiro o que tem menor custo de
+        reconstrução por byte (empate: acesso mais antigo). Retorna os bytes liberados.
+        """
+        candidatos = []
+        for name, cache in list(self.caches.items()):
+            for prioridade, acesso, key, size in cache.eviction_candidates():
+                candidatos.append((prioridade, acesso, cache, key, size))
+        for sub in list(self.subsystems.values()):
+            if sub.pinned or sub.release_fn is None:
+                continue
+            size = sub.size()
+            if size > 0:
+                candidatos.append((_prioridade(sub.cost(), size), 0.0, sub, None, size))
+        candidatos.sort(key=lambda c: (c[0], c[1]))
+
+        liberados = 0
+        for _, _, alvo, key, size in candidatos:
+            if liberados >= target_bytes:
+                break
+            if isinstance(alvo, Subsistema):
+                try:
+                    alvo.release_fn()
+                except Exception as e:
+                    logger.debug(f"Erro ao liberar subsistema {alvo.name}: {e}")
+                    continue
+                logger.info(f"Subsistema liberado por pressão de memória: {alvo.name} ({size} bytes)")
+                liberados += size
+            else:
+                liberados += alvo.evict(key)
+            self.pressure_evictions += 1
+
+        self.pressure_freed_bytes += liberados
+        return liberados
+
+    def releasable_bytes(self) -> int:
+        """Bytes que a política pode liberar (caches + subsistemas não fixos)."""
+        total = sum(cache._memory_usage for cache in list(self.caches.values()))
+        for sub in list(self.subsystems.values()):
+            if not sub.pinned and sub.release_fn is not None:
+                total += sub.size()
+        return total
+
     def start_monitoring(self):
         """Inicia monitoramento de memória."""
         if self._monitoring:
@@ -272,23 +645,22 @@ class CacheManager:
 
     def cleanup_expired(self):
         """Limpa entradas expiradas de todos os caches."""
-        for name, cache in self.caches.items():
-            cache._cleanup_expired()
+        for name, cache in list(self.caches.items()):
+            cache.cleanup_expired()
 
-        gc.collect()
         logger.info("Limpeza preventiva de caches executada")
 
-    def emergency_cleanup(self):
-        """Limpeza emergencial - remove 50% das entradas de cada cache."""
-        for name, cache in self.caches.items():
-            with cache._lock:
-                entries_to_remove = len(cache._cache) // 2
-                for _ in range(entries_to_remove):
-                    if cache._cache:
-                        cache._evict_lru()
+    def emergency_cleanup(self, fraction: float = 0.5):
+        """
+        Limpeza emergencial: libera `fraction` da memória descartável pela
+        política de custo (o índice de busca e demais subsistemas fixos ficam).
+        """
+        alvo = int(self.releasable_bytes() * fraction)
+        liberados = self.evict_by_cost(alvo)
 
+        # Uma coleta só, para ciclos soltos pelas remoções
         gc.collect()
-        logger.warning("Limpeza emergencial de caches executada")
+        logger.warning(f"Limpeza emergencial de caches executada - {liberados / 1024 / 1024:.2f}MB liberados")
 
     def get_global_stats(self) -> Dict[str, Any]:
         """Retorna estatísticas de todos os caches."""
@@ -299,13 +671,14 @@ class CacheManager:
         for name, cache in self.caches.items():
             cache_stats = cache.get_stats()
             stats[name] = cache_stats
-            total_memory += cache_stats["memory_usage_mb"]
+            total_memory += cache_stats["memory_usage_bytes"]
             total_entries += cache_stats["entries"]
 
         try:
             system_memory = psutil.virtual_memory()
             stats["system"] = {
-                "total_cache_memory_mb": round(total_memory, 2),
+                "total_cache_memory_bytes": total_memory,
+                "total_cache_memory_mb": round(total_memory / 1024 / 1024, 2),
                 "total_entries": total_entries,
                 "system_memory_percent": system_memory.percent,
                 "system_memory_available_mb": round(system_memory.available / 1024 / 1024, 2)
@@ -313,6 +686,15 @@ class CacheManager:
         except:
             stats["system"] = {"error": "Não foi possível obter estatísticas do sistema"}
 
+        stats["subsystems"] = {
+            name: {"size_bytes": sub.size(), "cost_ms": round(sub.cost(), 2), "pinned": sub.pinned}
+            for name, sub in list(self.subsystems.items())
+        }
+        stats["pressure"] = {
+            "evictions": self.pressure_evictions,
+            "freed_bytes": self.pressure_freed_bytes,
+        }
+
         return stats
 
     def shutdown(self):
@@ -364,9 +746,10 @@ def smart_cache(cache_name: str = "data", ttl: Optional[int] = None):
             if result is not None:
                 return result
 
-            # Executar função e armazenar resultado
+            # Executar função e armazenar resultado (o tempo gasto é o custo de reconstrução)
+            inicio = time.perf_counter()
             result = func(*args, **kwargs)
-            cache.set(key, result, ttl)
+            cache.set(key, result, ttl, cost=(time.perf_counter() - inicio) * 1000)
 
             return result
 
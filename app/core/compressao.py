@@ -0,0 +1,81 @@
+"""
+Compressão de conteúdo estático/pré-renderizado (gzip e brotli).
+
+O brotli é opcional: sem o pacote `brotli` instalado, apenas as variantes
+gzip são geradas e `comprimir_brotli` retorna None.
+"""
+import gzip
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional
+
+try:
+    import brotli
+    BROTLI_DISPONIVEL = True
+except ImportError:  # pragma: no cover - depende do ambiente
+    brotli = None
+    BROTLI_DISPONIVEL = False
+
+
+# Codificações que servimos pré-comprimidas; "*" no header vale para elas
+CODIFICACOES_SUPORTADAS = ("br", "gzip")
+
+
+@lru_cache(maxsize=256)
+def codificacoes_aceitas(accept_encoding: str) -> FrozenSet[str]:
+    """
+    Codificações que o cliente aceita segundo o header Accept-Encoding: só as
+    com q > 0 ("gzip;q=0" recusa gzip). "*" cobre as suportadas que não foram
+    listadas explicitamente.
+    """
+    pesos: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        partes = item.split(";")
+        codificacao = partes[0].strip()
+        if not codificacao:
+            continue
+        if codificacao == "x-gzip":
+            codificacao = "gzip"
+        q = 1.0
+        for parametro in partes[1:]:
+            nome, _, valor = parametro.partition("=")
+            if nome.strip() == "q":
+                try:
+                    q = float(valor.strip())
+                except ValueError:
+                    q = 0.0
+        pesos[codificacao] = q
+
+    aceitas = {c for c, q in pesos.items() if q > 0 and c != "*"}
+    if pesos.get("*", 0) > 0:
+        aceitas.update(c for c in CODIFICACOES_SUPORTADAS if c not in pesos)
+    return frozenset(aceitas)
+
+
+def comprimir_gzip(dados: bytes, nivel: int = 9) -> bytes:
+    # mtime=0 deixa a saída determinística (mesmo conteúdo -> mesmos bytes)
+    return gzip.compress(dados, compresslevel=nivel, mtime=0)
+
+
+def comprimir_brotli(dados: bytes, qualidade: int = 11) -> Optional[bytes]:
+    if not BROTLI_DISPONIVEL:
+        return None
+    return brotli.compress(dados, quality=qualidade)
+
+
+def escrever_variantes(caminho: Path, dados: bytes) -> List[Path]:
+    """Grava `caminho`, `caminho.gz` e (se disponível) `caminho.br`."""
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    caminho.write_bytes(dados)
+    gravados = [caminho]
+
+    caminho_gz = caminho.with_name(caminho.name + ".gz")
+    caminho_gz.write_bytes(comprimir_gzip(dados))
+    gravados.append(caminho_gz)
+
+    dados_br = comprimir_brotli(dados)
+    if dados_br is not None:
+        caminho_br = caminho.with_name(caminho.name + ".br")
+        caminho_br.write_bytes(dados_br)
+        gravados.append(caminho_br)
+    return gravados
@@ -35,6 +35,10 @@ class Settings:
     # Configurações de busca fuzzy
     FUZZY_SEARCH_THRESHOLD: int = int(os.getenv("FUZZY_SEARCH_THRESHOLD", "70"))  # Limiar de similaridade (0-100)
     MAX_SEARCH_RESULTS: int = int(os.getenv("MAX_SEARCH_RESULTS", "20"))  # Número máximo de resultados
+    # Tempos por etapa da busca: header Server-Timing e anel de consultas lentas (admin)
+    SEARCH_SERVER_TIMING: bool = os.getenv("SEARCH_SERVER_TIMING", "True").lower() == "true"
+    SEARCH_SLOW_QUERY_MS: float = float(os.getenv("SEARCH_SLOW_QUERY_MS", "100"))
+    SEARCH_SLOW_QUERY_BUFFER: int = int(os.getenv("SEARCH_SLOW_QUERY_BUFFER", "200"))
 
     # Configuração CORS (Cross-Origin Resource Sharing)
     CORS_ORIGINS: list = os.getenv("CORS_ORIGINS", "http://localhost:8080,http://127.0.0.1:8080,https://multasgo.com.br,https://www.multasgo.com.br").split(",")
@@ -45,9 +49,34 @@ class Settings:
     # Configurações de segurança avançadas
     RATE_LIMIT_REQUESTS: int = int(os.getenv("RATE_LIMIT_REQUESTS", "100"))  # Requests por minuto
     RATE_LIMIT_WINDOW: int = int(os.getenv("RATE_LIMIT_WINDOW", "60"))  # Janela em segundos
+    # Limites por prefixo de rota na mesma janela ("prefixo=N,prefixo=N")
+    RATE_LIMIT_ROUTES: str = os.getenv("RATE_LIMIT_ROUTES", "/api/v1/infracoes/smart=300")
+    RATE_LIMIT_MAX_CLIENTS: int = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))  # Baldes em memória
+    # "memory" (por processo), "shared" (entre workers) ou "auto" (shared se WORKERS>1)
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "auto")
+    RATE_LIMIT_SHARED_PATH: str = os.getenv("RATE_LIMIT_SHARED_PATH", "")  # Padrão: /dev/shm (o nome recebe formato e nº de slots)
     BLOCK_DURATION: int = int(os.getenv("BLOCK_DURATION", "300"))  # Tempo de bloqueio (5 min)
     MAX_REQUEST_SIZE: int = int(os.getenv("MAX_REQUEST_SIZE", str(1024 * 1024)))  # 1MB
+    BODY_SCAN_LIMIT: int = int(os.getenv("BODY_SCAN_LIMIT", str(64 * 1024)))  # Bytes do body varridos
     ENABLE_BOT_PROTECTION: bool = os.getenv("ENABLE_BOT_PROTECTION", "True").lower() == "true"
+    # Listas extras de CIDR para a segurança geográfica (uma faixa por linha)
+    GEO_CHINA_RANGES_FILE: str = os.getenv("GEO_CHINA_RANGES_FILE", "")
+    GEO_MALICIOUS_RANGES_FILE: str = os.getenv("GEO_MALICIOUS_RANGES_FILE", "")
+    GEO_IP_CACHE_SIZE: int = int(os.getenv("GEO_IP_CACHE_SIZE", "10000"))  # Vereditos em LRU
+    UA_CACHE_SIZE: int = int(os.getenv("UA_CACHE_SIZE", "4096"))  # User-Agents classificados em LRU
+    # Estado por IP dos middlewares (suspeita, erros, CAPTCHA): limite de IPs e expiração por inatividade
+    IP_STATE_MAX_ENTRIES: int = int(os.getenv("IP_STATE_MAX_ENTRIES", "100000"))
+    IP_STATE_TTL: int = int(os.getenv("IP_STATE_TTL", "3600"))  # Segundos
+    # Janela dos percentis de latência (histogramas por rota), dividida em fatias
+    METRICS_WINDOW_SECONDS: int = int(os.getenv("METRICS_WINDOW_SECONDS", "300"))
+    METRICS_WINDOW_SLICES: int = int(os.getenv("METRICS_WINDOW_SLICES", "10"))
+    # Endpoint /metrics (Prometheus): exige "Authorization: Bearer <METRICS_TOKEN>";
+    # sem token só responde com DEBUG=true
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")
+    # tracemalloc desde o startup (padrão: só sob demanda em /api/v1/admin/memoria/alocacoes)
+    TRACEMALLOC_ENABLED: bool = os.getenv("TRACEMALLOC_ENABLED", "False").lower() == "true"
+    TRACEMALLOC_FRAMES: int = int(os.getenv("TRACEMALLOC_FRAMES", "1"))  # Frames guardados por alocação
 
     # Configurações de performance
     DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
@@ -58,6 +87,7 @@ class Settings:
     # Configurações de Cache Inteligente
     MAX_CACHE_MEMORY_MB: int = int(os.getenv("MAX_CACHE_MEMORY_MB", "100"))  # Limite de 100MB para cache
     CACHE_CLEANUP_INTERVAL: int = int(os.getenv("CACHE_CLEANUP_INTERVAL", "1800"))  # Limpeza a cada 30min
+    CACHE_SHARDS: int = int(os.getenv("CACHE_SHARDS", "8"))  # Segmentos (lock próprio) por cache; 1 = SmartCache simples
 
     # HTTP Connection Pool
     HTTP_POOL_CONNECTIONS: int = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
@@ -68,6 +98,15 @@ class Settings:
     ENABLE_WARMUP: bool = os.getenv("ENABLE_WARMUP", "True").lower() == "true"
     WARMUP_QUERIES: list = os.getenv("WARMUP_QUERIES", "velocidade,alcool,celular").split(",")
 
+    # URL pública (sitemap e páginas pré-renderizadas)
+    SITE_URL: str = os.getenv("SITE_URL", "https://multasgo.com.br")
+
+    # Administração (endpoints /api/v1/admin ficam desabilitados sem chave)
+    ADMIN_API_KEY: str = os.getenv("ADMIN_API_KEY", "")
+    DATASET_CSV_PATH: str = os.getenv("DATASET_CSV_PATH", "BANCODADOS_LIMPO.csv")
+    # Arquivo trocado a cada escrita no catálogo; os workers reconstroem o índice ao vê-lo mudar
+    DATASET_MARKER_PATH: str = os.getenv("DATASET_MARKER_PATH", "")  # Padrão: /dev/shm
+
     # Configurações de SSL/TLS para produção
     SSL_KEYFILE: str = os.getenv("SSL_KEYFILE")
     SSL_CERTFILE: str = os.getenv("SSL_CERTFILE")
@@ -0,0 +1,158 @@
+"""
+Histogramas de latência com buckets logarítmicos (estilo HDR) e memória fixa.
+
+Os valores são gravados em microssegundos: abaixo de 32µs cada valor tem seu
+bucket; acima, cada potência de 2 é dividida em 16 buckets, o que limita o erro
+relativo dos percentis a ~3%. São 480 contadores por histograma (até 2^33µs,
+~143 min); registrar é O(1), histogramas se somam bucket a bucket e os
+percentis saem de uma passada pelos contadores, sem ordenar amostras.
+
+`HistogramaJanela` mantém um anel de fatias de tempo além do acumulado desde o
+início, para percentis sobre os últimos N segundos.
+"""
+import time
+from array import array
+from typing import Iterator, Optional, Tuple
+
+BITS_SUB = 5
+SUB = 1 << BITS_SUB          # Buckets lineares (0..31µs)
+METADE = SUB >> 1            # Buckets por potência de 2 acima disso
+TOTAL_BUCKETS = SUB + 28 * METADE
+_VAZIO = bytes(8 * TOTAL_BUCKETS)
+
+
+def indice_bucket(micros: int) -> int:
+    if micros < SUB:
+        return micros if micros > 0 else 0
+    shift = micros.bit_length() - BITS_SUB
+    return min(SUB + (shift - 1) * METADE + ((micros >> shift) - METADE), TOTAL_BUCKETS - 1)
+
+
+def limites_bucket(indice: int) -> Tuple[int, int]:
+    """[inferior, superior) do bucket, em microssegundos."""
+    if indice < SUB:
+        return indice, indice + 1
+    k = indice - SUB
+    shift = k // METADE + 1
+    base = k % METADE + METADE
+    return base << shift, (base + 1) << shift
+
+
+class Histograma:
+    """Contagens por bucket logarítmico, soma e máximo (valores em segundos)."""
+
+    __slots__ = ("contagens", "total", "soma", "maximo")
+
+    def __init__(self):
+        self.contagens = array("Q", _VAZIO)
+        self.total = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def registrar(self, segundos: float):
+        self.contagens[indice_bucket(int(segundos * 1_000_000))] += 1
+        self.total += 1
+        self.soma += segundos
+        if segundos > self.maximo:
+            self.maximo = segundos
+
+    def mesclar(self, outro: "Histograma") -> "Histograma":
+        """Soma `outro` neste histograma (retorna self)."""
+        if outro.total:
+            contagens = self.contagens
+            for i, c in enumerate(outro.contagens):
+                if c:
+                    contagens[i] += c
+            self.total += outro.total
+            self.soma += outro.soma
+            self.maximo = max(self.maximo, outro.maximo)
+        return self
+
+    def zerar(self):
+        self.contagens = array("Q", _VAZIO)
+        self.total = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+
+    def copiar(self) -> "Histograma":
+        return Histograma().mesclar(self)
+
+    @property
+    def media(self) -> float:
+        return self.soma / self.total if self.total else 0.0
+
+    def percentil(self, p: float) -> float:
+        """Valor (segundos) no percentil `p` (0-100): ponto médio do bucket."""
+        if not self.total:
+            return 0.0
+        alvo = max(1, int(self.total * p / 100.0 + 0.5))
+        acumulado = 0
+        for i, c in enumerate(self.contagens):
+            if c:
+                acumulado += c
+                if acumulado >= alvo:
+                    inferior, superior = limites_bucket(i)
+                    return min((inferior + superior) / 2 / 1_000_000, self.maximo)
+        return self.maximo
+
+    def buckets(self) -> Iterator[Tuple[float, int]]:
+        """(limite superior em segundos, contagem) dos buckets não vazios."""
+        for i, c in enumerate(self.contagens):
+            if c:
+                yield limites_bucket(i)[1] / 1_000_000, c
+
+    def resumo(self) -> dict:
+        return {
+            "count": self.total,
+            "avg": self.media,
+            "p50": self.percentil(50),
+            "p95": self.percentil(95),
+            "p99": self.percentil(99),
+            "max": self.maximo,
+        }
+
+
+class HistogramaJanela:
+    """Histograma acumulado mais um anel de `fatias` fatias cobrindo `janela` segundos."""
+
+    __slots__ = ("janela", "largura", "acumulado", "_fatias", "_epocas")
+
+    def __init__(self, janela: float = 300, fatias: int = 10):
+        self.janela = janela
+        self.largura = janela / fatias
+        self.acumulado = Histograma()
+        # Fatias alocadas só quando recebem valores
+        self._fatias = [None] * fatias
+        self._epocas = [-1] * fatias
+
+    def registrar(self, segundos: float, agora: Optional[float] = None):
+        if agora is None:
+            agora = time.time()
+        self.acumulado.registrar(segundos)
+        epoca = int(agora / self.largura)
+        i = epoca % len(self._fatias)
+        fatia = self._fatias[i]
+        if fatia is None:
+            fatia = self._fatias[i] = Histograma()
+        elif self._epocas[i] != epoca:
+            fatia.zerar()
+        self._epocas[i] = epoca
+        fatia.registrar(segundos)
+
+    def snapshot(self, janela: Optional[float] = None, agora: Optional[float] = None) -> Histograma:
+        """Cópia dos últimos `janela` segundos (limitado à janela configurada; None = janela toda)."""
+        if agora is None:
+            agora = time.time()
+        n = len(self._fatias)
+        quantas = n if janela is None else max(1, min(n, int(-(-janela // self.largura))))
+        atual = int(agora / self.largura)
+        resultado = Histograma()
+        for fatia, epoca in zip(self._fatias, self._epocas):
+            if fatia is not None and atual - quantas < epoca <= atual:
+                resultado.mesclar(fatia)
+        return resultado
+
+    def zerar(self):
+        self.acumulado.zerar()
+        self._fatias = [None] * len(self._fatias)
+        self._epocas = [-1] * len(self._epocas)
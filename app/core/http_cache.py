@@ -0,0 +1,51 @@
+"""
+Validadores HTTP (ETag / If-None-Match) baseados na versão do dataset.
+
+A versão é o hash de conteúdo do índice em memória: só muda quando uma escrita
+administrativa altera a tabela, então a ETag de uma resposta depende apenas
+dela e dos parâmetros normalizados da requisição. Isso permite responder
+304 antes de qualquer SQL ou pontuação de busca.
+"""
+import hashlib
+from typing import Any, Dict
+
+from fastapi import Request, Response, status
+
+
+def gerar_etag(versao: str, *partes: Any) -> str:
+    """ETag fraca (o GZip da borda muda os bytes, não a representação)."""
+    chave = "\x1f".join(str(p) for p in partes)
+    resumo = hashlib.sha1(chave.encode("utf-8")).hexdigest()[:12]
+    return f'W/"{versao}-{resumo}"'
+
+
+def _opaca(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_corresponde(request: Request, etag: str) -> bool:
+    """Comparação fraca contra If-None-Match (aceita lista e '*')."""
+    cabecalho = request.headers.get("if-none-match")
+    if not cabecalho:
+        return False
+    if cabecalho.strip() == "*":
+        return True
+    alvo = _opaca(etag)
+    return any(_opaca(candidata) == alvo for candidata in cabecalho.split(","))
+
+
+def cabecalhos_cache(etag: str, max_age: int) -> Dict[str, str]:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}",
+        "Vary": "Accept-Encoding",
+    }
+
+
+def nao_modificado(etag: str, max_age: int) -> Response:
+    """Resposta 304 sem corpo, repetindo os validadores."""
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers=cabecalhos_cache(etag, max_age),
+    )
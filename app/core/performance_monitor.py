@@ -12,6 +12,7 @@ from collections import deque, defaultdict
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 
+from app.core import alocacoes
 from app.core.config import settings
 from app.core.logger import logger
 
@@ -80,12 +81,12 @@ class PerformanceMonitor:
             "emergency_cleanups": 0
         }
 
-        # Inicializar tracemalloc se disponível
-        if not tracemalloc.is_tracing():
+        # tracemalloc só sob demanda (admin) ou com TRACEMALLOC_ENABLED: tem custo em toda alocação
+        self._snapshot_vazamento: Optional[tracemalloc.Snapshot] = None
+        if settings.TRACEMALLOC_ENABLED:
             try:
-                tracemalloc.start()
-                logger.info("Memory tracing iniciado")
-            except:
+                alocacoes.iniciar()
+            except Exception:
                 logger.warning("Não foi possível iniciar memory tracing")
 
     def start_monitoring(self):
@@ -178,9 +179,13 @@ class PerformanceMonitor:
         """Verifica se precisa executar otimizações."""
         current_time = time.time()
 
-        # Garbage collection automático
+        # Garbage collection completo só com memória alta: fora disso os limiares
+        # automáticos do GC bastam, e uma coleta completa pausa as requisições
         if current_time - self.last_gc_time > self.gc_frequency:
-            self._run_garbage_collection()
+            if psutil.virtual_memory().percent >= self.memory_warning_threshold:
+                self._run_garbage_collection()
+            else:
+                self.last_gc_time = current_time
 
         # Limpeza de cache automática
         if current_time - self.last_cache_cleanup > self.cache_cleanup_frequency:
@@ -202,10 +207,24 @@ class PerformanceMonitor:
             # Se a memória está crescendo consistentemente
             if growth_rate > 10:  # Mais de 10MB por amostra
                 logger.warning(f"Possível memory leak detectado - Taxa de crescimento: {growth_rate:.2f}MB/sample")
+                self._registrar_origem_crescimento()
 
                 # Forçar garbage collection mais agressivo
                 self._aggressive_cleanup()
 
+    def _registrar_origem_crescimento(self):
+        """Com o tracemalloc ligado, loga onde a memória cresceu desde o último alerta."""
+        if not tracemalloc.is_tracing():
+            return
+        try:
+            atual = alocacoes.snapshot()
+            linhas = alocacoes.resumir_crescimento(self._snapshot_vazamento, atual)
+            self._snapshot_vazamento = atual
+            if linhas:
+                logger.warning("Maiores pontos de alocação: " + "; ".join(linhas))
+        except Exception as e:
+            logger.debug(f"Erro ao analisar alocações: {e}")
+
     def _run_garbage_collection(self):
         """Executa garbage collection otimizado."""
         try:
@@ -238,13 +257,8 @@ class PerformanceMonitor:
             except Exception as e:
                 logger.debug(f"Erro na limpeza do cache manager: {e}")
 
-            # Limpeza do cache de busca
-            try:
-                from app.services import search_service
-                search_service.limpar_cache_palavras()
-                logger.debug("Cache de busca limpo")
-            except Exception as e:
-                logger.debug(f"Erro na limpeza do cache de busca: {e}")
+            # O índice de busca não é limpo aqui: reconstruí-lo custaria à próxima requisição.
+            # Sob pressão, o CacheManager remove primeiro o que é barato de refazer.
 
             self.last_cache_cleanup = time.time()
 
@@ -256,27 +270,12 @@ class PerformanceMonitor:
         try:
             logger.warning("Executando limpeza agressiva de memória")
 
-            # 1. Múltiplos rounds de GC
-            for _ in range(3):
-                gc.collect()
-
-            # 2. Limpeza forçada de caches
+            # Remoção por custo de reconstrução (índice de busca fixo) + uma coleta do GC
             try:
                 from app.core.cache_manager import cache_manager
                 cache_manager.emergency_cleanup()
-            except:
-                pass
-
-            # 3. Limpar cache de busca
-            try:
-                from app.services import search_service
-                search_service.limpar_cache_palavras()
-            except:
-                pass
-
-            # 4. Força limpeza de objetos não referenciados
-            import weakref
-            weakref.WeakSet().clear()
+            except Exception as e:
+                logger.debug(f"Erro na limpeza de caches: {e}")
 
             logger.info("Limpeza agressiva concluída")
 
@@ -385,6 +384,7 @@ class PerformanceMonitor:
         return {
             "memory": memory_stats,
             "optimization": self.optimization_stats,
+            "tracemalloc": alocacoes.estado(),
             "endpoints": {
                 "total_tracked": len(self.endpoint_metrics),
                 "memory_heavy": memory_heavy_endpoints,
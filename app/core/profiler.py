@@ -0,0 +1,144 @@
+"""
+Profiler por amostragem sob demanda (stacks de todas as threads do worker).
+
+Uma thread auxiliar lê `sys._current_frames()` a intervalos fixos durante N
+segundos e conta as pilhas no formato "collapsed" (uma linha
+`thread;frame;frame N` por pilha distinta), aceito diretamente por
+flamegraph.pl, speedscope e inferno. Não há hook de trace nem dependência
+externa: fora de uma coleta nada roda, e durante ela o custo é uma leitura das
+pilhas por intervalo (com a GIL, ~dezenas de µs por amostra).
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+MAX_PROFUNDIDADE = 128
+
+# Folhas de threads paradas esperando I/O ou trabalho (loop de eventos ocioso,
+# workers do threadpool sem tarefa, threads de monitoramento dormindo)
+FOLHAS_OCIOSAS = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("socket.py", "accept"),
+    ("_thread.py", "_worker"),
+}
+
+_RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class ProfilerOcupado(RuntimeError):
+    """Já existe uma coleta em andamento neste worker."""
+
+
+def _nome_arquivo(caminho: str) -> str:
+    """Caminho curto: relativo ao projeto ou a partir de site-packages/stdlib."""
+    if caminho.startswith(_RAIZ):
+        return os.path.relpath(caminho, _RAIZ)
+    marcador = "site-packages" + os.sep
+    i = caminho.rfind(marcador)
+    if i >= 0:
+        return caminho[i + len(marcador):]
+    return os.path.basename(caminho)
+
+
+class AmostradorPilhas:
+    """Coleta pilhas de todas as threads (exceto a própria) por `segundos`."""
+
+    def __init__(self, intervalo: float = 0.01, linhas: bool = False, incluir_ociosas: bool = False):
+        self.intervalo = intervalo
+        self.linhas = linhas
+        self.incluir_ociosas = incluir_ociosas
+        self.amostras = 0
+        self.pilhas: Counter = Counter()
+        self._rotulos: Dict[Tuple, str] = {}
+
+    def _rotulo(self, codigo, lineno: int) -> str:
+        chave = (codigo, lineno if self.linhas else 0)
+        rotulo = self._rotulos.get(chave)
+        if rotulo is None:
+            arquivo = _nome_arquivo(codigo.co_filename)
+            if self.linhas:
+                rotulo = f"{codigo.co_name} ({arquivo}:{lineno})"
+            else:
+                rotulo = f"{codigo.co_name} ({arquivo})"
+            # ";" separa os frames no formato collapsed (a contagem vem após o último espaço)
+            rotulo = rotulo.replace(";", ":")
+            self._rotulos[chave] = rotulo
+        return rotulo
+
+    def _ociosa(self, frame) -> bool:
+        codigo = frame.f_code
+        return (os.path.basename(codigo.co_filename), codigo.co_name) in FOLHAS_OCIOSAS
+
+    def amostrar(self, ignorar: set):
+        nomes = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident in ignorar:
+                continue
+            if not self.incluir_ociosas and self._ociosa(frame):
+                continue
+            frames = []
+            while frame is not None and len(frames) < MAX_PROFUNDIDADE:
+                frames.append(self._rotulo(frame.f_code, frame.f_lineno))
+                frame = frame.f_back
+            frames.append(nomes.get(ident, f"thread-{ident}").replace(";", ":"))
+            frames.reverse()
+            self.pilhas[";".join(frames)] += 1
+        self.amostras += 1
+
+    def coletar(self, segundos: float, ignorar: Optional[set] = None):
+        """Amostra até `segundos` na thread atual (chamar a partir da thread auxiliar)."""
+        ignorar = set(ignorar or ()) | {threading.get_ident()}
+        fim = time.perf_counter() + segundos
+        proxima = time.perf_counter()
+        while True:
+            agora = time.perf_counter()
+            if agora >= fim:
+                break
+            if agora < proxima:
+                time.sleep(proxima - agora)
+            self.amostrar(ignorar)
+            # Intervalo fixo a partir do início; atrasos não acumulam amostras em rajada
+            proxima = max(proxima + self.intervalo, time.perf_counter())
+
+    def collapsed(self) -> str:
+        linhas = [f"{pilha} {n}" for pilha, n in self.pilhas.most_common()]
+        return "\n".join(linhas) + ("\n" if linhas else "")
+
+
+_lock = threading.Lock()
+
+
+def perfilar(
+    segundos: float,
+    intervalo: float = 0.01,
+    linhas: bool = False,
+    incluir_ociosas: bool = False,
+) -> AmostradorPilhas:
+    """
+    Executa uma coleta de `segundos` em uma thread auxiliar e espera o fim.
+
+    A thread que chama (a do request) é excluída das amostras. Só uma coleta
+    por vez: uma segunda chamada concorrente levanta ProfilerOcupado.
+    """
+    if not _lock.acquire(blocking=False):
+        raise ProfilerOcupado("Profiler já em execução")
+    try:
+        amostrador = AmostradorPilhas(intervalo, linhas=linhas, incluir_ociosas=incluir_ociosas)
+        chamador = threading.get_ident()
+        thread = threading.Thread(
+            target=amostrador.coletar,
+            args=(segundos, {chamador}),
+            name="multasgo-profiler",
+            daemon=True,
+        )
+        thread.start()
+        thread.join()
+        return amostrador
+    finally:
+        _lock.release()
@@ -0,0 +1,215 @@
+"""
+Exposição de métricas no formato texto do Prometheus/OpenMetrics (`/metrics`).
+
+A coleta só lê contadores já mantidos pelos componentes (histogramas do
+monitoramento, contadores dos caches, do índice de busca, do pool do banco e do
+rate limiter), sem pegar os locks usados pelas requisições: leituras de
+inteiros e cópias de dicionários são atômicas no CPython, e um valor com uma
+requisição de atraso não importa para um scrape a cada 10s.
+"""
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.histograma import Histograma
+from app.core.logger import logger
+
+# O Starlette acrescenta "; charset=utf-8" a respostas text/*
+CONTENT_TYPE = "text/plain; version=0.0.4"
+PREFIXO = "multasgo_"
+
+# Limites (segundos) dos buckets exportados
+LIMITES_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Etapas da busca ficam na casa dos microssegundos a poucos milissegundos
+LIMITES_ETAPAS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    if isinstance(valor, int) or float(valor).is_integer():
+        return str(int(valor))
+    return repr(float(valor))
+
+
+class ExpositorMetricas:
+    """Monta o texto de exposição, uma família (HELP/TYPE) por vez."""
+
+    def __init__(self):
+        self._linhas: List[str] = []
+
+    def familia(self, nome: str, tipo: str, ajuda: str):
+        nome = PREFIXO + nome
+        self._linhas.append(f"# HELP {nome} {ajuda}")
+        self._linhas.append(f"# TYPE {nome} {tipo}")
+
+    def amostra(self, nome: str, valor: float, rotulos: Optional[Dict[str, str]] = None):
+        if rotulos:
+            texto = ",".join(f'{k}="{_escapar(v)}"' for k, v in rotulos.items())
+            self._linhas.append(f"{PREFIXO}{nome}{{{texto}}} {_numero(valor)}")
+        else:
+            self._linhas.append(f"{PREFIXO}{nome} {_numero(valor)}")
+
+    def metrica(self, nome: str, tipo: str, ajuda: str, valores: Iterable[Tuple[Dict[str, str], float]]):
+        """Família com uma amostra por conjunto de rótulos."""
+        self.familia(nome, tipo, ajuda)
+        for rotulos, valor in valores:
+            self.amostra(nome, valor, rotulos)
+
+    def histograma(self, nome: str, histograma: Histograma, limites: Sequence[float], rotulos: Dict[str, str]):
+        """Amostras _bucket/_sum/_count (a família deve ter sido declarada antes)."""
+        acumulados = [0] * len(limites)
+        for superior, contagem in histograma.buckets():
+            # Bucket logarítmico atribuído ao primeiro limite que cobre seu ponto médio
+            meio = superior * (1 - 1 / 64)
+            for i, limite in enumerate(limites):
+                if meio <= limite:
+                    acumulados[i] += contagem
+                    break
+        soma = 0
+        for limite, contagem in zip(limites, acumulados):
+            soma += contagem
+            self.amostra(f"{nome}_bucket", soma, {**rotulos, "le": _numero(limite)})
+        self.amostra(f"{nome}_bucket", histograma.total, {**rotulos, "le": "+Inf"})
+        self.amostra(f"{nome}_sum", histograma.soma, rotulos)
+        self.amostra(f"{nome}_count", histograma.total, rotulos)
+
+    def texto(self) -> str:
+        return "\n".join(self._linhas) + "\n"
+
+
+def _coletar_http(exp: ExpositorMetricas, monitor):
+    exp.familia("http_request_duration_seconds", "histogram",
+                "Latencia das requisicoes por metodo, template de rota e classe de status.")
+    for (endpoint, classe), janela in sorted(list(monitor.route_histograms.items())):
+        metodo, _, rota = endpoint.partition(" ")
+        exp.histograma("http_request_duration_seconds", janela.acumulado, LIMITES_HTTP,
+                       {"method": metodo, "route": rota, "status": classe})
+
+    exp.metrica("http_responses_total", "counter", "Respostas da aplicacao por status HTTP.",
+                (({"code": str(codigo)}, n) for codigo, n in sorted(list(monitor.status_codes.items()))))
+
+
+def _coletar_busca(exp: ExpositorMetricas):
+    from app.search.analytics import obter_contadores
+    from app.search.in_memory import get_built_index
+    from app.search.timing import histogramas
+
+    contadores = obter_contadores()
+    exp.metrica("search_queries_total", "counter", "Buscas executadas, com e sem resultado.", [
+        ({"result": "found"}, contadores["com_resultado"]),
+        ({"result": "empty"}, contadores["sem_resultado"]),
+    ])
+
+    exp.familia("search_stage_duration_seconds", "histogram",
+                "Tempo de cada etapa da busca por endpoint (total = requisicao inteira).")
+    for (endpoint, etapa), janela in sorted(histogramas().items()):
+        exp.histograma("search_stage_duration_seconds", janela.acumulado, LIMITES_ETAPAS,
+                       {"endpoint": endpoint, "stage": etapa})
+
+    idx = get_built_index()
+    exp.metrica("search_index_generation", "gauge", "Numero de reconstrucoes do indice de busca em memoria.",
+                [({}, idx.generation if idx else 0)])
+    exp.metrica("search_index_documents", "gauge", "Documentos no indice de busca.",
+                [({}, len(idx.docs) if idx else 0)])
+    exp.metrica("search_index_terms", "gauge", "Termos no vocabulario do indice.",
+                [({}, len(idx.lexicon.vocab) if idx else 0)])
+    exp.metrica("search_index_built_timestamp_seconds", "gauge", "Instante da ultima construcao do indice.",
+                [({}, idx.built_at if idx else 0)])
+    exp.metrica("search_index_build_duration_seconds", "gauge", "Duracao da ultima construcao do indice.",
+                [({}, idx.build_seconds if idx else 0)])
+
+
+def _coletar_caches(exp: ExpositorMetricas):
+    from app.core.cache_manager import cache_manager
+
+    contadores = {nome: cache.get_counters() for nome, cache in list(cache_manager.caches.items())}
+
+    def por_cache(campo: str):
+        return (({"cache": nome}, c[campo]) for nome, c in sorted(contadores.items()))
+
+    exp.metrica("cache_hits_total", "counter", "Acertos por namespace do SmartCache.", por_cache("hits"))
+    exp.metrica("cache_misses_total", "counter", "Faltas por namespace do SmartCache.", por_cache("misses"))
+    exp.metrica("cache_evictions_total", "counter", "Remocoes por limite de memoria.", por_cache("evictions"))
+    exp.metrica("cache_expirations_total", "counter", "Entradas removidas por TTL.", por_cache("expirations"))
+    exp.metrica("cache_hit_ratio", "gauge", "Taxa de acerto (0-1) desde o inicio.", (
+        ({"cache": nome}, c["hits"] / (c["hits"] + c["misses"]) if c["hits"] + c["misses"] else 0)
+        for nome, c in sorted(contadores.items())
+    ))
+    exp.metrica("cache_entries", "gauge", "Entradas por namespace.", por_cache("entries"))
+    exp.metrica("cache_memory_bytes", "gauge", "Memoria estimada por namespace.", por_cache("memory_bytes"))
+    exp.metrica("cache_memory_limit_bytes", "gauge", "Limite de memoria por namespace.", por_cache("memory_limit_bytes"))
+    exp.metrica("cache_shards", "gauge", "Segmentos com lock proprio por namespace.", por_cache("shards"))
+
+
+def _coletar_banco(exp: ExpositorMetricas):
+    from app.db.database import get_db_stats
+
+    stats = get_db_stats()
+    if not stats:
+        return
+    exp.metrica("db_pool_size", "gauge", "Tamanho configurado do pool de conexoes.", [({}, stats["size"])])
+    exp.metrica("db_pool_connections", "gauge", "Conexoes do pool por estado.", [
+        ({"state": "checked_in"}, stats["checked_in"]),
+        ({"state": "checked_out"}, stats["checked_out"]),
+        # overflow() é negativo enquanto o pool não está cheio
+        ({"state": "overflow"}, max(0, stats["overflow"])),
+    ])
+
+
+def _coletar_seguranca(exp: ExpositorMetricas, seguranca, estado_ips):
+    from app.middleware.user_agent import estatisticas_cache
+
+    if seguranca is not None:
+        limiter = seguranca.rate_limiter
+        ativos, _ = limiter.contar_bloqueios(time.time(), seguranca.block_duration)
+        exp.metrica("rate_limiter_buckets", "gauge", "Baldes de token ativos no rate limiter.", [({}, len(limiter))])
+        exp.metrica("rate_limiter_evicted_total", "counter", "Baldes descartados por capacidade.",
+                    [({}, limiter.descartados)])
+        exp.metrica("rate_limiter_blocked_clients", "gauge", "Clientes com bloqueio ativo.", [({}, ativos)])
+        exp.metrica("rate_limiter_blocks_total", "counter", "Bloqueios aplicados por excesso de requisicoes.",
+                    [({}, seguranca.bloqueios_aplicados)])
+        exp.metrica("security_rejections_total", "counter", "Requisicoes recusadas pela seguranca, por motivo.",
+                    (({"reason": motivo}, n) for motivo, n in sorted(list(seguranca.bloqueios.items()))))
+
+    if estado_ips is not None:
+        exp.metrica("ip_state_entries", "gauge", "IPs com estado em memoria.", [({}, len(estado_ips))])
+        exp.metrica("ip_state_removed_total", "counter", "Registros de IP removidos, por motivo.", [
+            ({"reason": "expired"}, estado_ips.expirados),
+            ({"reason": "evicted"}, estado_ips.descartados),
+        ])
+
+    ua = estatisticas_cache()
+    exp.metrica("user_agent_cache_lookups_total", "counter", "Consultas ao cache de classificacao de User-Agent.", [
+        ({"result": "hit"}, ua["hits"]),
+        ({"result": "miss"}, ua["misses"]),
+    ])
+
+
+def _coletar_processo(exp: ExpositorMetricas):
+    import psutil
+
+    exp.metrica("process_resident_memory_bytes", "gauge", "Memoria residente do worker.",
+                [({}, psutil.Process().memory_info().rss)])
+
+
+def gerar_metricas(monitor=None, seguranca=None, estado_ips=None) -> str:
+    """Texto de exposição com todas as métricas; uma seção com erro é omitida e logada."""
+    exp = ExpositorMetricas()
+    secoes = [
+        ("http", lambda: monitor is not None and _coletar_http(exp, monitor)),
+        ("busca", lambda: _coletar_busca(exp)),
+        ("caches", lambda: _coletar_caches(exp)),
+        ("banco", lambda: _coletar_banco(exp)),
+        ("seguranca", lambda: _coletar_seguranca(exp, seguranca, estado_ips)),
+        ("processo", lambda: _coletar_processo(exp)),
+    ]
+    for nome, coletar in secoes:
+        try:
+            coletar()
+        except Exception as e:
+            logger.error(f"Erro ao coletar métricas ({nome}): {e}")
+    return exp.texto()
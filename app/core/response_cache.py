@@ -0,0 +1,95 @@
+"""
+Cache de respostas já comprimidas para GETs quentes da API.
+
+O corpo JSON é serializado e comprimido (gzip e, se disponível, brotli) uma
+única vez e guardado no namespace "api" do CacheManager, com chave por rota,
+parâmetros normalizados e versão do dataset. Nos acertos, os bytes da
+codificação aceita pelo cliente são enviados direto; como a resposta já sai
+com Content-Encoding, o GZipMiddleware não recomprime.
+"""
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from app.core.cache_manager import cache_manager
+from app.core.compressao import codificacoes_aceitas, comprimir_brotli, comprimir_gzip
+
+# Mesmo limite do GZipMiddleware: corpos menores vão sem compressão
+TAMANHO_MINIMO_COMPRESSAO = 1000
+# Níveis para conteúdo dinâmico (o build de assets usa o máximo)
+NIVEL_GZIP = 6
+QUALIDADE_BROTLI = 5
+
+
+@dataclass
+class RespostaComprimida:
+    """Corpo serializado e suas variantes comprimidas."""
+    identidade: bytes
+    gzip: Optional[bytes] = None
+    br: Optional[bytes] = None
+    meta: Dict[str, Any] = field(default_factory=dict)
+
+
+def chave_resposta(rota: str, versao: str, **params: Any) -> str:
+    """Chave por rota + versão + parâmetros (ordem e espaços extras não importam)."""
+    normalizados = []
+    for nome in sorted(params):
+        valor = params[nome]
+        if valor is None:
+            continue
+        if isinstance(valor, str):
+            valor = " ".join(valor.split())
+        normalizados.append(f"{nome}={valor}")
+    resumo = hashlib.sha1("&".join(normalizados).encode("utf-8")).hexdigest()[:16]
+    return f"resp:{rota}:{versao}:{resumo}"
+
+
+def obter(chave: str) -> Optional[RespostaComprimida]:
+    return cache_manager.api_cache.get(chave)
+
+
+def armazenar(chave: str, conteudo: Any, meta: Optional[Dict[str, Any]] = None) -> RespostaComprimida:
+    """Serializa como o JSONResponse do FastAPI, comprime e guarda."""
+    inicio = time.perf_counter()
+    corpo = json.dumps(
+        jsonable_encoder(conteudo),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+    entrada = RespostaComprimida(identidade=corpo, meta=meta or {})
+    if len(corpo) >= TAMANHO_MINIMO_COMPRESSAO:
+        entrada.gzip = comprimir_gzip(corpo, nivel=NIVEL_GZIP)
+        entrada.br = comprimir_brotli(corpo, qualidade=QUALIDADE_BROTLI)
+
+    # Serializar + comprimir é o piso do custo de refazer a entrada
+    cache_manager.api_cache.set(chave, entrada, cost=(time.perf_counter() - inicio) * 1000)
+    return entrada
+
+
+def responder(
+    request: Request,
+    entrada: RespostaComprimida,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Resposta JSON com a variante que o cliente aceita (br > gzip > identidade)."""
+    aceitas = codificacoes_aceitas(request.headers.get("accept-encoding", ""))
+    cabecalhos = dict(headers or {})
+    cabecalhos["Vary"] = "Accept-Encoding"
+
+    corpo = entrada.identidade
+    if entrada.br is not None and "br" in aceitas:
+        corpo = entrada.br
+        cabecalhos["Content-Encoding"] = "br"
+    elif entrada.gzip is not None and "gzip" in aceitas:
+        corpo = entrada.gzip
+        cabecalhos["Content-Encoding"] = "gzip"
+
+    return Response(content=corpo, media_type="application/json", headers=cabecalhos)
@@ -0,0 +1,147 @@
+"""
+Timing wheel hierárquico para expiração por TTL sem varreduras completas.
+
+Cada nível tem `slots` baldes; um balde do nível i cobre `slots**i` ticks de
+`resolucao` segundos. Agendar, cancelar e avançar custam O(1) amortizado: ao
+virar um período de um nível superior, o balde correspondente é redistribuído
+para os níveis de baixo (cascata). Prazos além do último nível ficam em uma
+lista de espera, reavaliada a cada volta do nível mais alto.
+
+Os itens são chaves (cada chave tem no máximo um agendamento, então o wheel
+nunca é maior que o conjunto de chaves vivas). Quem agenda guarda o prazo real
+no próprio registro e pode renová-lo sem mexer no wheel: ao receber a chave de
+volta em `avancar`, confere o prazo e reagenda se ele foi estendido.
+"""
+import math
+import sys
+import time
+from typing import Dict, Hashable, List, Optional
+
+
+class TimingWheel:
+    """Agenda chaves por prazo (segundos, mesma base de time.time())."""
+
+    __slots__ = ("resolucao", "slots", "niveis", "_bits", "_mascara", "_tick", "_baldes", "_distantes", "_local")
+
+    def __init__(self, resolucao: float = 1.0, slots: int = 64, niveis: int = 4, agora: Optional[float] = None):
+        if slots < 2 or slots & (slots - 1):
+            raise ValueError("slots deve ser potência de 2")
+        self.resolucao = resolucao
+        self.slots = slots
+        self.niveis = niveis
+        self._bits = slots.bit_length() - 1
+        self._mascara = slots - 1
+        self._tick = int((time.time() if agora is None else agora) / resolucao)
+        # Balde: chave -> tick alvo
+        self._baldes: List[List[Dict[Hashable, int]]] = [[{} for _ in range(slots)] for _ in range(niveis)]
+        self._distantes: Dict[Hashable, int] = {}
+        # Chave -> balde onde está agendada
+        self._local: Dict[Hashable, Dict[Hashable, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._local)
+
+    def __contains__(self, chave: Hashable) -> bool:
+        return chave in self._local
+
+    def agendar(self, chave: Hashable, prazo: float):
+        """Agenda (ou reagenda) `chave` para sair em `avancar` a partir de `prazo`."""
+        self.cancelar(chave)
+        # O balde do tick atual já foi esvaziado: vencidos saem no próximo avanço
+        self._inserir(chave, max(math.ceil(prazo / self.resolucao), self._tick + 1))
+
+    def cancelar(self, chave: Hashable):
+        balde = self._local.pop(chave, None)
+        if balde is not None:
+            del balde[chave]
+
+    def _inserir(self, chave: Hashable, alvo: int):
+        tick = self._tick
+        bits = self._bits
+        for nivel in range(self.niveis):
+            # Mesmo período no nível de cima: o balde deste nível ainda vai ser visitado
+            if alvo >> (bits * (nivel + 1)) == tick >> (bits * (nivel + 1)):
+                balde = self._baldes[nivel][(alvo >> (bits * nivel)) & self._mascara]
+                break
+        else:
+            balde = self._distantes
+        balde[chave] = alvo
+        self._local[chave] = balde
+
+    def _reinserir(self, balde: Dict[Hashable, int]):
+        for chave, alvo in balde.items():
+            self._inserir(chave, alvo)
+
+    def avancar(self, agora: float) -> List[Hashable]:
+        """Avança até `agora` e devolve as chaves cujo prazo passou (já desagendadas)."""
+        destino = int(agora / self.resolucao)
+        vencidos: List[Hashable] = []
+        if destino <= self._tick:
+            return vencidos
+        if not self._local:
+            self._tick = destino
+            return vencidos
+        if destino - self._tick >= self.slots ** self.niveis:
+            return self._saltar(destino)
+
+        bits = self._bits
+        mascara = self._mascara
+        baldes = self._baldes
+        local = self._local
+        while self._tick < destino and local:
+            self._tick += 1
+            tick = self._tick
+
+            # Cascata do nível mais alto que virou de período para baixo
+            nivel = 1
+            while nivel < self.niveis and not (tick >> (bits * (nivel - 1))) & mascara:
+                nivel += 1
+            if nivel == self.niveis and self._distantes:
+                # Volta completa do nível mais alto: reavaliar os distantes
+                distantes, self._distantes = self._distantes, {}
+                self._reinserir(distantes)
+            for n in range(nivel - 1, 0, -1):
+                indice = (tick >> (bits * n)) & mascara
+                balde = baldes[n][indice]
+                if balde:
+                    baldes[n][indice] = {}
+                    self._reinserir(balde)
+
+            indice = tick & mascara
+            balde = baldes[0][indice]
+            if balde:
+                baldes[0][indice] = {}
+                for chave in balde:
+                    del local[chave]
+                vencidos.extend(balde)
+
+        if self._tick < destino:
+            self._tick = destino
+        return vencidos
+
+    def _saltar(self, destino: int) -> List[Hashable]:
+        """Salto maior que o alcance do wheel: reagenda tudo a partir de `destino`."""
+        agendados = {chave: balde[chave] for chave, balde in self._local.items()}
+        self.limpar()
+        self._tick = destino
+        vencidos = []
+        for chave, alvo in agendados.items():
+            if alvo <= destino:
+                vencidos.append(chave)
+            else:
+                self._inserir(chave, alvo)
+        return vencidos
+
+    def memoria_bytes(self) -> int:
+        """Espaço dos baldes e do índice de chaves (sem contar as chaves em si)."""
+        total = sys.getsizeof(self._local) + sys.getsizeof(self._distantes)
+        for nivel in self._baldes:
+            total += sum(sys.getsizeof(balde) for balde in nivel)
+        return total
+
+    def limpar(self):
+        for nivel in self._baldes:
+            for i in range(self.slots):
+                nivel[i] = {}
+        self._distantes = {}
+        self._local = {}
@@ -208,7 +208,6 @@ def get_db_stats() -> dict:
             "size": pool.size(),
             "checked_in": pool.checkedin(),
             "checked_out": pool.checkedout(),
-            "invalid": pool.invalid(),
             "overflow": pool.overflow()
         }
     except Exception as e:
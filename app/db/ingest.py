@@ -0,0 +1,292 @@
+"""
+Carga do catálogo de infrações a partir do CSV (BANCODADOS_LIMPO.csv).
+
+O arquivo é lido em streaming, cada linha é validada e convertida para os
+tipos da tabela `bdbautos`, a gravação acontece em uma única transação com
+lotes `executemany` e, ao final, o índice de busca é reconstruído uma única
+vez a partir das próprias linhas lidas (sem reler a tabela).
+
+Uso:
+    python -m app.db.ingest BANCODADOS_LIMPO.csv
+    python -m app.db.ingest BANCODADOS_LIMPO.csv --modo substituir --lote 5000
+"""
+import argparse
+import csv
+import re
+import sys
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.logger import logger
+
+MODOS_IMPORTACAO = ("upsert", "substituir")
+TAMANHO_LOTE_PADRAO = 2000
+MAX_ERROS_RELATADOS = 50
+
+# Cabeçalho do CSV (normalizado: minúsculo, sem acento) -> campo
+_CABECALHOS = {
+    "codigo de infracao": "codigo",
+    "codigo": "codigo",
+    "infracao": "descricao",
+    "descricao": "descricao",
+    "responsavel": "responsavel",
+    "valor da multa": "valor_multa",
+    "valor_multa": "valor_multa",
+    "valor": "valor_multa",
+    "orgao autuador": "orgao_autuador",
+    "orgao_autuador": "orgao_autuador",
+    "artigos do ctb": "artigos_ctb",
+    "artigos_ctb": "artigos_ctb",
+    "pontos": "pontos",
+    "gravidade": "gravidade",
+}
+CAMPOS = (
+    "codigo", "descricao", "responsavel", "valor_multa",
+    "orgao_autuador", "artigos_ctb", "pontos", "gravidade",
+)
+
+_SEM_VALOR = {"", "nao ha", "nao se aplica", "-", "n/a"}
+
+_SQL_DELETE_TODOS = text("DELETE FROM bdbautos")
+_SQL_DELETE_CODIGO = text('DELETE FROM bdbautos WHERE "Código de Infração" = :codigo')
+_SQL_INSERT = text(
+    """
+    INSERT INTO bdbautos (
+        "Código de Infração", "Infração", "Responsável", "Valor da multa",
+        "Órgão Autuador", "Artigos do CTB", "Pontos", "Gravidade"
+    ) VALUES (
+        :codigo, :descricao, :responsavel, :valor_multa,
+        :orgao_autuador, :artigos_ctb, :pontos, :gravidade
+    )
+    """
+)
+
+
+class ErroLinha(ValueError):
+    """Linha do CSV que não pôde ser convertida."""
+
+
+def _sem_acento(valor: str) -> str:
+    return "".join(
+        c for c in unicodedata.normalize("NFKD", valor) if not unicodedata.combining(c)
+    )
+
+
+def _chave(valor: str) -> str:
+    return re.sub(r"\s+", " ", _sem_acento(valor).strip().lower())
+
+
+def converter_valor(bruto: str) -> float:
+    """Converte "R$ 1.234,56", "1234.56" ou "Nao ha" para float."""
+    if _chave(bruto) in _SEM_VALOR:
+        return 0.0
+    limpo = bruto.replace("R$", "").replace(" ", "").strip()
+    if "," in limpo:
+        # Formato brasileiro: ponto como milhar, vírgula como decimal
+        limpo = limpo.replace(".", "").replace(",", ".")
+    try:
+        valor = float(limpo)
+    except ValueError:
+        raise ErroLinha(f"valor da multa inválido: {bruto!r}")
+    if valor < 0:
+        raise ErroLinha(f"valor da multa negativo: {bruto!r}")
+    return round(valor, 2)
+
+
+def converter_pontos(bruto: str) -> int:
+    """Converte "7", "7.0" ou "Nao ha" (sem pontuação) para int."""
+    if _chave(bruto) in _SEM_VALOR:
+        return 0
+    try:
+        pontos = int(float(bruto.replace(",", ".")))
+    except ValueError:
+        raise ErroLinha(f"pontos inválidos: {bruto!r}")
+    if pontos < 0 or pontos > 20:
+        raise ErroLinha(f"pontos fora do intervalo 0-20: {pontos}")
+    return pontos
+
+
+def converter_gravidade(bruta: str) -> str:
+    """Padroniza a gravidade no formato gravado no banco ("Gravissima3X", "Media", "Nao ha")."""
+    if _chave(bruta) in _SEM_VALOR:
+        return "Nao ha"
+    return _sem_acento(bruta).replace(" ", "")
+
+
+def converter_linha(campos: Dict[str, str]) -> Dict[str, Any]:
+    """Valida e converte uma linha do CSV para os tipos da tabela."""
+    codigo = re.sub(r"[\s-]", "", campos.get("codigo") or "")
+    if len(codigo) < 4:
+        raise ErroLinha("código da infração ausente ou com menos de 4 caracteres")
+    descricao = (campos.get("descricao") or "").strip()
+    if not descricao:
+        raise ErroLinha("descrição da infração ausente")
+
+    return {
+        "codigo": codigo,
+        "descricao": descricao,
+        "responsavel": (campos.get("responsavel") or "").strip(),
+        "valor_multa": converter_valor(campos.get("valor_multa") or ""),
+        "orgao_autuador": (campos.get("orgao_autuador") or "").strip(),
+        "artigos_ctb": (campos.get("artigos_ctb") or "").strip(),
+        "pontos": converter_pontos(campos.get("pontos") or ""),
+        "gravidade": converter_gravidade(campos.get("gravidade") or ""),
+    }
+
+
+def ler_csv(
+    caminho: Path,
+    encoding: str = "utf-8-sig",
+    erros: Optional[List[Dict[str, Any]]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lê o CSV em streaming e produz as linhas já convertidas.
+
+    O delimitador (vírgula ou ponto e vírgula) é detectado pela primeira linha.
+    Linhas inválidas são puladas e, se `erros` for informado, registradas nele.
+    """
+    with open(caminho, "r", encoding=encoding, newline="") as arquivo:
+        amostra = arquivo.readline()
+        arquivo.seek(0)
+        delimitador = ";" if amostra.count(";") > amostra.count(",") else ","
+        leitor = csv.reader(arquivo, delimiter=delimitador)
+
+        try:
+            cabecalho = next(leitor)
+        except StopIteration:
+            return
+        mapa = [_CABECALHOS.get(_chave(c)) for c in cabecalho]
+        faltando = {"codigo", "descricao"} - set(mapa)
+        if faltando:
+            raise ValueError(f"CSV sem as colunas obrigatórias: {', '.join(sorted(faltando))}")
+
+        for numero, valores in enumerate(leitor, start=2):
+            if not any(v.strip() for v in valores):
+                continue
+            campos = {campo: v for campo, v in zip(mapa, valores) if campo}
+            try:
+                yield converter_linha(campos)
+            except ErroLinha as e:
+                if erros is not None:
+                    erros.append({"linha": numero, "erro": str(e)})
+
+
+def _inserir_em_lotes(db: Session, linhas: List[Dict[str, Any]], modo: str, tamanho_lote: int) -> None:
+    for inicio in range(0, len(linhas), tamanho_lote):
+        lote = linhas[inicio:inicio + tamanho_lote]
+        if modo == "upsert":
+            db.execute(_SQL_DELETE_CODIGO, [{"codigo": l["codigo"]} for l in lote])
+        db.execute(_SQL_INSERT, lote)
+
+
+def importar_csv(
+    db: Session,
+    caminho: Path,
+    modo: str = "upsert",
+    tamanho_lote: int = TAMANHO_LOTE_PADRAO,
+    encoding: str = "utf-8-sig",
+) -> Dict[str, Any]:
+    """
+    Importa o CSV para `bdbautos` e reconstrói o índice de busca.
+
+    - `upsert`: substitui apenas os códigos presentes no arquivo;
+    - `substituir`: apaga a tabela e grava somente o conteúdo do arquivo.
+
+    Tudo ocorre em uma transação: se qualquer lote falhar, nada é gravado.
+    Retorna um resumo com contagens, erros de validação e tempos.
+    """
+    if modo not in MODOS_IMPORTACAO:
+        raise ValueError(f"Modo inválido: {modo}. Use: {', '.join(MODOS_IMPORTACAO)}")
+
+    inicio = time.time()
+    erros: List[Dict[str, Any]] = []
+
+    # Códigos repetidos no arquivo: prevalece a última ocorrência
+    por_codigo: Dict[str, Dict[str, Any]] = {}
+    for linha in ler_csv(Path(caminho), encoding=encoding, erros=erros):
+        por_codigo[linha["codigo"]] = linha
+    linhas = list(por_codigo.values())
+    tempo_leitura = time.time() - inicio
+
+    from app.search.in_memory import fetch_rows, rebuild_index
+
+    try:
+        if db.bind.dialect.name == "sqlite":
+            # A conexão SQLite roda em autocommit; abrir a transação explicitamente
+            db.execute(text("BEGIN IMMEDIATE"))
+
+        existentes: List[Tuple] = []
+        if modo == "upsert":
+            existentes = [tuple(r) for r in fetch_rows(db)]
+        else:
+            db.execute(_SQL_DELETE_TODOS)
+
+        _inserir_em_lotes(db, linhas, modo, max(1, tamanho_lote))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    tempo_gravacao = time.time() - inicio - tempo_leitura
+
+    # Linhas finais da tabela = existentes não tocados + linhas do arquivo
+    novas = [tuple(l[c] for c in CAMPOS) for l in linhas]
+    finais = [r for r in existentes if str(r[0]) not in por_codigo] + novas
+
+    # Um único build a partir das linhas já lidas; avisa os demais workers e
+    # limpa os caches derivados (fuzzy, resultados) sem esvaziar o índice antes
+    rebuild_index(finais)
+
+    resumo = {
+        "modo": modo,
+        "linhas_importadas": len(linhas),
+        "linhas_invalidas": len(erros),
+        "total_na_tabela": len(finais),
+        "erros": erros[:MAX_ERROS_RELATADOS],
+        "tempo_leitura_s": round(tempo_leitura, 3),
+        "tempo_gravacao_s": round(tempo_gravacao, 3),
+        "tempo_total_s": round(time.time() - inicio, 3),
+    }
+    logger.info(
+        f"Importação CSV ({modo}): {resumo['linhas_importadas']} linhas gravadas, "
+        f"{resumo['linhas_invalidas']} inválidas em {resumo['tempo_total_s']}s"
+    )
+    return resumo
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Importa o catálogo de infrações a partir de um CSV.")
+    parser.add_argument("arquivo", nargs="?", default="BANCODADOS_LIMPO.csv", help="Caminho do CSV")
+    parser.add_argument("--modo", choices=MODOS_IMPORTACAO, default="upsert")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE_PADRAO, help="Linhas por executemany")
+    parser.add_argument("--encoding", default="utf-8-sig")
+    args = parser.parse_args(argv)
+
+    caminho = Path(args.arquivo)
+    if not caminho.is_file():
+        print(f"Arquivo não encontrado: {caminho}")
+        return 1
+
+    from app.db.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        resumo = importar_csv(db, caminho, modo=args.modo, tamanho_lote=args.lote, encoding=args.encoding)
+    finally:
+        db.close()
+
+    print(f"Linhas importadas: {resumo['linhas_importadas']}")
+    print(f"Linhas inválidas: {resumo['linhas_invalidas']}")
+    for erro in resumo["erros"]:
+        print(f"  linha {erro['linha']}: {erro['erro']}")
+    print(f"Total na tabela: {resumo['total_na_tabela']}")
+    print(f"Tempo total: {resumo['tempo_total_s']}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
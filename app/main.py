@@ -1,11 +1,11 @@
 import os
 import asyncio
+import secrets
+from typing import Optional
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Request, HTTPException, Depends
+from fastapi import FastAPI, Request, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, HTMLResponse, RedirectResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from datetime import datetime
@@ -18,9 +18,18 @@ from app.db.database import get_db
 from app.middleware.security import SecurityMiddleware
 from app.middleware.monitoring import MonitoringMiddleware
 from app.middleware.geo_security import GeoSecurityMiddleware
+from app.middleware.pipeline import SecurityPipelineMiddleware
+from app.middleware.gzip_negociado import GZipNegociado
+from app.middleware.ip_state import estado_ips
+from app.middleware.rate_limit import criar_rate_limiter, parse_limites_rotas
 from app.core.cache_manager import cache_manager
 from app.core.performance_monitor import performance_monitor
+from app.core.prometheus import CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE, gerar_metricas
 from app.core.http_manager import startup_warmup, shutdown_connections
+from app.core.assets import PrecompressedStaticFiles, configurar_templates
+from app.core.http_cache import cabecalhos_cache, etag_corresponde, nao_modificado
+from app.services import paginas_service
+from app.services.paginas_service import PaginaRenderizada
 
 # Determinar o caminho correto para as pastas static e templates
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -106,46 +115,65 @@ app = FastAPI(
 
 # Configuração para servir arquivos estáticos com cache otimizado
 if os.path.exists(STATIC_DIR):
-    app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+    # Variantes .br/.gz e cache imutável para os arquivos versionados em /static/dist
+    app.mount("/static", PrecompressedStaticFiles(directory=STATIC_DIR), name="static")
 else:
     logger.warning(f"Diretório de arquivos estáticos não encontrado: {STATIC_DIR}")
 
 # Configuração para templates HTML com verificação
 if os.path.exists(TEMPLATES_DIR):
-    templates = Jinja2Templates(directory=TEMPLATES_DIR)
+    templates = configurar_templates(Jinja2Templates(directory=TEMPLATES_DIR))
 else:
     logger.warning(f"Diretório de templates não encontrado: {TEMPLATES_DIR}")
     templates = None
 
-# Adicionar middleware de monitoramento (PRIMEIRO - para capturar tudo)
-monitoring_middleware = MonitoringMiddleware(app)
-app.add_middleware(MonitoringMiddleware)
+# Estágios de segurança e monitoramento, executados por um único middleware ASGI.
+# As mesmas instâncias ficam em app.state para a limpeza periódica e /debug.
+monitoring_middleware = MonitoringMiddleware()
 app.state.monitoring_middleware = monitoring_middleware
 
-# Adicionar middleware de segurança geográfica (SEGUNDO - proteção anti-bot)
-if not settings.DEBUG:  # Apenas em produção
-    geo_security_middleware = GeoSecurityMiddleware(app, enable_geo_blocking=True)
-    app.add_middleware(GeoSecurityMiddleware, enable_geo_blocking=True)
-    app.state.geo_security_middleware = geo_security_middleware
-    logger.info("Middleware de segurança geográfica ativado")
+# Rate limiting: com vários workers o estado fica em memória compartilhada
+rate_limit_backend = settings.RATE_LIMIT_BACKEND
+if rate_limit_backend == "auto":
+    rate_limit_backend = "shared" if settings.WORKERS > 1 else "memory"
+rate_limiter = criar_rate_limiter(
+    settings.RATE_LIMIT_REQUESTS,
+    settings.RATE_LIMIT_WINDOW,
+    limites_rotas=parse_limites_rotas(settings.RATE_LIMIT_ROUTES),
+    max_entradas=settings.RATE_LIMIT_MAX_CLIENTS,
+    backend=rate_limit_backend,
+    caminho_compartilhado=settings.RATE_LIMIT_SHARED_PATH,
+    duracao_bloqueio=settings.BLOCK_DURATION,
+)
 
-# Adicionar middleware de segurança básico (TERCEIRO - rate limiting)
+# Segurança básico (PRIMEIRO - rate limiting, bots e padrões de ataque)
 security_middleware = SecurityMiddleware(
-    app,
     rate_limit_requests=settings.RATE_LIMIT_REQUESTS,
     rate_limit_window=settings.RATE_LIMIT_WINDOW,
     block_duration=settings.BLOCK_DURATION,
     max_request_size=settings.MAX_REQUEST_SIZE,
-    enable_bot_protection=settings.ENABLE_BOT_PROTECTION
+    enable_bot_protection=settings.ENABLE_BOT_PROTECTION,
+    rate_limiter=rate_limiter,
+    body_scan_limit=settings.BODY_SCAN_LIMIT
 )
-app.add_middleware(SecurityMiddleware,
-    rate_limit_requests=settings.RATE_LIMIT_REQUESTS,
-    rate_limit_window=settings.RATE_LIMIT_WINDOW,
-    block_duration=settings.BLOCK_DURATION,
+app.state.security_middleware = security_middleware
+estagios_seguranca = [security_middleware]
+
+# Segurança geográfica (SEGUNDO - proteção anti-bot)
+if not settings.DEBUG:  # Apenas em produção
+    geo_security_middleware = GeoSecurityMiddleware(enable_geo_blocking=True)
+    app.state.geo_security_middleware = geo_security_middleware
+    estagios_seguranca.append(geo_security_middleware)
+    logger.info("Middleware de segurança geográfica ativado")
+
+# Monitoramento envolve apenas a aplicação (respostas de bloqueio não entram nas métricas)
+app.add_middleware(
+    SecurityPipelineMiddleware,
+    estagios=estagios_seguranca,
+    monitor=monitoring_middleware,
+    security_headers=SecurityMiddleware.security_headers,
     max_request_size=settings.MAX_REQUEST_SIZE,
-    enable_bot_protection=settings.ENABLE_BOT_PROTECTION
 )
-app.state.security_middleware = security_middleware
 
 # Middleware de hosts confiáveis (apenas em produção)
 if not settings.DEBUG:
@@ -153,7 +181,7 @@ if not settings.DEBUG:
     app.add_middleware(TrustedHostMiddleware, allowed_hosts=trusted_hosts)
 
 # Middleware de compressão
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(GZipNegociado, minimum_size=1000)
 
 # Configurar CORS de forma segura
 cors_origins = settings.get_cors_origins()
@@ -170,6 +198,24 @@ app.add_middleware(
 # Incluir rotas da API
 app.include_router(api_router, prefix="/api/v1")
 
+CACHE_TTL_PAGINA = 300  # 5 minutos
+CACHE_TTL_PAGINA_INFRACAO = 3600  # 1 hora
+
+
+def _resposta_pagina(request: Request, pagina: PaginaRenderizada, max_age: int):
+    """HTML cacheado com ETag; 304 quando o cliente já tem a versão atual."""
+    if etag_corresponde(request, pagina.etag):
+        return nao_modificado(pagina.etag, max_age)
+    return HTMLResponse(content=pagina.corpo, headers=cabecalhos_cache(pagina.etag, max_age))
+
+
+async def _pagina_estatica(request: Request, pagina: str):
+    if templates is None:
+        raise HTTPException(status_code=500, detail="Templates não configurados")
+    renderizada = await paginas_service.obter_pagina_estatica(templates, pagina)
+    return _resposta_pagina(request, renderizada, CACHE_TTL_PAGINA)
+
+
 # Rota para servir a página principal HTML
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -178,9 +224,7 @@ async def home(request: Request):
     
     Retorna a interface web da aplicação MultasGO.
     """
-    if templates is None:
-        raise HTTPException(status_code=500, detail="Templates não configurados")
-    return templates.TemplateResponse("index.html", {"request": request})
+    return await _pagina_estatica(request, "home")
 
 @app.get("/explorador", response_class=HTMLResponse)
 async def explorador_page(request: Request):
@@ -189,96 +233,31 @@ async def explorador_page(request: Request):
     
     Retorna a interface web para explorar as infrações com filtros avançados.
     """
-    if templates is None:
-        raise HTTPException(status_code=500, detail="Templates não configurados")
-    return templates.TemplateResponse("explorador.html", {"request": request})
+    return await _pagina_estatica(request, "explorador")
 
 @app.get("/ipva", response_class=HTMLResponse)
 async def ipva_page(request: Request):
     """Endpoint para a pagina de calculadora de IPVA por dados FIPE."""
+    return await _pagina_estatica(request, "ipva")
+
+async def _buscar_pagina_infracao(codigo: str) -> PaginaRenderizada:
+    """Página renderizada da infração (cache por versão do dataset) ou 404."""
     if templates is None:
-        raise HTTPException(status_code=500, detail="Templates nao configurados")
-    return templates.TemplateResponse("ipva.html", {"request": request})
-
-import re as _re
-import unicodedata as _ud
-
-def _gerar_slug(texto: str) -> str:
-    """Gera slug SEO-friendly: 'Dirigir veículo sem CNH' -> 'dirigir-veiculo-sem-cnh'."""
-    # Remove acentos
-    t = _ud.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
-    t = t.lower()
-    t = _re.sub(r"[^a-z0-9]+", "-", t)  # Só letras, números, hífens
-    return t.strip("-")[:80]  # Max 80 chars
-
-def _buscar_infracao(codigo: str):
-    """Busca infração no banco e retorna dict com dados formatados, ou None."""
-    if not codigo.isdigit() or len(codigo) < 4 or len(codigo) > 5:
-        return None
-    db = next(get_db())
-    row = db.execute(
-        text('SELECT "Código de Infração" as codigo, "Infração" as descricao, '
-             '"Responsável" as responsavel, "Valor da multa" as valor_multa, '
-             '"Órgão Autuador" as orgao_autuador, "Artigos do CTB" as artigos_ctb, '
-             '"Pontos" as pontos, "Gravidade" as gravidade '
-             'FROM bdbautos WHERE "Código de Infração" = :cod'),
-        {"cod": codigo}
-    ).fetchone()
-    if not row:
-        return None
-    r = row._mapping
-    cod_str = str(r["codigo"])
-    codigo_formatado = f"{cod_str[:3]}-{cod_str[3:]}" if len(cod_str) == 5 else cod_str
-    grav = str(r["gravidade"])
-    grav_map = {
-        "Gravissima": "Gravíssima", "Gravissima2X": "Gravíssima (2x)",
-        "Gravissima3X": "Gravíssima (3x)", "Gravissima4X": "Gravíssima (4x)",
-        "Gravissima5X": "Gravíssima (5x)", "Gravissima10X": "Gravíssima (10x)",
-        "Gravissima20X": "Gravíssima (20x)", "Gravissima60X": "Gravíssima (60x)",
-        "Grave": "Grave", "Media": "Média", "Leve": "Leve",
-        "Leve50%": "Leve (50%)", "Nao ha": "Não se aplica"
-    }
-    gravidade_display = grav_map.get(grav, grav)
-    if "Gravissima" in grav or "gravissima" in grav:
-        gravidade_class = "gravissima"
-    elif grav == "Grave":
-        gravidade_class = "grave"
-    elif grav == "Media":
-        gravidade_class = "media"
-    elif "Leve" in grav:
-        gravidade_class = "leve"
-    else:
-        gravidade_class = "na"
-    pontos_raw = str(r["pontos"])
-    pontos_display = "Sem pontuação" if pontos_raw in ("Nao ha", "0", "0.0") else pontos_raw.replace(".0", "")
-    valor = float(r["valor_multa"]) if r["valor_multa"] else 0.0
-    valor_formatado = f"{valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    desc = str(r["descricao"])
-    descricao_curta = desc[:57] + "..." if len(desc) > 60 else desc
-    slug = _gerar_slug(desc)
-    return {
-        "codigo": cod_str, "codigo_formatado": codigo_formatado,
-        "descricao": desc, "descricao_curta": descricao_curta,
-        "responsavel": str(r["responsavel"]),
-        "valor_multa": valor, "valor_formatado": valor_formatado,
-        "orgao_autuador": str(r["orgao_autuador"]),
-        "artigos_ctb": str(r["artigos_ctb"]),
-        "pontos_display": pontos_display,
-        "gravidade_display": gravidade_display, "gravidade_class": gravidade_class,
-        "slug": slug,
-    }
+        raise HTTPException(status_code=500, detail="Templates não configurados")
+    pagina = None
+    if paginas_service.codigo_valido(codigo):
+        pagina = await paginas_service.obter_pagina_infracao(templates, codigo)
+    if pagina is None:
+        raise HTTPException(status_code=404, detail="Infração não encontrada")
+    return pagina
 
 @app.get("/infracao/{codigo}", response_class=HTMLResponse)
 async def infracao_redirect(request: Request, codigo: str):
     """Redireciona /infracao/50100 → /infracao/50100/slug-seo (301 permanente)."""
-    if templates is None:
-        raise HTTPException(status_code=500, detail="Templates não configurados")
     try:
-        dados = _buscar_infracao(codigo)
-        if not dados:
-            raise HTTPException(status_code=404, detail="Infração não encontrada")
+        pagina = await _buscar_pagina_infracao(codigo)
         return RedirectResponse(
-            url=f"/infracao/{dados['codigo']}/{dados['slug']}",
+            url=f"/infracao/{pagina.codigo}/{pagina.slug}",
             status_code=301
         )
     except HTTPException:
@@ -290,14 +269,9 @@ async def infracao_redirect(request: Request, codigo: str):
 @app.get("/infracao/{codigo}/{slug}", response_class=HTMLResponse)
 async def infracao_page(request: Request, codigo: str, slug: str):
     """Página individual de uma infração de trânsito (SEO)."""
-    if templates is None:
-        raise HTTPException(status_code=500, detail="Templates não configurados")
     try:
-        dados = _buscar_infracao(codigo)
-        if not dados:
-            raise HTTPException(status_code=404, detail="Infração não encontrada")
-        dados["request"] = request
-        return templates.TemplateResponse("infracao.html", dados)
+        pagina = await _buscar_pagina_infracao(codigo)
+        return _resposta_pagina(request, pagina, CACHE_TTL_PAGINA_INFRACAO)
     except HTTPException:
         raise
     except Exception as e:
@@ -382,10 +356,45 @@ def health_check():
             status_code=503
         )
 
+def _verificar_metrics_token(authorization: str = Header("")):
+    """
+    Exige `Authorization: Bearer <METRICS_TOKEN>`. Sem token configurado o
+    endpoint só responde em DEBUG; em produção fica 404 até definir o token.
+    """
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not settings.METRICS_TOKEN:
+        if settings.DEBUG:
+            return
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(
+        authorization.encode(), f"Bearer {settings.METRICS_TOKEN}".encode()
+    ):
+        raise HTTPException(status_code=403, detail="Acesso negado")
+
+
+@app.get("/metrics",
+    tags=["recursos-api"],
+    summary="Métricas no formato Prometheus",
+    description="Latência por rota, buscas, caches, índice, pool do banco e rate limiting em formato texto.",
+    include_in_schema=False,
+    dependencies=[Depends(_verificar_metrics_token)])
+def prometheus_metrics():
+    """
+    Exposição para scrape do Prometheus.
+
+    Síncrono de propósito: roda no threadpool, e a coleta só lê contadores
+    (sem pegar os locks das requisições), então não segura o event loop.
+    """
+    conteudo = gerar_metricas(
+        monitor=getattr(app.state, 'monitoring_middleware', None),
+        seguranca=getattr(app.state, 'security_middleware', None),
+        estado_ips=estado_ips,
+    )
+    return Response(content=conteudo, media_type=PROMETHEUS_CONTENT_TYPE)
+
 # Endpoints de debug e monitoramento (apenas em debug, com autenticação)
 if settings.DEBUG:
-    from fastapi import Header
-
     def _verificar_debug_key(x_debug_key: str = Header(...)):
         """Valida chave de acesso para endpoints de debug."""
         if x_debug_key != settings.SECRET_KEY:
@@ -399,12 +408,12 @@ if settings.DEBUG:
         return {"error": "Security middleware not found"}
 
     @app.get("/debug/metrics", dependencies=[Depends(_verificar_debug_key)])
-    async def get_metrics():
-        """Retorna métricas da aplicação (apenas em debug)."""
+    async def get_metrics(window: Optional[int] = None):
+        """Retorna métricas da aplicação (apenas em debug); `window` limita os percentis aos últimos N segundos."""
         metrics = {}
 
         if hasattr(app.state, 'monitoring_middleware'):
-            metrics['monitoring'] = app.state.monitoring_middleware.get_metrics()
+            metrics['monitoring'] = app.state.monitoring_middleware.get_metrics(window)
 
         if hasattr(app.state, 'security_middleware'):
             metrics['security'] = app.state.security_middleware.get_security_stats()
@@ -412,6 +421,9 @@ if settings.DEBUG:
         if hasattr(app.state, 'geo_security_middleware'):
             metrics['geo_security'] = app.state.geo_security_middleware.get_geo_stats()
 
+        # Estado por IP compartilhado pelos middlewares (entradas, expirações, memória)
+        metrics['ip_state'] = estado_ips.get_stats()
+
         metrics['performance'] = performance_monitor.get_performance_report()
         metrics['cache'] = cache_manager.get_global_stats()
 
@@ -1,5 +1,6 @@
 # Middleware package
 from .security import SecurityMiddleware
 from .monitoring import MonitoringMiddleware
+from .pipeline import SecurityPipelineMiddleware
 
-__all__ = ["SecurityMiddleware", "MonitoringMiddleware"]
\ No newline at end of file
+__all__ = ["SecurityMiddleware", "MonitoringMiddleware", "SecurityPipelineMiddleware"]
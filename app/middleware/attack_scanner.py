@@ -0,0 +1,152 @@
+"""
+Varredura de assinaturas de ataque em uma única passada.
+
+Todas as assinaturas (padrões de ataque da segurança básica, caminhos
+suspeitos e parâmetros maliciosos da análise geográfica) são combinadas em
+uma alternância compilada por tipo de entrada: o path e a query são
+percorridos uma vez cada, e o resultado fica no contexto da requisição para
+os dois estágios. Tudo é lookahead (largura zero), para que termos
+sobrepostos ("wp-admin" e "admin") e termos dentro de uma assinatura
+("union" em "union select") sejam todos encontrados.
+
+O corpo é varrido em fluxo, à medida que a aplicação o lê, com uma janela de
+sobreposição entre os chunks e um limite de bytes inspecionados, sem bufferizar
+a requisição inteira.
+"""
+import codecs
+import re
+from dataclasses import dataclass
+from typing import Iterable, Tuple
+
+# Padrões de ataques comuns
+PADROES_ATAQUE = (
+    r'union\s+select',
+    r'drop\s+table',
+    r'<script.*?>',
+    r'javascript:',
+    r'onload\s*=',
+    r'onclick\s*=',
+    r'eval\s*\(',
+    r'document\.cookie',
+    r'\.\.\/.*\.\./',
+    r'\/etc\/passwd',
+    r'cmd\.exe',
+    r'powershell',
+    r'wget\s+',
+    r'curl\s+',
+)
+
+# Trechos de path típicos de varredura automatizada
+CAMINHOS_SUSPEITOS = (
+    "admin", "wp-admin", "phpmyadmin", "xmlrpc.php", "config.php",
+    "shell.php", "backdoor", "webshell", ".env", "backup",
+    "database", "sql", "dump", "test", "debug"
+)
+
+# Palavras de injeção na query string
+PARAMETROS_MALICIOSOS = (
+    "union", "select", "drop", "insert", "update",
+    "delete", "script", "alert", "eval", "exec"
+)
+
+# Caracteres do chunk anterior mantidos para achar assinaturas na fronteira
+JANELA_SOBREPOSICAO = 512
+
+
+@dataclass(frozen=True)
+class VarreduraURL:
+    """Resultado da varredura de path + query."""
+    ataque: bool = False
+    caminho_suspeito: str = ""
+    parametros: Tuple[str, ...] = ()
+
+
+def _literais(termos: Iterable[str]) -> str:
+    return "|".join(re.escape(t) for t in termos)
+
+
+class ScannerAtaques:
+    """Assinaturas compiladas em uma alternância por tipo de entrada."""
+
+    def __init__(
+        self,
+        padroes: Iterable[str] = PADROES_ATAQUE,
+        caminhos: Iterable[str] = CAMINHOS_SUSPEITOS,
+        parametros: Iterable[str] = PARAMETROS_MALICIOSOS,
+    ):
+        self.padroes = tuple(padroes)
+        self.caminhos = tuple(caminhos)
+        self.parametros = tuple(parametros)
+
+        ataque = "|".join(f"(?:{p})" for p in self.padroes)
+        self._re_ataque = re.compile(ataque, re.IGNORECASE)
+        self._re_path = self._combinar(ataque, _literais(self.caminhos))
+        self._re_query = self._combinar(ataque, _literais(self.parametros))
+
+    @staticmethod
+    def _combinar(ataque: str, termos: str) -> "re.Pattern":
+        # Na posição de uma assinatura o termo é capturado no mesmo match
+        return re.compile(
+            f"(?=(?P<ataque>{ataque}))(?=(?P<termo_ataque>{termos}))?|(?=(?P<termo>{termos}))",
+            re.IGNORECASE,
+        )
+
+    def contem_ataque(self, texto: str) -> bool:
+        return bool(texto) and self._re_ataque.search(texto) is not None
+
+    @staticmethod
+    def _varrer(regex: "re.Pattern", texto: str) -> Tuple[bool, set]:
+        ataque = False
+        termos = set()
+        for m in regex.finditer(texto):
+            if m.group("ataque") is not None:
+                ataque = True
+                termo = m.group("termo_ataque")
+            else:
+                termo = m.group("termo")
+            if termo is not None:
+                termos.add(termo.lower())
+        return ataque, termos
+
+    def varrer_url(self, path: str, query: str) -> VarreduraURL:
+        """Uma passada no path e uma na query, para os dois estágios de segurança."""
+        ataque_path, caminhos = self._varrer(self._re_path, path) if path else (False, set())
+        ataque_query, parametros = self._varrer(self._re_query, query) if query else (False, set())
+        # Mesma precedência das listas (o primeiro caminho da lista vence)
+        caminho = next((c for c in self.caminhos if c in caminhos), "")
+        return VarreduraURL(
+            ataque=ataque_path or ataque_query,
+            caminho_suspeito=caminho,
+            parametros=tuple(p for p in self.parametros if p in parametros),
+        )
+
+    def varredor_corpo(self, limite: int) -> "VarredorCorpo":
+        return VarredorCorpo(self._re_ataque, limite)
+
+
+class VarredorCorpo:
+    """Varredura incremental do corpo: inspeciona até `limite` bytes, chunk a chunk."""
+
+    __slots__ = ("_regex", "_decoder", "_cauda", "_lidos", "limite")
+
+    def __init__(self, regex: "re.Pattern", limite: int):
+        self._regex = regex
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self._cauda = ""
+        self._lidos = 0
+        self.limite = limite
+
+    def alimentar(self, dados: bytes, final: bool = False) -> bool:
+        """True se o trecho (com a cauda do anterior) contém uma assinatura de ataque."""
+        if self._lidos >= self.limite:
+            return False
+        dados = dados[: self.limite - self._lidos]
+        self._lidos += len(dados)
+        texto = self._cauda + self._decoder.decode(dados, final or self._lidos >= self.limite)
+        if self._regex.search(texto):
+            return True
+        self._cauda = texto[-JANELA_SOBREPOSICAO:]
+        return False
+
+
+scanner_ataques = ScannerAtaques()
@@ -0,0 +1,77 @@
+"""
+Contexto da requisição montado uma vez pelo pipeline de segurança.
+
+Resolve o IP real do cliente (considerando proxies), decodifica os headers e
+classifica o User-Agent. Fica em `scope["state"]["contexto"]`, acessível
+também nos endpoints via `request.state.contexto`.
+"""
+import uuid
+from typing import Dict, Optional
+
+from starlette.types import Scope
+
+from app.middleware.attack_scanner import VarreduraURL, scanner_ataques
+from app.middleware.user_agent import PerfilUserAgent, classificar_user_agent
+
+
+def resolver_ip(headers: Dict[str, str], scope: Scope) -> str:
+    """Obtém o IP real do cliente considerando proxies."""
+    # Verificar headers de proxy em ordem de prioridade
+    forwarded_ips = headers.get("x-forwarded-for")
+    if forwarded_ips:
+        # Pegar o primeiro IP (cliente original)
+        return forwarded_ips.split(",")[0].strip()
+
+    real_ip = headers.get("x-real-ip")
+    if real_ip:
+        return real_ip.strip()
+
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+# Rótulo das requisições que não casaram com nenhuma rota (404, métodos inválidos)
+ROTA_NAO_ENCONTRADA = "<unmatched>"
+
+
+def modelo_rota(scope: Scope) -> str:
+    """Template da rota que atendeu a requisição (o roteador grava a rota no scope)."""
+    rota = scope.get("route")
+    modelo = getattr(rota, "path_format", None) or getattr(rota, "path", None)
+    if modelo:
+        return scope.get("root_path", "") + modelo
+    return ROTA_NAO_ENCONTRADA
+
+
+class ContextoRequisicao:
+    """Dados da requisição compartilhados pelos estágios do pipeline."""
+
+    __slots__ = (
+        "metodo", "path", "query", "headers", "ip", "user_agent", "perfil_ua", "request_id", "rota", "_varredura"
+    )
+
+    def __init__(self, scope: Scope):
+        headers: Dict[str, str] = {}
+        for chave, valor in scope.get("headers", ()):
+            nome = chave.decode("latin-1")
+            if nome not in headers:
+                headers[nome] = valor.decode("latin-1")
+
+        self.metodo: str = scope["method"]
+        self.path: str = scope.get("root_path", "") + scope["path"]
+        self.query: str = scope.get("query_string", b"").decode("latin-1")
+        self.headers = headers
+        self.ip = resolver_ip(headers, scope)
+        self.user_agent: str = headers.get("user-agent", "")
+        # Memorizado pelo valor bruto do header
+        self.perfil_ua: PerfilUserAgent = classificar_user_agent(self.user_agent)
+        self.request_id = uuid.uuid4().hex[:8]
+        # Template da rota ("/api/v1/infracoes/{codigo}"), preenchido após o roteamento
+        self.rota: str = ""
+        self._varredura: Optional[VarreduraURL] = None
+
+    def varredura_url(self) -> VarreduraURL:
+        """Assinaturas de ataque no path e na query (varridos uma vez, usados por todos os estágios)."""
+        if self._varredura is None:
+            self._varredura = scanner_ataques.varrer_url(self.path, self.query)
+        return self._varredura
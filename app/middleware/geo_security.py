@@ -4,12 +4,9 @@ Proteção específica contra IPs chineses e bots maliciosos.
 """
 import time
 import requests
-import ipaddress
-from typing import Dict, Set, Optional, List
-from collections import defaultdict, deque
-from fastapi import Request, HTTPException
+from functools import lru_cache
+from typing import Dict, Set, Optional, List, Tuple
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
 import logging
 import json
 import hashlib
@@ -18,11 +15,16 @@ import string
 
 from app.core.config import settings
 from app.core.logger import logger, log_security_event
+from app.middleware.contexto import ContextoRequisicao
+from app.middleware.ip_ranges import TabelaFaixasIP
+from app.middleware.ip_state import TabelaEstadoIP, estado_ips as estado_ips_padrao
+from app.middleware.user_agent import PADROES_MALICIOSOS
 
 
-class GeoSecurityMiddleware(BaseHTTPMiddleware):
+class GeoSecurityMiddleware:
     """
-    Middleware de segurança geográfica com foco em proteção contra ataques automatizados.
+    Estágio de segurança geográfica com foco em proteção contra ataques automatizados.
+    Executado pelo SecurityPipelineMiddleware (app.middleware.pipeline).
 
     Features:
     - Detecção de IPs chineses
@@ -32,8 +34,7 @@ class GeoSecurityMiddleware(BaseHTTPMiddleware):
     - Rate limiting geográfico
     """
 
-    def __init__(self, app, enable_geo_blocking: bool = True):
-        super().__init__(app)
+    def __init__(self, enable_geo_blocking: bool = True, estado_ips: Optional[TabelaEstadoIP] = None):
         self.enable_geo_blocking = enable_geo_blocking
 
         # Ranges de IP chineses conhecidos (principais blocos)
@@ -63,13 +64,8 @@ class GeoSecurityMiddleware(BaseHTTPMiddleware):
             "223.0.0.0/11", "223.32.0.0/12", "223.48.0.0/13", "223.56.0.0/14"
         ]
 
-        # Compilar ranges para verificação eficiente
-        self.chinese_networks = []
-        for ip_range in self.chinese_ip_ranges:
-            try:
-                self.chinese_networks.append(ipaddress.ip_network(ip_range))
-            except:
-                pass
+        # Compilar ranges em intervalos ordenados (busca por bisect)
+        self.chinese_networks = TabelaFaixasIP(self.chinese_ip_ranges)
 
         # Outros ranges maliciosos conhecidos
         self.malicious_ranges = [
@@ -81,58 +77,47 @@ class GeoSecurityMiddleware(BaseHTTPMiddleware):
             "89.248.160.0/22"    # Known bot networks
         ]
 
-        self.malicious_networks = []
-        for ip_range in self.malicious_ranges:
-            try:
-                self.malicious_networks.append(ipaddress.ip_network(ip_range))
-            except:
-                pass
+        self.malicious_networks = TabelaFaixasIP(self.malicious_ranges)
 
-        # Estatísticas e controles
-        self.geo_stats = defaultdict(int)
-        self.blocked_geos = defaultdict(int)
-        self.captcha_challenges = {}  # IP -> challenge_data
-        self.captcha_failures = defaultdict(int)
+        # Listas completas opcionais (ranges do país, saídas Tor etc.)
+        self._carregar_arquivo(self.chinese_networks, settings.GEO_CHINA_RANGES_FILE)
+        self._carregar_arquivo(self.malicious_networks, settings.GEO_MALICIOUS_RANGES_FILE)
+
+        # LRU dos vereditos recentes: IP -> (chinês, malicioso)
+        self._veredito_ip = lru_cache(maxsize=settings.GEO_IP_CACHE_SIZE)(self._classificar_ip)
+
+        # Estatísticas e controles por IP (requisições, bloqueio, CAPTCHA) na tabela compartilhada
+        self.estado_ips = estado_ips if estado_ips is not None else estado_ips_padrao
 
         # User agents suspeitos (expandido)
-        self.malicious_user_agents = {
-            'python-requests', 'python-urllib3', 'python/3', 'go-http-client',
-            'java/', 'curl/', 'wget/', 'scrapy/', 'bot', 'crawler', 'spider',
-            'scanner', 'exploit', 'hack', 'attack', 'masscan', 'nmap',
-            'sqlmap', 'burp', 'nikto', 'acunetix', 'w3af', 'skipfish',
-            'openvas', 'nessus', 'metasploit', 'havij', 'pangolin',
-            'webinspect', 'appscan', 'brutus', 'hydra', 'medusa',
-            'john', 'aircrack', 'wireshark', 'ettercap', 'cain',
-            'kismet', 'fierce', 'dnsrecon', 'whatweb', 'wpscan',
-            'joomscan', 'droopescan', 'cmseek', 'shodan', 'censys'
-        }
+        self.malicious_user_agents = PADROES_MALICIOSOS
 
         logger.info(f"GeoSecurityMiddleware inicializado - {len(self.chinese_networks)} ranges chineses carregados")
 
+    @staticmethod
+    def _carregar_arquivo(tabela: TabelaFaixasIP, caminho: str):
+        if not caminho:
+            return
+        try:
+            carregadas = tabela.carregar_arquivo(caminho)
+            logger.info(f"{carregadas} ranges de IP carregados de {caminho}")
+        except OSError as e:
+            logger.warning(f"Não foi possível carregar ranges de IP de {caminho}: {e}")
+
+    def _classificar_ip(self, ip_str: str) -> Tuple[bool, bool]:
+        return self.chinese_networks.contem(ip_str), self.malicious_networks.contem(ip_str)
+
     def is_chinese_ip(self, ip_str: str) -> bool:
         """Verifica se o IP está em ranges chineses."""
-        try:
-            ip = ipaddress.ip_address(ip_str)
-            for network in self.chinese_networks:
-                if ip in network:
-                    return True
-            return False
-        except:
-            return False
+        return self._veredito_ip(ip_str)[0]
 
     def is_malicious_ip(self, ip_str: str) -> bool:
         """Verifica se o IP está em ranges maliciosos conhecidos."""
-        try:
-            ip = ipaddress.ip_address(ip_str)
-            for network in self.malicious_networks:
-                if ip in network:
-                    return True
-            return False
-        except:
-            return False
+        return self._veredito_ip(ip_str)[1]
 
-    def analyze_request_risk(self, request: Request, client_ip: str) -> Dict[str, any]:
+    def analyze_request_risk(self, ctx: ContextoRequisicao) -> Dict[str, any]:
         """Análise avançada de risco da requisição - VERSÃO MENOS RESTRITIVA."""
+        client_ip = ctx.ip
         risk_score = 0
         flags = []
 
@@ -147,50 +132,34 @@ class GeoSecurityMiddleware(BaseHTTPMiddleware):
             flags.append("chinese_ip_moderate_risk")
 
         # 2. User Agent analysis - MAIS TOLERANTE
-        user_agent = request.headers.get("user-agent", "").lower()
-        if not user_agent:
+        perfil = ctx.perfil_ua
+        if perfil.vazio:
             risk_score += 15  # Reduzido de 25 para 15
             flags.append("no_user_agent")
-        else:
+        elif perfil.alto_risco:
             # Apenas user agents claramente maliciosos
-            high_risk_patterns = ['scrapy', 'bot', 'crawler', 'spider', 'wget', 'curl/']
-            for pattern in high_risk_patterns:
-                if pattern in user_agent and 'googlebot' not in user_agent:
-                    risk_score += 25  # Reduzido de 35 para 25
-                    flags.append(f"suspicious_ua_{pattern}")
-                    break
+            risk_score += 25  # Reduzido de 35 para 25
+            flags.append(f"suspicious_ua_{perfil.alto_risco}")
 
         # 3. Headers analysis - MAIS PERMISSIVO
         # Apenas se não tiver NENHUM header comum
         common_headers = ["accept", "accept-language", "accept-encoding", "user-agent"]
-        missing_headers = [h for h in common_headers if not request.headers.get(h)]
+        missing_headers = [h for h in common_headers if not ctx.headers.get(h)]
         if len(missing_headers) >= 3:  # Mudado de 2 para 3
             risk_score += 15  # Reduzido de 20 para 15
             flags.append("missing_common_headers")
 
         # 4. Suspicious request patterns
-        path = str(request.url.path).lower()
-        suspicious_paths = [
-            "admin", "wp-admin", "phpmyadmin", "xmlrpc.php", "config.php",
-            "shell.php", "backdoor", "webshell", ".env", "backup",
-            "database", "sql", "dump", "test", "debug"
-        ]
-
-        for sus_path in suspicious_paths:
-            if sus_path in path:
-                risk_score += 40
-                flags.append(f"suspicious_path_{sus_path}")
-                break
-
         # 5. Query parameters analysis
-        query = str(request.url.query).lower() if request.url.query else ""
-        if query:
-            malicious_params = ["union", "select", "drop", "insert", "update",
-                              "delete", "script", "alert", "eval", "exec"]
-            for param in malicious_params:
-                if param in query:
-                    risk_score += 45
-                    flags.append(f"malicious_param_{param}")
+        # (path e query já varridos uma vez no contexto)
+        varredura = ctx.varredura_url()
+        if varredura.caminho_suspeito:
+            risk_score += 40
+            flags.append(f"suspicious_path_{varredura.caminho_suspeito}")
+
+        for param in varredura.parametros:
+            risk_score += 45
+            flags.append(f"malicious_param_{param}")
 
         # Determinar nível de risco - THRESHOLDS MUITO MAIS ALTOS
         if risk_score >= 120:  # Aumentado de 80 para 120
@@ -233,74 +202,62 @@ class GeoSecurityMiddleware(BaseHTTPMiddleware):
             "answer": str(answer)
         }
 
-    def verify_captcha(self, request: Request) -> bool:
+    def verify_captcha(self, ctx: ContextoRequisicao) -> bool:
         """Verifica resposta do CAPTCHA."""
-        captcha_id = request.headers.get("X-Captcha-ID")
-        captcha_response = request.headers.get("X-Captcha-Response")
+        captcha_id = ctx.headers.get("x-captcha-id")
+        captcha_response = ctx.headers.get("x-captcha-response")
 
         if not captcha_id or not captcha_response:
             return False
 
-        client_ip = self.get_client_ip(request)
-        if client_ip not in self.captcha_challenges:
+        estado = self.estado_ips.consultar(ctx.ip)
+        if estado is None or estado.captcha is None:
             return False
 
-        challenge_data = self.captcha_challenges[client_ip]
+        challenge_data = estado.captcha
         if challenge_data.get("challenge_id") != captcha_id:
             return False
 
         if challenge_data.get("answer") == captcha_response.strip():
             # CAPTCHA correto - remover challenge
-            del self.captcha_challenges[client_ip]
+            estado.captcha = None
             return True
         else:
             # CAPTCHA incorreto
-            self.captcha_failures[client_ip] += 1
+            estado.falhas_captcha += 1
             return False
 
-    def get_client_ip(self, request: Request) -> str:
-        """Obtém IP real do cliente."""
-        forwarded_ips = request.headers.get("x-forwarded-for")
-        if forwarded_ips:
-            return forwarded_ips.split(",")[0].strip()
-
-        real_ip = request.headers.get("x-real-ip")
-        if real_ip:
-            return real_ip.strip()
-
-        return request.client.host if request.client else "unknown"
-
-    def is_safe_request(self, request: Request, client_ip: str) -> bool:
+    def is_safe_request(self, ctx: ContextoRequisicao) -> bool:
         """
         Determina se o request é seguro e deve ser sempre permitido.
         Whitelist inteligente para evitar bloqueios desnecessários.
         """
+        client_ip = ctx.ip
+
         # 1. IPs locais e de desenvolvimento
         if client_ip in ['127.0.0.1', 'localhost', '::1'] or client_ip.startswith('192.168.') or client_ip.startswith('10.'):
             return True
 
         # 2. Requests do próprio sistema (health checks, etc)
-        if str(request.url.path) in ['/health', '/docs', '/redoc', '/openapi.json']:
+        if ctx.path in ['/health', '/docs', '/redoc', '/openapi.json']:
             return True
 
         # 3. Requests com Referer do próprio site (navegadores legítimos)
-        referer = request.headers.get("referer", "")
+        referer = ctx.headers.get("referer", "")
         if referer and ("localhost" in referer or "127.0.0.1" in referer):
             return True
 
         # 4. User agents de navegadores conhecidos
-        user_agent = request.headers.get("user-agent", "").lower()
-        browser_patterns = ['mozilla', 'chrome', 'safari', 'firefox', 'edge', 'opera', 'googlebot', 'bingbot', 'yandex', 'duckduckbot']
-        if any(pattern in user_agent for pattern in browser_patterns):
+        if ctx.perfil_ua.navegador:
             return True
 
         # 4b. App mobile oficial MultasGO (User-Agent: "MultasGO-App/x.y")
-        if "multasgo-app" in user_agent:
+        if ctx.perfil_ua.app_oficial:
             return True
 
         # 5. Requests com headers completos de navegador
         required_headers = ['accept', 'accept-language', 'accept-encoding']
-        if all(request.headers.get(header) for header in required_headers):
+        if all(ctx.headers.get(header) for header in required_headers):
             return True
 
         # 6. IPs de provedores brasileiros conhecidos (adicionar aqui se necessário)
@@ -308,16 +265,16 @@ class GeoSecurityMiddleware(BaseHTTPMiddleware):
 
         return False
 
-    async def dispatch(self, request: Request, call_next):
-        """Processamento principal do middleware."""
-        client_ip = self.get_client_ip(request)
+    def verificar(self, ctx: ContextoRequisicao) -> Optional[JSONResponse]:
+        """Processamento principal do estágio; retorna a resposta de bloqueio ou None."""
+        client_ip = ctx.ip
 
         # WHITELIST INTELIGENTE - Permitir sempre
-        if self.is_safe_request(request, client_ip):
-            return await call_next(request)
+        if self.is_safe_request(ctx):
+            return None
 
         # Análise de risco apenas para IPs não confiáveis
-        risk_analysis = self.analyze_request_risk(request, client_ip)
+        risk_analysis = self.analyze_request_risk(ctx)
         risk_level = risk_analysis["level"]
         risk_score = risk_analysis["score"]
 
@@ -330,8 +287,8 @@ class GeoSecurityMiddleware(BaseHTTPMiddleware):
                     "risk_score": risk_score,
                     "risk_level": risk_level,
                     "flags": risk_analysis["flags"],
-                    "user_agent": request.headers.get("user-agent", ""),
-                    "path": str(request.url.path)
+                    "user_agent": ctx.user_agent,
+                    "path": ctx.path
                 },
                 severity="ERROR"
             )
@@ -339,7 +296,7 @@ class GeoSecurityMiddleware(BaseHTTPMiddleware):
         # Ações baseadas no nível de risco - APENAS PARA RISCOS CRÍTICOS
         if risk_level == "CRITICAL" and risk_score > 120:
             # Bloquear apenas ameaças realmente críticas
-            self.blocked_geos[client_ip] = time.time()
+            self.estado_ips.obter(client_ip).bloqueado_geo_em = time.time()
             logger.warning(f"Suspicious bot detected from IP {client_ip}")
             return JSONResponse(
                 status_code=403,
@@ -354,21 +311,25 @@ class GeoSecurityMiddleware(BaseHTTPMiddleware):
             logger.info(f"Medium risk request from {client_ip} - allowing access")
 
         # Atualizar estatísticas
-        self.geo_stats[client_ip] += 1
+        self.estado_ips.obter(client_ip).requisicoes_geo += 1
 
         # Processar requisição normalmente
-        return await call_next(request)
+        return None
 
     def get_geo_stats(self) -> Dict[str, any]:
         """Retorna estatísticas de segurança geográfica."""
-        chinese_requests = sum(1 for ip in self.geo_stats.keys() if self.is_chinese_ip(ip))
+        analisados = [estado for estado in self.estado_ips if estado.requisicoes_geo]
+        chinese_requests = sum(1 for estado in analisados if self.is_chinese_ip(estado.ip))
 
         return {
-            "total_unique_ips": len(self.geo_stats),
+            "total_unique_ips": len(analisados),
             "chinese_ips_detected": chinese_requests,
-            "blocked_ips": len(self.blocked_geos),
-            "active_captcha_challenges": len(self.captcha_challenges),
-            "captcha_failures": dict(self.captcha_failures),
+            "blocked_ips": sum(1 for estado in self.estado_ips if estado.bloqueado_geo_em),
+            "active_captcha_challenges": sum(1 for estado in self.estado_ips if estado.captcha is not None),
+            "captcha_failures": {
+                estado.ip: estado.falhas_captcha for estado in self.estado_ips if estado.falhas_captcha
+            },
             "malicious_ranges_loaded": len(self.malicious_networks),
-            "chinese_ranges_loaded": len(self.chinese_networks)
+            "chinese_ranges_loaded": len(self.chinese_networks),
+            "ip_verdict_cache": self._veredito_ip.cache_info()._asdict()
         }
\ No newline at end of file
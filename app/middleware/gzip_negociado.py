@@ -0,0 +1,41 @@
+"""
+GZip de respostas dinâmicas com negociação correta do Accept-Encoding.
+
+O GZipMiddleware do Starlette decide por substring ("gzip;q=0" comprime) e
+acrescenta "Accept-Encoding" ao Vary mesmo quando a resposta já o declara
+(cabecalhos_cache), gerando "Vary: Accept-Encoding, Accept-Encoding". Aqui a
+decisão usa `codificacoes_aceitas` e o Vary final fica sem repetições.
+"""
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+from app.core.compressao import codificacoes_aceitas
+
+
+def _vary_sem_repeticao(send: Send) -> Send:
+    async def enviar(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(raw=message["headers"])
+            vary = headers.get("vary")
+            if vary and "," in vary:
+                valores = []
+                for valor in vary.split(","):
+                    valor = valor.strip()
+                    if valor and valor.lower() not in (v.lower() for v in valores):
+                        valores.append(valor)
+                headers["vary"] = ", ".join(valores)
+        await send(message)
+
+    return enviar
+
+
+class GZipNegociado(GZipMiddleware):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            aceitas = codificacoes_aceitas(Headers(scope=scope).get("accept-encoding", ""))
+            if "gzip" in aceitas:
+                responder = GZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+                await responder(scope, receive, _vary_sem_repeticao(send))
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,80 @@
+"""
+Tabela de faixas de IP (CIDR) com busca binária.
+
+As faixas são convertidas em intervalos inteiros [início, fim], ordenados e
+mesclados por família (IPv4/IPv6). A consulta é um `bisect` sobre a lista de
+inícios: o custo por requisição fica O(log n) mesmo com listas completas de
+países ou de saídas Tor carregadas de arquivo.
+"""
+import bisect
+import ipaddress
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class TabelaFaixasIP:
+    """Conjunto de faixas CIDR com teste de pertinência por bisect."""
+
+    def __init__(self, faixas: Iterable[str] = ()):
+        self._intervalos: Dict[int, List[Tuple[int, int]]] = {4: [], 6: []}
+        self._inicios: Dict[int, List[int]] = {4: [], 6: []}
+        self._fins: Dict[int, List[int]] = {4: [], 6: []}
+        self.total_faixas = 0
+        self.adicionar(faixas)
+
+    def __len__(self) -> int:
+        return self.total_faixas
+
+    def adicionar(self, faixas: Iterable[str]) -> int:
+        """Adiciona faixas CIDR (ou IPs isolados); entradas inválidas são ignoradas."""
+        adicionadas = 0
+        for faixa in faixas:
+            faixa = faixa.strip()
+            if not faixa:
+                continue
+            try:
+                rede = ipaddress.ip_network(faixa, strict=False)
+            except ValueError:
+                logger.debug(f"Faixa de IP inválida ignorada: {faixa}")
+                continue
+            self._intervalos[rede.version].append(
+                (int(rede.network_address), int(rede.broadcast_address))
+            )
+            adicionadas += 1
+
+        if adicionadas:
+            self.total_faixas += adicionadas
+            self._compilar()
+        return adicionadas
+
+    def carregar_arquivo(self, caminho: str) -> int:
+        """Carrega um arquivo com uma faixa por linha (comentários com '#')."""
+        linhas = Path(caminho).read_text(encoding="utf-8").splitlines()
+        return self.adicionar(linha.split("#", 1)[0] for linha in linhas)
+
+    def _compilar(self):
+        for versao, intervalos in self._intervalos.items():
+            mesclados: List[Tuple[int, int]] = []
+            for inicio, fim in sorted(intervalos):
+                if mesclados and inicio <= mesclados[-1][1] + 1:
+                    if fim > mesclados[-1][1]:
+                        mesclados[-1] = (mesclados[-1][0], fim)
+                else:
+                    mesclados.append((inicio, fim))
+            self._intervalos[versao] = mesclados
+            self._inicios[versao] = [inicio for inicio, _ in mesclados]
+            self._fins[versao] = [fim for _, fim in mesclados]
+
+    def contem(self, ip_str: str) -> bool:
+        """True se o IP pertence a alguma faixa; IPs inválidos retornam False."""
+        try:
+            ip = ipaddress.ip_address(ip_str)
+        except ValueError:
+            return False
+        valor = int(ip)
+        inicios = self._inicios[ip.version]
+        posicao = bisect.bisect_right(inicios, valor) - 1
+        return posicao >= 0 and valor <= self._fins[ip.version][posicao]
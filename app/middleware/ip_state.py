@@ -0,0 +1,140 @@
+"""
+Estado por IP compartilhado pelos estágios de segurança e pelo monitoramento.
+
+Antes cada middleware mantinha seus próprios dicionários por IP (contadores de
+suspeita, requisições e erros, estatísticas geográficas, desafios CAPTCHA),
+limpos só de vez em quando ou nunca: com uma botnet trocando de IP eles
+cresciam sem limite. Aqui há um registro compacto por IP (`__slots__`) em uma
+tabela com capacidade máxima (o registro menos recente é descartado) e
+expiração por inatividade conduzida por um timing wheel, sem varreduras.
+"""
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional
+
+from app.core.config import settings
+from app.core.timing_wheel import TimingWheel
+
+
+class EstadoIP:
+    """Tudo o que os middlewares guardam sobre um IP."""
+
+    __slots__ = (
+        "ip", "expira_em",
+        # Segurança básica: pontuação de suspeita (bots, ataques, rate limit)
+        "suspeita",
+        # Monitoramento: requisições, erros e instante da última requisição
+        "requisicoes", "erros", "ultima_requisicao",
+        # Segurança geográfica: requisições analisadas, bloqueio, CAPTCHA
+        "requisicoes_geo", "bloqueado_geo_em", "captcha", "falhas_captcha",
+    )
+
+    def __init__(self, ip: str, expira_em: float):
+        self.ip = ip
+        self.expira_em = expira_em
+        self.suspeita = 0
+        self.requisicoes = 0
+        self.erros = 0
+        self.ultima_requisicao = 0.0
+        self.requisicoes_geo = 0
+        self.bloqueado_geo_em = 0.0
+        self.captcha: Optional[Dict[str, str]] = None
+        self.falhas_captcha = 0
+
+
+class TabelaEstadoIP:
+    """
+    Registros por IP com capacidade limitada e TTL renovado a cada acesso.
+
+    `obter` cria ou renova o registro; `consultar` só lê. Os registros vencidos
+    saem pelo timing wheel a cada acesso, em O(1) amortizado.
+    """
+
+    def __init__(self, capacidade: int = 100_000, ttl: float = 3600):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._registros: "OrderedDict[str, EstadoIP]" = OrderedDict()
+        self._wheel = TimingWheel(resolucao=1.0)
+        self.expirados = 0
+        self.descartados = 0
+
+    def __len__(self) -> int:
+        return len(self._registros)
+
+    def __iter__(self) -> Iterator[EstadoIP]:
+        return iter(list(self._registros.values()))
+
+    def _expirar(self, agora: float):
+        for ip in self._wheel.avancar(agora):
+            registro = self._registros.get(ip)
+            if registro is None:
+                continue
+            if registro.expira_em > agora:
+                # Renovado desde o agendamento
+                self._wheel.agendar(ip, registro.expira_em)
+                continue
+            del self._registros[ip]
+            self.expirados += 1
+
+    def obter(self, ip: str, agora: Optional[float] = None) -> EstadoIP:
+        """Registro do IP (criado se necessário), com o TTL renovado."""
+        if agora is None:
+            agora = time.time()
+        self._expirar(agora)
+
+        registro = self._registros.get(ip)
+        if registro is not None:
+            registro.expira_em = agora + self.ttl
+            self._registros.move_to_end(ip)
+            return registro
+
+        if len(self._registros) >= self.capacidade:
+            # Tabela cheia: descartar o IP menos recente
+            antigo, _ = self._registros.popitem(last=False)
+            self._wheel.cancelar(antigo)
+            self.descartados += 1
+        registro = EstadoIP(ip, agora + self.ttl)
+        self._registros[ip] = registro
+        # Agendado uma vez; renovações só estendem expira_em (reagendado ao vencer)
+        self._wheel.agendar(ip, registro.expira_em)
+        return registro
+
+    def consultar(self, ip: str) -> Optional[EstadoIP]:
+        """Registro do IP, sem criar nem renovar."""
+        registro = self._registros.get(ip)
+        if registro is not None and registro.expira_em <= time.time():
+            return None
+        return registro
+
+    def remover(self, ip: str):
+        if self._registros.pop(ip, None) is not None:
+            self._wheel.cancelar(ip)
+
+    def limpar(self):
+        self._registros.clear()
+        self._wheel.limpar()
+
+    def memoria_bytes(self) -> int:
+        """Estimativa do espaço ocupado pelos registros, chaves e índices."""
+        total = sys.getsizeof(self._registros)
+        for ip, registro in self._registros.items():
+            total += sys.getsizeof(ip) + sys.getsizeof(registro)
+            if registro.captcha is not None:
+                total += sys.getsizeof(registro.captcha)
+        return total + self._wheel.memoria_bytes()
+
+    def get_stats(self) -> Dict:
+        self._expirar(time.time())
+        return {
+            "entries": len(self._registros),
+            "capacity": self.capacidade,
+            "ttl_seconds": self.ttl,
+            "scheduled_expirations": len(self._wheel),
+            "expired": self.expirados,
+            "evicted": self.descartados,
+            "memory_bytes": self.memoria_bytes(),
+        }
+
+
+estado_ips = TabelaEstadoIP(settings.IP_STATE_MAX_ENTRIES, settings.IP_STATE_TTL)
@@ -1,30 +1,39 @@
 """
-Middleware de monitoramento para performance e métricas da aplicação.
+Monitoramento de performance e métricas da aplicação (estágio final do pipeline).
 """
 import time
-import uuid
-from typing import Dict, List
-from collections import defaultdict, deque
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from typing import Dict, List, Optional, Tuple
+from collections import defaultdict
 import logging
 
+from app.core.config import settings
+from app.core.histograma import Histograma, HistogramaJanela
 from app.core.logger import log_api_access, log_performance, log_security_event
+from app.middleware.contexto import ContextoRequisicao
+from app.middleware.ip_state import TabelaEstadoIP, estado_ips as estado_ips_padrao
 
-class MonitoringMiddleware(BaseHTTPMiddleware):
+class MonitoringMiddleware:
     """
-    Middleware para monitoramento de performance, logging de acesso e métricas.
+    Monitoramento de performance, logging de acesso e métricas.
+    Executado pelo SecurityPipelineMiddleware (app.middleware.pipeline) em volta da aplicação.
     """
 
-    def __init__(self, app: ASGIApp):
-        super().__init__(app)
+    def __init__(
+        self,
+        estado_ips: Optional[TabelaEstadoIP] = None,
+        janela_metricas: int = settings.METRICS_WINDOW_SECONDS,  # Janela dos percentis
+        fatias_janela: int = settings.METRICS_WINDOW_SLICES
+    ):
         self.logger = logging.getLogger('MultasGO.monitoring')
 
         # Métricas em memória
         self.request_count = 0
         self.error_count = 0
-        self.response_times = deque(maxlen=1000)  # Últimas 1000 requisições
+        self.janela_metricas = janela_metricas
+        self.fatias_janela = fatias_janela
+        # Histogramas de latência: geral e por (método + template da rota, classe de status)
+        self.response_times = HistogramaJanela(janela_metricas, fatias_janela)
+        self.route_histograms: Dict[Tuple[str, str], HistogramaJanela] = {}
         self.endpoint_stats = defaultdict(lambda: {
             'count': 0,
             'total_time': 0,
@@ -37,24 +46,8 @@ class MonitoringMiddleware(BaseHTTPMiddleware):
         # Status codes tracking
         self.status_codes = defaultdict(int)
 
-        # IPs suspeitos
-        self.suspicious_ips = defaultdict(lambda: {
-            'requests': 0,
-            'errors': 0,
-            'last_request': 0
-        })
-
-    def get_client_ip(self, request: Request) -> str:
-        """Obtém o IP real do cliente."""
-        forwarded_ips = request.headers.get("x-forwarded-for")
-        if forwarded_ips:
-            return forwarded_ips.split(",")[0].strip()
-
-        real_ip = request.headers.get("x-real-ip")
-        if real_ip:
-            return real_ip.strip()
-
-        return request.client.host if request.client else "unknown"
+        # Requisições e erros por IP (tabela limitada, com TTL, compartilhada com a segurança)
+        self.estado_ips = estado_ips if estado_ips is not None else estado_ips_padrao
 
     def is_health_check(self, path: str) -> bool:
         """Verifica se é um health check (não logar como requisição normal)."""
@@ -66,17 +59,18 @@ class MonitoringMiddleware(BaseHTTPMiddleware):
         static_extensions = ['.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.ico', '.svg', '.woff', '.woff2']
         return any(path.endswith(ext) for ext in static_extensions) or path.startswith('/static/')
 
-    def analyze_request_pattern(self, request: Request, client_ip: str, response_time: float) -> Dict:
+    def analyze_request_pattern(self, ctx: ContextoRequisicao, response_time: float) -> Dict:
         """Analisa padrões de requisição para detectar anomalias."""
         current_time = time.time()
-        ip_data = self.suspicious_ips[client_ip]
+        client_ip = ctx.ip
+        ip_data = self.estado_ips.obter(client_ip, current_time)
 
-        ip_data['requests'] += 1
-        ip_data['last_request'] = current_time
+        ip_data.requisicoes += 1
+        ip_data.ultima_requisicao = current_time
 
         # Exceção para endpoints de desenvolvimento/monitoramento
         allowed_paths = ['/api/v1/infracoes/explorador', '/explorador', '/api/docs', '/metrics']
-        is_allowed_path = any(request.url.path.startswith(path) for path in allowed_paths)
+        is_allowed_path = any(ctx.path.startswith(path) for path in allowed_paths)
 
         # Exceção para localhost durante desenvolvimento
         is_localhost = client_ip in ['127.0.0.1', 'localhost', '::1']
@@ -86,44 +80,50 @@ class MonitoringMiddleware(BaseHTTPMiddleware):
 
         # Requisições muito rápidas em sequência (possível bot) - MAS não para localhost durante desenvolvimento
         if not (is_allowed_path and is_localhost):
-            if response_time < 0.01 and ip_data['requests'] > 50:  # Aumentado de 10 para 50
+            if response_time < 0.01 and ip_data.requisicoes > 50:  # Aumentado de 10 para 50
                 anomalies.append('very_fast_requests')
 
         # User agent suspeito - MAS não para endpoints permitidos ou localhost
         if not (is_allowed_path and is_localhost):
-            user_agent = request.headers.get('user-agent', '').lower()
-            suspicious_agents = ['curl', 'wget', 'python-requests', 'scanner', 'sqlmap', 'nikto', 'scrapy']
-            if any(agent in user_agent for agent in suspicious_agents):
+            if ctx.perfil_ua.suspeito_monitoramento:
                 anomalies.append('suspicious_user_agent')
 
         # Falta de headers comuns - MAS não para endpoints permitidos ou localhost
         if not (is_allowed_path and is_localhost):
-            if not request.headers.get('accept') or not request.headers.get('accept-language'):
+            if not ctx.headers.get('accept') or not ctx.headers.get('accept-language'):
                 anomalies.append('missing_common_headers')
 
         # Muitos erros do mesmo IP
-        if ip_data['errors'] > 5:
+        if ip_data.erros > 5:
             anomalies.append('high_error_rate')
 
         return {
             'ip': client_ip,
             'anomalies': anomalies,
-            'request_count': ip_data['requests'],
-            'error_count': ip_data['errors']
+            'request_count': ip_data.requisicoes,
+            'error_count': ip_data.erros
         }
 
-    def update_metrics(self, method: str, path: str, status_code: int, response_time: float):
-        """Atualiza métricas da aplicação."""
+    def update_metrics(self, method: str, route: str, status_code: int, response_time: float):
+        """Atualiza métricas da aplicação (`route` é o template da rota, não o path)."""
+        agora = time.time()
+
         # Contadores globais
         self.request_count += 1
-        self.response_times.append(response_time)
+        self.response_times.registrar(response_time, agora)
         self.status_codes[status_code] += 1
 
         if status_code >= 400:
             self.error_count += 1
 
         # Métricas por endpoint
-        endpoint_key = f"{method} {path}"
+        endpoint_key = f"{method} {route}"
+        chave = (endpoint_key, f"{status_code // 100}xx")
+        histograma = self.route_histograms.get(chave)
+        if histograma is None:
+            histograma = self.route_histograms[chave] = HistogramaJanela(self.janela_metricas, self.fatias_janela)
+        histograma.registrar(response_time, agora)
+
         stats = self.endpoint_stats[endpoint_key]
 
         stats['count'] += 1
@@ -135,120 +135,108 @@ class MonitoringMiddleware(BaseHTTPMiddleware):
         if status_code >= 400:
             stats['error_count'] += 1
 
-    async def dispatch(self, request: Request, call_next):
-        """Processa a requisição com monitoramento completo."""
-        start_time = time.time()
-        request_id = str(uuid.uuid4())[:8]
-        client_ip = self.get_client_ip(request)
-
-        # Adicionar request ID ao contexto
-        request.state.request_id = request_id
-
-        try:
-            # Processar requisição
-            response = await call_next(request)
-
-            # Calcular tempo de resposta
-            response_time = time.time() - start_time
-            status_code = response.status_code
-
-            # Adicionar headers de monitoramento
-            response.headers["X-Request-ID"] = request_id
-            response.headers["X-Response-Time"] = f"{response_time:.3f}"
-
-            # Pular logging para recursos estáticos e health checks
-            if not self.is_static_resource(request.url.path) and not self.is_health_check(request.url.path):
-
-                # Log de acesso
-                log_api_access(
-                    method=request.method,
-                    path=request.url.path,
-                    status_code=status_code,
-                    response_time=response_time,
-                    user_ip=client_ip,
-                    user_agent=request.headers.get('user-agent')
-                )
-
-                # Atualizar métricas
-                self.update_metrics(request.method, request.url.path, status_code, response_time)
-
-                # Analisar padrões suspeitos
-                if status_code >= 400:
-                    self.suspicious_ips[client_ip]['errors'] += 1
-
-                pattern_analysis = self.analyze_request_pattern(request, client_ip, response_time)
-
-                if pattern_analysis['anomalies']:
-                    log_security_event(
-                        event_type='suspicious_request_pattern',
-                        details={
-                            'ip': client_ip,
-                            'path': request.url.path,
-                            'method': request.method,
-                            'anomalies': pattern_analysis['anomalies'],
-                            'user_agent': request.headers.get('user-agent'),
-                            'request_count': pattern_analysis['request_count']
-                        },
-                        severity='WARNING'
-                    )
-
-                # Log de performance para operações lentas
-                if response_time > 1.0:
-                    log_performance(
-                        operation=f"{request.method} {request.url.path}",
-                        execution_time=response_time,
-                        details={
-                            'status_code': status_code,
-                            'client_ip': client_ip,
-                            'request_id': request_id
-                        }
-                    )
-
-            return response
-
-        except Exception as e:
-            # Log de erro
-            response_time = time.time() - start_time
-            self.error_count += 1
-            self.suspicious_ips[client_ip]['errors'] += 1
-
-            # Log do erro
-            self.logger.error(f"Unhandled error in request {request_id}: {str(e)}", extra={
-                'request_id': request_id,
-                'client_ip': client_ip,
-                'method': request.method,
-                'path': request.url.path,
-                'response_time': response_time,
-                'error_type': type(e).__name__
-            })
-
-            # Log de segurança para muitos erros
-            if self.suspicious_ips[client_ip]['errors'] > 10:
-                log_security_event(
-                    event_type='high_error_rate',
-                    details={
-                        'ip': client_ip,
-                        'error_count': self.suspicious_ips[client_ip]['errors'],
-                        'path': request.url.path,
-                        'latest_error': str(e)
-                    },
-                    severity='ERROR'
-                )
-
-            # Re-raise para permitir handling upstream
-            raise
-
-    def get_metrics(self) -> Dict:
-        """Retorna métricas da aplicação."""
-        # Calcular métricas de response time
-        if self.response_times:
-            sorted_times = sorted(self.response_times)
-            p50 = sorted_times[len(sorted_times) // 2]
-            p95 = sorted_times[int(len(sorted_times) * 0.95)]
-            p99 = sorted_times[int(len(sorted_times) * 0.99)]
-            avg_time = sum(self.response_times) / len(self.response_times)
-        else:
-            p50 = p95 = p99 = avg_time = 0
+    def registrar(self, ctx: ContextoRequisicao, status_code: int, response_time: float):
+        """Registra uma requisição concluída (log de acesso, métricas e anomalias)."""
+        path = ctx.path
+
+        # Pular logging para recursos estáticos e health checks
+        if self.is_static_resource(path) or self.is_health_check(path):
+            return
+
+        client_ip = ctx.ip
+
+        # Log de acesso
+        log_api_access(
+            method=ctx.metodo,
+            path=path,
+            status_code=status_code,
+            response_time=response_time,
+            user_ip=client_ip,
+            user_agent=ctx.user_agent or None
+        )
+
+        # Atualizar métricas
+        self.update_metrics(ctx.metodo, ctx.rota or path, status_code, response_time)
+
+        # Analisar padrões suspeitos
+        if status_code >= 400:
+            self.estado_ips.obter(client_ip).erros += 1
+
+        pattern_analysis = self.analyze_request_pattern(ctx, response_time)
+
+        if pattern_analysis['anomalies']:
+            log_security_event(
+                event_type='suspicious_request_pattern',
+                details={
+                    'ip': client_ip,
+                    'path': path,
+                    'method': ctx.metodo,
+                    'anomalies': pattern_analysis['anomalies'],
+                    'user_agent': ctx.user_agent or None,
+                    'request_count': pattern_analysis['request_count']
+                },
+                severity='WARNING'
+            )
+
+        # Log de performance para operações lentas
+        if response_time > 1.0:
+            log_performance(
+                operation=f"{ctx.metodo} {path}",
+                execution_time=response_time,
+                details={
+                    'status_code': status_code,
+                    'client_ip': client_ip,
+                    'request_id': ctx.request_id
+                }
+            )
+
+    def registrar_erro(self, ctx: ContextoRequisicao, error: Exception, response_time: float):
+        """Registra uma exceção não tratada (o pipeline a propaga em seguida)."""
+        client_ip = ctx.ip
+        self.error_count += 1
+        estado = self.estado_ips.obter(client_ip)
+        estado.erros += 1
+
+        # Log do erro
+        self.logger.error(f"Unhandled error in request {ctx.request_id}: {str(error)}", extra={
+            'request_id': ctx.request_id,
+            'client_ip': client_ip,
+            'method': ctx.metodo,
+            'path': ctx.path,
+            'response_time': response_time,
+            'error_type': type(error).__name__
+        })
+
+        # Log de segurança para muitos erros
+        if estado.erros > 10:
+            log_security_event(
+                event_type='high_error_rate',
+                details={
+                    'ip': client_ip,
+                    'error_count': estado.erros,
+                    'path': ctx.path,
+                    'latest_error': str(error)
+                },
+                severity='ERROR'
+            )
+
+    def snapshot(self, janela: Optional[float] = None) -> Dict[Tuple[str, str], Histograma]:
+        """Histogramas por (rota, classe de status) dos últimos `janela` segundos (mescláveis)."""
+        agora = time.time()
+        return {
+            chave: histograma.snapshot(janela, agora)
+            for chave, histograma in list(self.route_histograms.items())
+        }
+
+    def get_metrics(self, janela: Optional[float] = None) -> Dict:
+        """Retorna métricas da aplicação (percentis dos últimos `janela` segundos)."""
+        # Percentis de response time a partir dos histogramas da janela
+        geral = self.response_times.snapshot(janela)
+        rotas = {
+            f"{endpoint} {classe}": histograma.resumo()
+            for (endpoint, classe), histograma in sorted(self.snapshot(janela).items())
+            if histograma.total
+        }
 
         # Top endpoints por volume
         top_endpoints = sorted(
@@ -268,43 +256,38 @@ class MonitoringMiddleware(BaseHTTPMiddleware):
             'total_requests': self.request_count,
             'total_errors': self.error_count,
             'error_rate': (self.error_count / max(self.request_count, 1)) * 100,
+            'window_seconds': min(janela or self.janela_metricas, self.janela_metricas),
             'response_times': {
-                'avg': avg_time,
-                'p50': p50,
-                'p95': p95,
-                'p99': p99
+                'avg': geral.media,
+                'p50': geral.percentil(50),
+                'p95': geral.percentil(95),
+                'p99': geral.percentil(99),
+                'count': geral.total
             },
+            'routes': rotas,
             'status_codes': dict(self.status_codes),
             'top_endpoints': top_endpoints,
             'slow_endpoints': slow_endpoints,
-            'suspicious_ips_count': len([ip for ip, data in self.suspicious_ips.items()
-                                       if data['errors'] > 3 or data['requests'] > 100])
+            'suspicious_ips_count': sum(1 for estado in self.estado_ips
+                                        if estado.erros > 3 or estado.requisicoes > 100)
         }
 
     def reset_metrics(self):
         """Reset das métricas (útil para testes ou limpeza periódica)."""
         self.request_count = 0
         self.error_count = 0
-        self.response_times.clear()
+        self.response_times.zerar()
+        self.route_histograms.clear()
         self.endpoint_stats.clear()
         self.status_codes.clear()
         # Manter dados de IPs suspeitos por segurança
 
     def cleanup_old_data(self):
         """Limpa dados antigos para economizar memória."""
-        current_time = time.time()
-
-        # Remover IPs que não fazem requisições há mais de 1 hora
-        old_ips = [
-            ip for ip, data in self.suspicious_ips.items()
-            if current_time - data['last_request'] > 3600
-        ]
-
-        for ip in old_ips:
-            del self.suspicious_ips[ip]
+        # IPs sem requisições há mais de IP_STATE_TTL expiram na própria tabela
 
-        # Limitar response_times a 1000 entradas (já feito pelo deque)
-        # Limitar endpoint_stats a 500 endpoints
+        # Histogramas têm memória fixa e endpoint_stats usa templates de rota;
+        # o limite de 500 endpoints fica como proteção
         if len(self.endpoint_stats) > 500:
             # Manter apenas os endpoints mais ativos
             sorted_endpoints = sorted(
@@ -0,0 +1,165 @@
+"""
+Pipeline ASGI único de segurança e monitoramento.
+
+Substitui as três camadas BaseHTTPMiddleware (monitoramento, segurança
+geográfica e segurança básica). Cada uma criava sua própria task, embrulhava o
+stream da resposta e reprocessava X-Forwarded-For e User-Agent. Aqui o
+contexto da requisição é montado uma vez e guardado no scope, os estágios
+rodam em ordem e os headers são injetados no `http.response.start`, sem tocar
+no corpo da resposta.
+"""
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.middleware.contexto import ContextoRequisicao, modelo_rota
+from app.middleware.monitoring import MonitoringMiddleware
+
+logger = logging.getLogger(__name__)
+
+METODOS_COM_CORPO = frozenset({"POST", "PUT", "PATCH"})
+
+
+def _codificar(headers: Dict[str, str]) -> List[Tuple[bytes, bytes]]:
+    return [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]
+
+
+class SecurityPipelineMiddleware:
+    """
+    Middleware ASGI puro que executa, nesta ordem:
+    1. os estágios de verificação (`verificar(ctx)`), que retornam uma resposta
+       de bloqueio ou None;
+    2. a aplicação, com o monitor registrando status e tempo de resposta.
+
+    Em POST/PUT/PATCH o corpo é inspecionado em fluxo enquanto a aplicação o lê
+    (estágios com `varredor_corpo(ctx)`), sem bufferizar. Se um chunk contém
+    ataque ou o corpo passa de `max_request_size`, a aplicação recebe
+    `http.disconnect`, sua resposta é descartada e o bloqueio é enviado.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        estagios: Iterable = (),
+        monitor: Optional[MonitoringMiddleware] = None,
+        security_headers: Optional[Dict[str, str]] = None,
+        max_request_size: int = 1024 * 1024,  # 1MB
+    ):
+        self.app = app
+        self.estagios = list(estagios)
+        self.monitor = monitor
+        self.security_headers = _codificar(security_headers or {})
+        self.max_request_size = max_request_size
+        self._estagios_corpo = [e for e in self.estagios if hasattr(e, "varredor_corpo")]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        ctx = ContextoRequisicao(scope)
+        estado = scope.setdefault("state", {})
+        estado["contexto"] = ctx
+        estado["request_id"] = ctx.request_id
+
+        monitor = self.monitor
+        inicio = time.time()
+        status_code = 500
+        response_time: Optional[float] = None
+        # Headers de monitoramento só nas respostas da aplicação
+        monitorar = False
+        # Resposta de bloqueio decidida durante a leitura do corpo
+        bloqueio: Optional[Response] = None
+        iniciada = False
+
+        async def enviar(message: Message) -> None:
+            nonlocal status_code, response_time, iniciada
+            if bloqueio is not None and monitorar and not iniciada:
+                return  # Resposta da aplicação descartada: o bloqueio é enviado no lugar
+            if message["type"] == "http.response.start":
+                iniciada = True
+                # Não expor server header
+                headers = [(k, v) for k, v in message.get("headers", ()) if k != b"server"]
+                headers.extend(self.security_headers)
+                if monitorar:
+                    response_time = time.time() - inicio
+                    status_code = message["status"]
+                    headers.append((b"x-request-id", ctx.request_id.encode("latin-1")))
+                    headers.append((b"x-response-time", f"{response_time:.3f}".encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        for estagio in self.estagios:
+            try:
+                resposta = estagio.verificar(ctx)
+            except Exception as e:
+                # Em caso de erro, permitir a requisição mas logar
+                logger.error(f"Security stage {type(estagio).__name__} error for IP {ctx.ip}: {str(e)}")
+                continue
+
+            if resposta is not None:
+                await resposta(scope, receive, enviar)
+                return
+
+        if ctx.metodo in METODOS_COM_CORPO:
+            varredores = []
+            for estagio in self._estagios_corpo:
+                try:
+                    varredores.append((estagio, estagio.varredor_corpo(ctx)))
+                except Exception as e:
+                    logger.error(f"Security stage {type(estagio).__name__} error for IP {ctx.ip}: {str(e)}")
+            receive_original = receive
+            recebidos = 0
+
+            async def receive_inspecionado() -> Message:
+                nonlocal bloqueio, recebidos
+                if bloqueio is not None:
+                    return {"type": "http.disconnect"}
+                message = await receive_original()
+                if message["type"] != "http.request":
+                    return message
+
+                parte = message.get("body", b"")
+                final = not message.get("more_body", False)
+                recebidos += len(parte)
+                if recebidos > self.max_request_size:
+                    logger.warning(f"Request too large from IP {ctx.ip}")
+                    bloqueio = JSONResponse(
+                        status_code=413,
+                        content={"detail": "Request entity too large"}
+                    )
+                    return {"type": "http.disconnect"}
+
+                for estagio, varredor in varredores:
+                    if varredor.alimentar(parte, final):
+                        bloqueio = estagio.corpo_bloqueado(ctx)
+                        return {"type": "http.disconnect"}
+                return message
+
+            receive = receive_inspecionado
+
+        monitorar = True
+        try:
+            await self.app(scope, receive, enviar)
+        except Exception as e:
+            if bloqueio is None or iniciada:
+                if monitor is not None:
+                    ctx.rota = modelo_rota(scope)
+                    monitor.registrar_erro(ctx, e, time.time() - inicio)
+                # Re-raise para permitir handling upstream
+                raise
+
+        if bloqueio is not None and not iniciada:
+            monitorar = False
+            await bloqueio(scope, receive, enviar)
+            return
+
+        if monitor is not None:
+            if response_time is None:
+                response_time = time.time() - inicio
+            ctx.rota = modelo_rota(scope)
+            monitor.registrar(ctx, status_code, response_time)
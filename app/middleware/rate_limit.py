@@ -0,0 +1,194 @@
+"""
+Rate limiting por token bucket com estado limitado por IP.
+
+Cada par (IP, grupo de rota) guarda só dois floats: tokens disponíveis e o
+instante da última atualização. Os baldes ficam em uma tabela LRU com
+capacidade máxima; um balde ocioso por mais tempo que a janela já estaria
+cheio de novo, então pode ser descartado sem mudar o resultado. Os bloqueios
+(IP -> instante do bloqueio) também ficam no limiter, para que o backend
+compartilhado entre workers (app.middleware.shared_limiter) valha para ambos.
+
+Limites por rota (`RATE_LIMIT_ROUTES`) usam o formato
+"prefixo=requisições,prefixo=requisições", todos na mesma janela, por exemplo
+"/api/v1/infracoes/smart=300,/api/v1/infracoes/pesquisa=60". O restante das
+rotas usa RATE_LIMIT_REQUESTS.
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+GRUPO_PADRAO = ""
+
+
+class _Balde:
+    __slots__ = ("tokens", "atualizado")
+
+    def __init__(self, tokens: float, atualizado: float):
+        self.tokens = tokens
+        self.atualizado = atualizado
+
+
+def parse_limites_rotas(spec: str) -> List[Tuple[str, int]]:
+    """'prefixo=N,prefixo=N' -> [(prefixo, N)]; entradas inválidas são ignoradas."""
+    limites = []
+    for item in (spec or "").split(","):
+        prefixo, _, valor = item.strip().partition("=")
+        prefixo = prefixo.strip()
+        try:
+            requisicoes = int(valor)
+        except ValueError:
+            if item.strip():
+                logger.warning(f"Invalid rate limit route entry ignored: {item.strip()}")
+            continue
+        if prefixo.startswith("/") and requisicoes > 0:
+            limites.append((prefixo, requisicoes))
+    return limites
+
+
+class LimitesPorRota:
+    """Capacidade e taxa de reposição de cada grupo de rota."""
+
+    def __init__(self, requisicoes: int, janela: int, limites_rotas: Optional[List[Tuple[str, int]]] = None):
+        self.janela = janela
+        # grupo -> (capacidade, tokens por segundo)
+        self.grupos: Dict[str, Tuple[float, float]] = {
+            GRUPO_PADRAO: (float(requisicoes), requisicoes / janela)
+        }
+        # Prefixo mais longo primeiro
+        self._prefixos: List[str] = []
+        for prefixo, limite in sorted(limites_rotas or (), key=lambda x: len(x[0]), reverse=True):
+            self.grupos[prefixo] = (float(limite), limite / janela)
+            self._prefixos.append(prefixo)
+
+    def grupo(self, path: str) -> str:
+        for prefixo in self._prefixos:
+            if path.startswith(prefixo):
+                return prefixo
+        return GRUPO_PADRAO
+
+    def route_limits(self) -> Dict[str, int]:
+        return {grupo or "default": int(capacidade) for grupo, (capacidade, _) in self.grupos.items()}
+
+
+class TokenBucketLimiter(LimitesPorRota):
+    """Token bucket por (IP, grupo de rota) em uma tabela LRU de tamanho fixo (por processo)."""
+
+    def __init__(
+        self,
+        requisicoes: int,
+        janela: int,
+        limites_rotas: Optional[List[Tuple[str, int]]] = None,
+        max_entradas: int = 100_000,
+    ):
+        super().__init__(requisicoes, janela, limites_rotas)
+        self.max_entradas = max_entradas
+        self._baldes: "OrderedDict[Tuple[str, str], _Balde]" = OrderedDict()
+        # IP -> instante do bloqueio
+        self._bloqueios: Dict[str, float] = {}
+        self.descartados = 0
+
+    def __len__(self) -> int:
+        return len(self._baldes)
+
+    def permitir(self, ip: str, path: str = "", agora: Optional[float] = None) -> bool:
+        """Consome um token do balde do cliente; False se estiver vazio."""
+        if agora is None:
+            agora = time.time()
+        grupo = self.grupo(path)
+        capacidade, taxa = self.grupos[grupo]
+        chave = (ip, grupo)
+
+        balde = self._baldes.get(chave)
+        if balde is None:
+            balde = _Balde(capacidade, agora)
+            self._baldes[chave] = balde
+            if len(self._baldes) > self.max_entradas:
+                self._baldes.popitem(last=False)
+                self.descartados += 1
+        else:
+            self._baldes.move_to_end(chave)
+            balde.tokens = min(capacidade, balde.tokens + (agora - balde.atualizado) * taxa)
+            balde.atualizado = agora
+
+        if balde.tokens < 1.0:
+            return False
+        balde.tokens -= 1.0
+        return True
+
+    def resetar(self, ip: str):
+        """Remove os baldes do cliente (voltam cheios na próxima requisição)."""
+        for grupo in self.grupos:
+            self._baldes.pop((ip, grupo), None)
+
+    def bloquear(self, ip: str, agora: float):
+        self._bloqueios[ip] = agora
+
+    def bloqueado_em(self, ip: str) -> Optional[float]:
+        """Instante do bloqueio do cliente (None se não estiver bloqueado)."""
+        return self._bloqueios.get(ip)
+
+    def desbloquear(self, ip: str):
+        self._bloqueios.pop(ip, None)
+
+    def contar_bloqueios(self, agora: float, duracao: float) -> Tuple[int, int]:
+        """(bloqueios ativos, bloqueios registrados)."""
+        # Chamado pelo /metrics no threadpool enquanto o event loop altera o dicionário:
+        # list() copia os valores de uma vez, sem liberar a GIL no meio
+        ativos = sum(1 for instante in list(self._bloqueios.values()) if agora - instante < duracao)
+        return ativos, len(self._bloqueios)
+
+    def limpar(self, agora: Optional[float] = None, duracao_bloqueio: float = 0) -> int:
+        """Descarta bloqueios expirados e baldes ociosos há mais de uma janela (já estariam cheios)."""
+        if agora is None:
+            agora = time.time()
+        expirados = [ip for ip, instante in self._bloqueios.items() if agora - instante > duracao_bloqueio]
+        for ip in expirados:
+            del self._bloqueios[ip]
+
+        limite = agora - self.janela
+        removidos = 0
+        # Ordem LRU: os mais antigos vêm primeiro
+        while self._baldes:
+            chave, balde = next(iter(self._baldes.items()))
+            if balde.atualizado > limite:
+                break
+            del self._baldes[chave]
+            removidos += 1
+        return removidos
+
+    def get_stats(self) -> Dict:
+        return {
+            "backend": "memory",
+            "buckets": len(self._baldes),
+            "max_buckets": self.max_entradas,
+            "evicted": self.descartados,
+            "route_limits": self.route_limits(),
+        }
+
+
+def criar_rate_limiter(
+    requisicoes: int,
+    janela: int,
+    limites_rotas: Optional[List[Tuple[str, int]]] = None,
+    max_entradas: int = 100_000,
+    backend: str = "memory",
+    caminho_compartilhado: str = "",
+    duracao_bloqueio: int = 300,
+):
+    """
+    Cria o limiter: "memory" (por processo) ou "shared" (tabela em memória
+    compartilhada entre os workers). Sem suporte a mmap/flock, cai no "memory".
+    """
+    if backend == "shared":
+        try:
+            from app.middleware.shared_limiter import SharedTokenBucketLimiter
+            return SharedTokenBucketLimiter(
+                requisicoes, janela, limites_rotas, max_entradas,
+                caminho=caminho_compartilhado, duracao_bloqueio=duracao_bloqueio,
+            )
+        except (ImportError, OSError) as e:
+            logger.warning(f"Shared rate limiter unavailable ({e}); using per-process limiter")
+    return TokenBucketLimiter(requisicoes, janela, limites_rotas, max_entradas)
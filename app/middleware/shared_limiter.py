@@ -0,0 +1,228 @@
+"""
+Rate limiting compartilhado entre workers do uvicorn, sem serviço externo.
+
+Com WORKERS>1 cada processo tinha seus próprios baldes e bloqueios: o limite
+efetivo virava RATE_LIMIT_REQUESTS × workers e um bloqueio valia só no worker
+que o aplicou. Aqui o estado fica em uma tabela hash de tamanho fixo em um
+arquivo mapeado em memória (em /dev/shm quando disponível), aberta por todos os
+workers. Cada acesso é uma sondagem linear curta sob `flock`, sem alocação.
+
+Registro (32 bytes): chave (hash de 64 bits de "ip|grupo"), tokens, instante
+da última atualização, instante do bloqueio. Um registro ocioso há mais de uma
+janela e sem bloqueio ativo pode ser reaproveitado; se a sondagem não encontrar
+espaço, o registro menos recente é sobrescrito.
+
+O formato e o número de slots fazem parte do nome do arquivo: workers com outra
+configuração (ex.: durante um deploy gradual que muda RATE_LIMIT_MAX_CLIENTS)
+abrem outra tabela, e um arquivo já mapeado nunca é truncado.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.middleware.rate_limit import LimitesPorRota, logger
+
+MAGIC = b"MGRL0001"
+_CABECALHO = struct.Struct("<8sQQ")  # magic, slots, duração máxima de bloqueio (s)
+_REGISTRO = struct.Struct("<Qddd")   # chave, tokens, atualizado, bloqueado_em
+TAMANHO_CABECALHO = 64
+SONDAGEM = 8
+# Grupo reservado para os bloqueios (um registro por IP)
+GRUPO_BLOQUEIO = "\x00bloqueio"
+
+
+def caminho_padrao() -> str:
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "multasgo-ratelimit.bin")
+
+
+def caminho_tabela(caminho: str, slots: int) -> str:
+    """Arquivo da tabela com `slots` registros: "<base>-<formato>-<slots><ext>"."""
+    raiz, extensao = os.path.splitext(caminho)
+    return f"{raiz}-{MAGIC[-4:].decode()}-{slots}{extensao}"
+
+
+def _hash(ip: str, grupo: str) -> int:
+    # hash() do Python é aleatório por processo; blake2b é estável entre workers
+    valor = int.from_bytes(
+        hashlib.blake2b(f"{ip}|{grupo}".encode("utf-8"), digest_size=8).digest(), "little"
+    )
+    return valor or 1  # 0 marca slot vazio
+
+
+class SharedTokenBucketLimiter(LimitesPorRota):
+    """Mesma interface do TokenBucketLimiter, com estado compartilhado entre processos."""
+
+    def __init__(
+        self,
+        requisicoes: int,
+        janela: int,
+        limites_rotas: Optional[List[Tuple[str, int]]] = None,
+        max_entradas: int = 100_000,
+        caminho: str = "",
+        duracao_bloqueio: int = 3600,
+    ):
+        super().__init__(requisicoes, janela, limites_rotas)
+        slots = 1
+        while slots < max_entradas:
+            slots <<= 1
+        self.slots = slots
+        self._mascara = slots - 1
+        self.max_entradas = slots
+        # Um registro bloqueado só é reaproveitado depois disso
+        self.duracao_bloqueio = duracao_bloqueio
+        self.caminho = caminho_tabela(caminho or caminho_padrao(), slots)
+        self.descartados = 0
+
+        tamanho = TAMANHO_CABECALHO + slots * _REGISTRO.size
+        self._fd = os.open(self.caminho, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                cabecalho = os.pread(self._fd, _CABECALHO.size, 0)
+                valido = (
+                    os.fstat(self._fd).st_size == tamanho
+                    and len(cabecalho) == _CABECALHO.size
+                    and _CABECALHO.unpack(cabecalho)[:2] == (MAGIC, slots)
+                )
+                if not valido:
+                    # Primeiro worker: arquivo novo (ou incompleto). Só um arquivo válido
+                    # é mapeado, e o nome fixa formato e tamanho: ninguém o tem mapeado
+                    os.ftruncate(self._fd, 0)
+                    os.ftruncate(self._fd, tamanho)
+                    os.pwrite(self._fd, _CABECALHO.pack(MAGIC, slots, duracao_bloqueio), 0)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._mm = mmap.mmap(self._fd, tamanho)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+        logger.info(f"Shared rate limiter at {self.caminho} ({slots} slots)")
+
+    def __len__(self) -> int:
+        agora = time.time()
+        return sum(
+            1 for chave, _, atualizado, bloqueado_em in _REGISTRO.iter_unpack(self._mm[TAMANHO_CABECALHO:])
+            if chave and not bloqueado_em and agora - atualizado <= self.janela
+        )
+
+    def _offset(self, slot: int) -> int:
+        return TAMANHO_CABECALHO + slot * _REGISTRO.size
+
+    def _localizar(self, chave: int, agora: float) -> Tuple[int, bool]:
+        """(offset, existe): registro da chave, ou o melhor slot livre para ela. Chamar com lock."""
+        mm = self._mm
+        inicio = chave & self._mascara
+        livre = -1
+        mais_antigo = -1
+        menor_instante = float("inf")
+        for i in range(SONDAGEM):
+            offset = self._offset((inicio + i) & self._mascara)
+            atual, _, atualizado, bloqueado_em = _REGISTRO.unpack_from(mm, offset)
+            if atual == chave:
+                return offset, True
+            if livre < 0 and (
+                atual == 0
+                or (agora - atualizado > self.janela and agora - bloqueado_em > self.duracao_bloqueio)
+            ):
+                livre = offset
+            instante = max(atualizado, bloqueado_em)
+            if instante < menor_instante:
+                menor_instante = instante
+                mais_antigo = offset
+        if livre < 0:
+            self.descartados += 1
+            livre = mais_antigo
+        return livre, False
+
+    def permitir(self, ip: str, path: str = "", agora: Optional[float] = None) -> bool:
+        """Consome um token do balde do cliente; False se estiver vazio."""
+        if agora is None:
+            agora = time.time()
+        grupo = self.grupo(path)
+        capacidade, taxa = self.grupos[grupo]
+        chave = _hash(ip, grupo)
+
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            offset, existe = self._localizar(chave, agora)
+            if existe:
+                _, tokens, atualizado, bloqueado_em = _REGISTRO.unpack_from(self._mm, offset)
+                tokens = min(capacidade, tokens + (agora - atualizado) * taxa)
+            else:
+                tokens, bloqueado_em = capacidade, 0.0
+            permitido = tokens >= 1.0
+            if permitido:
+                tokens -= 1.0
+            _REGISTRO.pack_into(self._mm, offset, chave, tokens, agora, bloqueado_em)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return permitido
+
+    def _zerar(self, chave: int):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            offset, existe = self._localizar(chave, time.time())
+            if existe:
+                _REGISTRO.pack_into(self._mm, offset, 0, 0.0, 0.0, 0.0)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def resetar(self, ip: str):
+        """Remove os baldes do cliente (voltam cheios na próxima requisição)."""
+        for grupo in self.grupos:
+            self._zerar(_hash(ip, grupo))
+
+    def bloquear(self, ip: str, agora: float):
+        chave = _hash(ip, GRUPO_BLOQUEIO)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            offset, _ = self._localizar(chave, agora)
+            _REGISTRO.pack_into(self._mm, offset, chave, 0.0, agora, agora)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def bloqueado_em(self, ip: str) -> Optional[float]:
+        """Instante do bloqueio do cliente (None se não estiver bloqueado)."""
+        chave = _hash(ip, GRUPO_BLOQUEIO)
+        mm = self._mm
+        inicio = chave & self._mascara
+        # Leitura sem lock: um registro de 32 bytes e no pior caso um bloqueio visto com atraso
+        for i in range(SONDAGEM):
+            atual, _, _, bloqueado_em = _REGISTRO.unpack_from(mm, self._offset((inicio + i) & self._mascara))
+            if atual == chave:
+                return bloqueado_em
+        return None
+
+    def desbloquear(self, ip: str):
+        self._zerar(_hash(ip, GRUPO_BLOQUEIO))
+
+    def contar_bloqueios(self, agora: float, duracao: float) -> Tuple[int, int]:
+        """(bloqueios ativos, bloqueios registrados), somando todos os workers."""
+        ativos = registrados = 0
+        for chave, _, _, bloqueado_em in _REGISTRO.iter_unpack(self._mm[TAMANHO_CABECALHO:]):
+            if chave and bloqueado_em:
+                registrados += 1
+                if agora - bloqueado_em < duracao:
+                    ativos += 1
+        return ativos, registrados
+
+    def limpar(self, agora: Optional[float] = None, duracao_bloqueio: float = 0) -> int:
+        """Nada a fazer: registros vencidos são reaproveitados na própria sondagem."""
+        return 0
+
+    def get_stats(self) -> Dict:
+        return {
+            "backend": "shared",
+            "path": self.caminho,
+            "buckets": len(self),
+            "max_buckets": self.slots,
+            "evicted": self.descartados,
+            "route_limits": self.route_limits(),
+        }
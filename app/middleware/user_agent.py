@@ -0,0 +1,189 @@
+"""
+Classificação do User-Agent compartilhada por todos os estágios do pipeline.
+
+O tráfego real tem poucos User-Agents distintos, então a classificação é
+memorizada em uma LRU limitada, com o valor bruto do header como chave. As
+listas de padrões são unidas em um único conjunto de termos, compilado em uma
+expressão regular (alternância em forma de trie, dentro de um lookahead para
+achar termos sobrepostos) e procurado em uma passada no UA; do conjunto
+encontrado saem as flags usadas por cada estágio e um veredito único.
+"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable
+
+from app.core.config import settings
+
+# App mobile oficial (User-Agent: "MultasGO-App/x.y")
+APP_OFICIAL = "multasgo-app"
+
+# Navegadores e buscadores conhecidos (whitelist da segurança geográfica)
+PADROES_NAVEGADOR = (
+    'mozilla', 'chrome', 'safari', 'firefox', 'edge', 'opera',
+    'googlebot', 'bingbot', 'yandex', 'duckduckbot'
+)
+
+# User agents suspeitos para a proteção anti-bot
+PADROES_SUSPEITOS = (
+    'sqlmap', 'nikto', 'nmap', 'masscan', 'zap', 'burp',
+    'scanner', 'crawler', 'spider', 'bot', 'curl', 'wget',
+    'python-requests', 'python-urllib', 'php', 'perl'
+)
+
+# User agents que marcam anomalia no monitoramento
+PADROES_SUSPEITOS_MONITORAMENTO = (
+    'curl', 'wget', 'python-requests', 'scanner', 'sqlmap', 'nikto', 'scrapy'
+)
+
+# Padrões de alto risco na análise geográfica (googlebot é exceção)
+PADROES_ALTO_RISCO = ('scrapy', 'bot', 'crawler', 'spider', 'wget', 'curl/')
+
+# Ferramentas de ataque e varredura conhecidas
+PADROES_FERRAMENTAS_ATAQUE = (
+    'scanner', 'exploit', 'hack', 'attack', 'masscan', 'nmap',
+    'sqlmap', 'zap', 'burp', 'nikto', 'acunetix', 'w3af', 'skipfish',
+    'openvas', 'nessus', 'metasploit', 'havij', 'pangolin',
+    'webinspect', 'appscan', 'brutus', 'hydra', 'medusa',
+    'john', 'aircrack', 'wireshark', 'ettercap', 'cain',
+    'kismet', 'fierce', 'dnsrecon', 'whatweb', 'wpscan',
+    'joomscan', 'droopescan', 'cmseek', 'shodan', 'censys'
+)
+
+# Clientes automatizados e bots em geral (inclui buscadores)
+PADROES_AUTOMACAO = (
+    'python-requests', 'python-urllib', 'python/3', 'go-http-client',
+    'java/', 'curl', 'wget', 'scrapy', 'bot', 'crawler', 'spider', 'php', 'perl'
+)
+
+# Lista usada pela segurança geográfica
+PADROES_MALICIOSOS = frozenset({
+    'python-requests', 'python-urllib3', 'python/3', 'go-http-client',
+    'java/', 'curl/', 'wget/', 'scrapy/', 'bot', 'crawler', 'spider',
+}) | frozenset(PADROES_FERRAMENTAS_ATAQUE) - {'zap'}
+
+# Vereditos
+VEREDITO_VAZIO = "vazio"
+VEREDITO_APP = "app_oficial"
+VEREDITO_SCANNER = "scanner"
+VEREDITO_BOT = "bot"
+VEREDITO_NAVEGADOR = "navegador"
+VEREDITO_DESCONHECIDO = "desconhecido"
+
+# UAs maiores que isso são classificados sem entrar na LRU
+TAMANHO_MAXIMO_CACHE = 512
+
+
+@dataclass(frozen=True)
+class PerfilUserAgent:
+    """Resultado da classificação de um User-Agent."""
+    vazio: bool
+    curto: bool
+    app_oficial: bool
+    navegador: bool
+    suspeito: bool
+    suspeito_monitoramento: bool
+    alto_risco: str = ""
+    veredito: str = VEREDITO_DESCONHECIDO
+
+
+# Termos sem repetição: cada um é procurado uma única vez, qualquer que seja a lista
+_TERMOS = tuple(frozenset(
+    (APP_OFICIAL,) + PADROES_NAVEGADOR + PADROES_SUSPEITOS + PADROES_SUSPEITOS_MONITORAMENTO
+    + PADROES_ALTO_RISCO + PADROES_FERRAMENTAS_ATAQUE + PADROES_AUTOMACAO
+))
+
+_NAVEGADOR = frozenset(PADROES_NAVEGADOR)
+_SUSPEITOS = frozenset(PADROES_SUSPEITOS)
+_SUSPEITOS_MONITORAMENTO = frozenset(PADROES_SUSPEITOS_MONITORAMENTO)
+_FERRAMENTAS_ATAQUE = frozenset(PADROES_FERRAMENTAS_ATAQUE)
+_AUTOMACAO = frozenset(PADROES_AUTOMACAO)
+
+
+def _alternancia_trie(termos: Iterable[str]) -> str:
+    """
+    Alternância com prefixos comuns fatorados ("python-(?:requests|urllib)"):
+    em cada posição o motor só segue os ramos cujo caractere confere, em vez de
+    testar os ~60 termos um a um.
+    """
+    raiz: dict = {}
+    for termo in termos:
+        no = raiz
+        for caractere in termo:
+            no = no.setdefault(caractere, {})
+        no[""] = {}
+
+    def gerar(no: dict) -> str:
+        ramos = [re.escape(c) + gerar(filho) for c, filho in sorted(no.items()) if c]
+        if not ramos:
+            return ""
+        corpo = ramos[0] if len(ramos) == 1 else "(?:" + "|".join(ramos) + ")"
+        if "" in no:
+            return "(?:" + corpo + ")?"
+        return corpo
+
+    return gerar(raiz)
+
+
+_REGEX_TERMOS = re.compile("(?=(" + _alternancia_trie(_TERMOS) + "))")
+
+# O match em uma posição é o termo mais longo; os que são prefixo dele começam ali também
+_PREFIXOS: Dict[str, FrozenSet[str]] = {
+    termo: frozenset(t for t in _TERMOS if termo.startswith(t)) for termo in _TERMOS
+}
+
+
+def _termos_encontrados(user_agent: str) -> FrozenSet[str]:
+    encontrados = set()
+    for m in _REGEX_TERMOS.finditer(user_agent):
+        encontrados |= _PREFIXOS[m.group(1)]
+    return frozenset(encontrados)
+
+
+def _classificar(user_agent: str) -> PerfilUserAgent:
+    ua = user_agent.lower()
+    termos = _termos_encontrados(ua)
+
+    alto_risco = ""
+    if "googlebot" not in termos:
+        alto_risco = next((p for p in PADROES_ALTO_RISCO if p in termos), "")
+
+    app_oficial = APP_OFICIAL in termos
+    navegador = not _NAVEGADOR.isdisjoint(termos)
+    if not ua:
+        veredito = VEREDITO_VAZIO
+    elif app_oficial:
+        veredito = VEREDITO_APP
+    elif not _FERRAMENTAS_ATAQUE.isdisjoint(termos):
+        veredito = VEREDITO_SCANNER
+    elif not _AUTOMACAO.isdisjoint(termos):
+        veredito = VEREDITO_BOT
+    elif navegador:
+        veredito = VEREDITO_NAVEGADOR
+    else:
+        veredito = VEREDITO_DESCONHECIDO
+
+    return PerfilUserAgent(
+        vazio=not ua,
+        curto=len(ua) < 10,
+        app_oficial=app_oficial,
+        navegador=navegador,
+        suspeito=not _SUSPEITOS.isdisjoint(termos),
+        suspeito_monitoramento=not _SUSPEITOS_MONITORAMENTO.isdisjoint(termos),
+        alto_risco=alto_risco,
+        veredito=veredito,
+    )
+
+
+_classificar_em_cache = lru_cache(maxsize=settings.UA_CACHE_SIZE)(_classificar)
+
+
+def classificar_user_agent(user_agent: str) -> PerfilUserAgent:
+    """Classifica o valor bruto do header User-Agent (memorizado em LRU)."""
+    if len(user_agent) > TAMANHO_MAXIMO_CACHE:
+        return _classificar(user_agent)
+    return _classificar_em_cache(user_agent)
+
+
+def estatisticas_cache() -> dict:
+    return _classificar_em_cache.cache_info()._asdict()
@@ -69,4 +69,33 @@ class InfracaoPesquisaParams(BaseModel):
     """Schema para parâmetros de pesquisa"""
     query: str = Field(..., description="Termo de pesquisa (código ou descrição)")
     limit: Optional[int] = Field(10, description="Número máximo de resultados")
-    skip: Optional[int] = Field(0, description="Número de resultados para pular")
\ No newline at end of file
+    skip: Optional[int] = Field(0, description="Número de resultados para pular")
+
+class InfracaoLoteRequest(BaseModel):
+    """Schema para consulta em lote de infrações por código"""
+    codigos: List[str] = Field(..., min_length=1, max_length=5000, description="Códigos das infrações (com ou sem hífen)")
+    agregar: bool = Field(False, description="Se verdadeiro, soma valores e pontos das infrações encontradas")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "codigos": ["5169-1", "60501", "74550"],
+                "agregar": True
+            }
+        }
+
+class InfracaoLoteAgregado(BaseModel):
+    """Totais de uma consulta em lote (cada ocorrência de código conta uma vez)"""
+    quantidade: int = Field(0, description="Número de infrações encontradas, incluindo repetições")
+    total_valor_multa: float = Field(0.0, description="Soma dos valores das multas em reais")
+    total_pontos: int = Field(0, description="Soma dos pontos na CNH")
+    gravissimas: int = Field(0, description="Número de infrações gravíssimas")
+    limite_pontos_suspensao: int = Field(..., description="Limite de pontos para suspensão da CNH (art. 261 do CTB)")
+    atinge_limite_suspensao: bool = Field(False, description="Se o total de pontos atinge o limite de suspensão")
+
+class InfracaoLoteResponse(BaseModel):
+    """Schema para resposta da consulta em lote"""
+    resultados: List[InfracaoSchema] = Field(default_factory=list, description="Infrações encontradas (sem repetição, na ordem do pedido)")
+    nao_encontrados: List[str] = Field(default_factory=list, description="Códigos inválidos ou inexistentes, como enviados")
+    total: int = Field(0, description="Total de infrações distintas encontradas")
+    agregado: Optional[InfracaoLoteAgregado] = Field(None, description="Totais, quando solicitado")
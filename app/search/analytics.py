@@ -80,6 +80,12 @@ def obter_estatisticas() -> QueryStats:
         )
 
 
+def obter_contadores() -> Dict[str, int]:
+    """Totais de queries sem lock (leitura de inteiros, para exportação de métricas)."""
+    total, com_resultado = _total, _com_resultado
+    return {"total": total, "com_resultado": com_resultado, "sem_resultado": total - com_resultado}
+
+
 def obter_queries_populares(limite: int = 20) -> List[Dict]:
     """Retorna queries mais populares."""
     with _lock:
@@ -9,13 +9,16 @@ from typing import Dict, List, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
+from app.core.cache_manager import cache_manager
 from app.core.logger import logger
-from app.search.in_memory import get_index, invalidate_index
+from app.core.tamanho import medir_bytes
+from app.search.in_memory import get_built_index, get_index, invalidate_index, register_reload_hook
 from app.search.normalizer import normalizar, normalizar_para_busca
 from app.search.validators import validar_query
 from app.search.spell import corretor
 from app.search.dictionaries.terms import SINONIMOS, BUSCAS_ESPECIAIS
 from app.search import analytics
+from app.search.timing import etapa, registrar_resultados
 
 # Imports opcionais (fallback)
 try:
@@ -265,6 +268,7 @@ def _count_codigos_infracao(db: Session, codigos: List[str]) -> int:
 def _extrair_palavras_banco(db: Session) -> List[str]:
     """Extrai palavras únicas do banco para fuzzy search."""
     if not hasattr(_extrair_palavras_banco, "_cache"):
+        inicio = time.perf_counter()
         result = db.execute(text('SELECT "Infração" as descricao FROM bdbautos'))
         palavras = set()
         for row in result:
@@ -272,6 +276,7 @@ def _extrair_palavras_banco(db: Session) -> List[str]:
                 words = re.findall(r'\b\w{3,}\b', normalizar(row.descricao))
                 palavras.update(words)
         _extrair_palavras_banco._cache = list(palavras)
+        _extrair_palavras_banco._custo_ms = (time.perf_counter() - inicio) * 1000
         logger.info(f"Cache de palavras: {len(_extrair_palavras_banco._cache)} termos")
     return _extrair_palavras_banco._cache
 
@@ -321,6 +326,45 @@ def destacar_resultados(resultados: List[Dict], termos: List[str]) -> List[Dict]
     return resultados
 
 
+def _tamanho_palavras_banco() -> int:
+    palavras = getattr(_extrair_palavras_banco, "_cache", None)
+    if palavras is None:
+        return 0
+    return medir_bytes(palavras)
+
+
+def _liberar_palavras_banco() -> None:
+    """Descarta só a lista de palavras do fuzzy (refeita com uma query na próxima busca fuzzy)."""
+    if hasattr(_extrair_palavras_banco, "_cache"):
+        try:
+            delattr(_extrair_palavras_banco, "_cache")
+        except Exception:
+            pass
+
+
+def _tamanho_indice() -> int:
+    idx = get_built_index()
+    return idx.memory_bytes if idx else 0
+
+
+def _custo_indice_ms() -> float:
+    idx = get_built_index()
+    return idx.build_seconds * 1000 if idx else 0.0
+
+
+# Política de memória do CacheManager: o índice (e o vocabulário do corretor, refeito
+# junto com ele) nunca é descartado por pressão; a lista de palavras do fuzzy pode ser.
+cache_manager.register_subsystem("indice_busca", _tamanho_indice, _custo_indice_ms, pinned=True)
+cache_manager.register_subsystem(
+    "palavras_fuzzy",
+    _tamanho_palavras_banco,
+    lambda: getattr(_extrair_palavras_banco, "_custo_ms", 0.0),
+    release_fn=_liberar_palavras_banco,
+)
+# Escrita feita por outro worker: o índice é refeito lá; a lista do fuzzy sai junto
+register_reload_hook(_liberar_palavras_banco)
+
+
 def limpar_cache_palavras_banco() -> None:
     """Limpa caches internos relacionados ao vocabulário/fuzzy da busca."""
     if hasattr(_extrair_palavras_banco, "_cache"):
@@ -340,9 +384,12 @@ def limpar_cache_palavras_banco() -> None:
 
 # === FUNÇÃO PRINCIPAL ===
 
-def pesquisar(query: str, limit: int = 10, skip: int = 0, db: Session = None) -> Dict[str, Any]:
+def pesquisar(query: str, limit: int = 10, skip: int = 0, db: Session = None,
+              ordenar: str = "relevancia") -> Dict[str, Any]:
     """
     Função principal de busca. Substitui pesquisar_infracoes().
+
+    `ordenar` aceita qualquer chave de `ORDENACOES` (padrão: relevância).
     """
     start_time = time.time()
 
@@ -351,13 +398,17 @@ def pesquisar(query: str, limit: int = 10, skip: int = 0, db: Session = None) ->
         logger.info(f"[BUSCA] Busca por: '{query_original}'")
 
         # Validar query
-        erro = validar_query(query_original)
+        with etapa("validacao"):
+            erro = validar_query(query_original)
         if erro:
             return erro
 
-        idx = get_index(db)
-        docs_page, total, sugestao = idx.search(query_original, limit=limit, skip=skip)
-        resultados = _formatar_docs(docs_page)
+        with etapa("indice"):
+            idx = get_index(db)
+        docs_page, total, sugestao = idx.search(query_original, limit=limit, skip=skip, ordenar=ordenar)
+        with etapa("formatacao"):
+            resultados = _formatar_docs(docs_page)
+        registrar_resultados(total)
         tempo_ms = (time.time() - start_time) * 1000
         analytics.registrar_query(query_original, total, tempo_ms)
 
@@ -377,10 +428,9 @@ def pesquisar(query: str, limit: int = 10, skip: int = 0, db: Session = None) ->
         }
 
     except Exception as e:
+        # Propagado: o endpoint responde 503/500 sem guardar a falha em cache nem enviar ETag
         logger.error(f"[ERRO] Erro na pesquisa: {str(e)}")
-        return {"resultados": [], "total": 0,
-                "mensagem": "Erro interno. Tente novamente em alguns instantes.",
-                "sugestao": None}
+        raise
 
 
 # === FUNÇÕES DE LISTAGEM ===
@@ -10,19 +10,25 @@ in memory and score matches per request.
 
 from __future__ import annotations
 
+import hashlib
 import math
+import os
+import tempfile
 import threading
 import time
-from dataclasses import dataclass
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from app.core.config import settings
 from app.core.logger import logger
+from app.core.tamanho import medir_bytes
 from app.search.dictionaries.terms import BUSCAS_ESPECIAIS, CORRECOES, SINONIMOS
 from app.search.normalizer import normalizar, normalizar_para_busca
 from app.search.spell import corretor
+from app.search.timing import etapa, registrar_expansoes
 
 
 # Minimal stopwords list for Portuguese search. Keep it small and domain-aware.
@@ -77,6 +83,11 @@ def _is_digits(token: str) -> bool:
     return token.isdigit()
 
 
+def _code_key(codigo: str) -> str:
+    # Codes are stored as "51691" but users often type "5169-1".
+    return (codigo or "").replace("-", "").replace(" ", "").strip()
+
+
 def _severity_rank(gravidade_norm: str) -> int:
     g = (gravidade_norm or "").lower()
     if "gravissima" in g:
@@ -90,6 +101,57 @@ def _severity_rank(gravidade_norm: str) -> int:
     return 5
 
 
+# Order used by the explorer page (same as its former ORDER BY CASE "Gravidade").
+_EXPLORADOR_GRAVIDADE_RANK: Dict[str, int] = {
+    "Gravissima3X": 1,
+    "Gravissima2X": 2,
+    "Gravissima": 3,
+    "Grave": 4,
+    "Media": 5,
+    "Leve": 6,
+    "Nao ha": 6,
+}
+
+# Available result orders. "relevancia" is the scored order; every other key
+# maps to a permutation of doc ids precomputed in `build()`.
+ORDENACOES: Tuple[str, ...] = (
+    "relevancia",
+    "gravidade",
+    "valor_desc",
+    "valor_asc",
+    "pontos_desc",
+    "pontos_asc",
+    "codigo",
+)
+
+
+def _content_version(docs: Sequence["IndexedDoc"]) -> str:
+    h = hashlib.sha1()
+    for d in sorted(docs, key=lambda d: d.codigo):
+        row = (d.codigo, d.descricao, d.responsavel, repr(d.valor_multa), d.orgao_autuador,
+               d.artigos_ctb, str(d.pontos), d.gravidade)
+        h.update("\x1f".join(row).encode("utf-8"))
+        h.update(b"\x1e")
+    return h.hexdigest()[:16]
+
+
+def _build_orders(docs: Sequence["IndexedDoc"]) -> Dict[str, Tuple[int, ...]]:
+    """Precompute one permutation of doc ids per non-relevance order."""
+    ids = range(len(docs))
+
+    def perm(key) -> Tuple[int, ...]:
+        return tuple(sorted(ids, key=key))
+
+    return {
+        "gravidade": perm(lambda i: (_EXPLORADOR_GRAVIDADE_RANK.get(docs[i].gravidade, 7), docs[i].codigo)),
+        "valor_desc": perm(lambda i: (-docs[i].valor_multa, _severity_rank(docs[i].gravidade_norm), docs[i].codigo)),
+        "valor_asc": perm(lambda i: (docs[i].valor_multa, docs[i].codigo)),
+        "pontos_desc": perm(lambda i: (-docs[i].pontos, _severity_rank(docs[i].gravidade_norm), docs[i].codigo)),
+        "pontos_asc": perm(lambda i: (docs[i].pontos, docs[i].codigo)),
+        "codigo": perm(lambda i: docs[i].codigo),
+    }
+
+
 @dataclass(frozen=True)
 class IndexedDoc:
     codigo: str
@@ -127,159 +189,38 @@ class Lexicon:
     top_phrases: Tuple[Tuple[str, int], ...]
 
 
-class InMemorySearchIndex:
-    def __init__(self) -> None:
-        self._lock = threading.RLock()
-        self._built_at = 0.0
-        self._docs: List[IndexedDoc] = []
-        self._lexicon: Optional[Lexicon] = None
-
-        # Pre-normalize synonym keys for phrase detection / token expansion.
-        self._syn_map = {normalizar(k): v for k, v in SINONIMOS.items()}
-        self._syn_phrase_keys = [k for k in self._syn_map.keys() if " " in k]
-
-    @property
-    def docs(self) -> List[IndexedDoc]:
-        return self._docs
-
-    @property
-    def lexicon(self) -> Lexicon:
-        if self._lexicon is None:
-            # Should never happen after build, but keep defensive.
-            return Lexicon(frozenset(), {}, {}, tuple(), tuple())
-        return self._lexicon
-
-    def invalidate(self) -> None:
-        with self._lock:
-            self._docs = []
-            self._lexicon = None
-            self._built_at = 0.0
-
-    def build(self, db: Session) -> None:
-        with self._lock:
-            t0 = time.time()
-            rows = db.execute(
-                text(
-                    """
-                    SELECT
-                        "Código de Infração" as codigo,
-                        "Infração" as descricao,
-                        "Responsável" as responsavel,
-                        "Valor da multa" as valor_multa,
-                        "Órgão Autuador" as orgao_autuador,
-                        "Artigos do CTB" as artigos_ctb,
-                        "Pontos" as pontos,
-                        "Gravidade" as gravidade
-                    FROM bdbautos
-                    """
-                )
-            ).fetchall()
-
-            docs: List[IndexedDoc] = []
-            df: Dict[str, int] = {}
-            tf: Dict[str, int] = {}
-            phrase_counts: Dict[str, int] = {}
-
-            def add_df(token_set: Iterable[str]) -> None:
-                for tok in token_set:
-                    df[tok] = df.get(tok, 0) + 1
-
-            for r in rows:
-                codigo = str(r.codigo) if r.codigo is not None else ""
-                descricao = str(r.descricao) if r.descricao is not None else ""
-                responsavel = str(r.responsavel) if r.responsavel is not None else ""
-                orgao = str(r.orgao_autuador) if r.orgao_autuador is not None else ""
-                artigos = str(r.artigos_ctb) if r.artigos_ctb is not None else ""
-                gravidade = str(r.gravidade) if r.gravidade is not None else ""
-
-                try:
-                    valor_multa = float(r.valor_multa) if r.valor_multa else 0.0
-                except (TypeError, ValueError):
-                    valor_multa = 0.0
-                try:
-                    pontos = int(float(r.pontos)) if r.pontos else 0
-                except (TypeError, ValueError):
-                    pontos = 0
+_EMPTY_LEXICON = Lexicon(frozenset(), {}, {}, tuple(), tuple())
 
-                codigo_norm = normalizar_para_busca(codigo)
-                desc_norm = normalizar(descricao)
-                resp_norm = normalizar(responsavel)
-                orgao_norm = normalizar(orgao)
-                artigos_norm = normalizar(artigos)
-                grav_norm = normalizar(gravidade)
+# Pre-normalized synonym keys for phrase detection / token expansion.
+_SYN_MAP: Dict[str, List[str]] = {normalizar(k): v for k, v in SINONIMOS.items()}
+_SYN_PHRASE_KEYS: List[str] = [k for k in _SYN_MAP.keys() if " " in k]
 
-                toks_desc = [t for t in _tokenize(desc_norm) if t not in STOPWORDS]
-                toks_orgao = [t for t in _tokenize(orgao_norm) if t not in STOPWORDS]
-                toks_artigos = [t for t in _tokenize(artigos_norm) if t not in STOPWORDS]
-                toks_resp = [t for t in _tokenize(resp_norm) if t not in STOPWORDS]
-                toks_grav = [t for t in _tokenize(grav_norm) if t not in STOPWORDS]
-                toks_code = [t for t in _tokenize(normalizar(codigo)) if t]
-
-                # Term frequencies (for "top terms")
-                for tok in toks_desc + toks_orgao + toks_artigos + toks_resp + toks_grav:
-                    if len(tok) >= 3:
-                        tf[tok] = tf.get(tok, 0) + 1
 
-                # Frequent phrases from description (bigrams/trigrams) to improve ranking.
-                for i in range(len(toks_desc) - 1):
-                    ph = f"{toks_desc[i]} {toks_desc[i + 1]}"
-                    phrase_counts[ph] = phrase_counts.get(ph, 0) + 1
-                for i in range(len(toks_desc) - 2):
-                    ph = f"{toks_desc[i]} {toks_desc[i + 1]} {toks_desc[i + 2]}"
-                    phrase_counts[ph] = phrase_counts.get(ph, 0) + 1
+@dataclass(frozen=True, eq=False)
+class IndexSnapshot:
+    """
+    One immutable build of the index: docs, precomputed orders, code map,
+    version and lexicon always belong to the same rows.
+    """
 
-                set_desc = frozenset(toks_desc)
-                set_orgao = frozenset(toks_orgao)
-                set_artigos = frozenset(toks_artigos)
-                set_resp = frozenset(toks_resp)
-                set_grav = frozenset(toks_grav)
-                set_all = frozenset(set_desc | set_orgao | set_artigos | set_resp | set_grav | frozenset(toks_code))
+    docs: Tuple[IndexedDoc, ...] = ()
+    # Order name -> permutation of doc ids (see `ORDENACOES`)
+    orders: Dict[str, Tuple[int, ...]] = field(default_factory=dict)
+    # Code without hyphen -> doc id
+    by_code: Dict[str, int] = field(default_factory=dict)
+    # Content hash of the indexed rows. Identical data gives the same version in
+    # every worker process, so it can back ETags and cache keys.
+    version: str = ""
+    lexicon: Lexicon = _EMPTY_LEXICON
+    built_at: float = 0.0
+    build_seconds: float = 0.0
+    generation: int = 0
+    memory_bytes: int = 0
 
-                add_df(set_all)
-
-                docs.append(
-                    IndexedDoc(
-                        codigo=codigo,
-                        descricao=descricao,
-                        responsavel=responsavel,
-                        valor_multa=valor_multa,
-                        orgao_autuador=orgao,
-                        artigos_ctb=artigos,
-                        pontos=pontos,
-                        gravidade=gravidade,
-                        codigo_norm=codigo_norm,
-                        descricao_norm=desc_norm,
-                        responsavel_norm=resp_norm,
-                        orgao_norm=orgao_norm,
-                        artigos_norm=artigos_norm,
-                        gravidade_norm=grav_norm,
-                        tokens_descricao=set_desc,
-                        tokens_orgao=set_orgao,
-                        tokens_artigos=set_artigos,
-                        tokens_responsavel=set_resp,
-                        tokens_gravidade=set_grav,
-                        tokens_all=set_all,
-                    )
-                )
-
-            n = max(len(docs), 1)
-            idf = {t: (math.log((n + 1) / (df_t + 1)) + 1.0) for t, df_t in df.items()}
-            vocab = frozenset(df.keys())
-
-            top_terms = tuple(sorted(tf.items(), key=lambda x: x[1], reverse=True)[:200])
-            top_phrases = tuple(sorted(phrase_counts.items(), key=lambda x: x[1], reverse=True)[:200])
-
-            self._docs = docs
-            self._lexicon = Lexicon(vocab=vocab, df=df, idf=idf, top_terms=top_terms, top_phrases=top_phrases)
-            self._built_at = time.time()
-
-            # Update global spell corrector vocabulary with DB terms.
-            try:
-                corretor.atualizar_vocabulario(set(vocab))
-            except Exception:
-                pass
-
-            logger.info(f"[SEARCH] In-memory index built: {len(docs)} docs, {len(vocab)} tokens in {int((time.time()-t0)*1000)}ms")
+    def get_by_code(self, codigo: str) -> Optional[IndexedDoc]:
+        """O(1) lookup by infraction code (with or without hyphen)."""
+        i = self.by_code.get(_code_key(codigo))
+        return self.docs[i] if i is not None else None
 
     def _expand_query(self, query_original: str) -> Tuple[str, List[str], List[str], List[str]]:
         """
@@ -320,13 +261,13 @@ class InMemorySearchIndex:
 
         # Phrase synonyms (e.g., "furar sinal" -> special trigger).
         padded = f" {query_norm_full} "
-        for phrase in self._syn_phrase_keys:
+        for phrase in _SYN_PHRASE_KEYS:
             if f" {phrase} " in padded:
-                expansions.extend(self._syn_map.get(phrase, []))
+                expansions.extend(_SYN_MAP.get(phrase, []))
 
         # Token synonyms
         for tok in corrected:
-            expansions.extend(self._syn_map.get(tok, []))
+            expansions.extend(_SYN_MAP.get(tok, []))
 
         # Normalize expansions and map special triggers to codes.
         out: List[str] = []
@@ -452,15 +393,77 @@ class InMemorySearchIndex:
 
         return score
 
-    def search(self, query_original: str, *, limit: int, skip: int) -> Tuple[List[IndexedDoc], int, Optional[str]]:
-        query_norm_full, tokens, tokens_no_stop, expanded = self._expand_query(query_original)
+    def ordered(self, ids: Iterable[int], ordenar: str) -> List[int]:
+        """
+        Return `ids` in the precomputed `ordenar` order.
+
+        Walks the permutation built at index time and keeps the matched ids,
+        so no per-request sort (and no per-item key lambda) is needed.
+        """
+        perm = self.orders.get(ordenar)
+        if perm is None:
+            raise ValueError(f"Unknown order: {ordenar}")
+        matched = ids if isinstance(ids, (set, frozenset)) else set(ids)
+        if len(matched) == len(perm):
+            return list(perm)
+        return [i for i in perm if i in matched]
+
+    def filter_ids(
+        self,
+        *,
+        gravidade: Optional[str] = None,
+        responsavel: Optional[str] = None,
+        orgao: Optional[str] = None,
+        busca: Optional[str] = None,
+        pontos_min: Optional[int] = None,
+        pontos_max: Optional[int] = None,
+    ) -> Set[int]:
+        """
+        Doc ids matching the explorer filters.
+
+        Text filters are accent/case-insensitive substring matches on the
+        normalized fields (a superset of the old SQL `LIKE '%...%'`).
+        """
+        grav_q = normalizar(gravidade) if gravidade else ""
+        resp_q = normalizar(responsavel) if responsavel else ""
+        orgao_q = normalizar(orgao) if orgao else ""
+        busca_q = normalizar(busca) if busca else ""
+
+        out: Set[int] = set()
+        for i, doc in enumerate(self.docs):
+            if grav_q and grav_q not in doc.gravidade_norm:
+                continue
+            if resp_q and resp_q not in doc.responsavel_norm:
+                continue
+            if orgao_q and orgao_q not in doc.orgao_norm:
+                continue
+            if busca_q and busca_q not in doc.descricao_norm:
+                continue
+            if pontos_min is not None and doc.pontos < pontos_min:
+                continue
+            if pontos_max is not None and doc.pontos > pontos_max:
+                continue
+            out.add(i)
+        return out
+
+    def search(
+        self,
+        query_original: str,
+        *,
+        limit: int,
+        skip: int,
+        ordenar: str = "relevancia",
+    ) -> Tuple[List[IndexedDoc], int, Optional[str]]:
+        with etapa("expansao"):
+            query_norm_full, tokens, tokens_no_stop, expanded = self._expand_query(query_original)
+        registrar_expansoes(expanded)
 
         q_tokens = [t for t in tokens_no_stop if len(t) >= 2]
         q_expanded = [t for t in expanded if len(t) >= 2]
 
         def _score_all(*, allow_expanded_without_match: bool) -> List[Tuple[float, int]]:
             out: List[Tuple[float, int]] = []
-            for i, doc in enumerate(self._docs):
+            for i, doc in enumerate(self.docs):
                 s = self._score_doc(
                     doc,
                     query_norm_full,
@@ -472,61 +475,406 @@ class InMemorySearchIndex:
                     out.append((s, i))
             return out
 
-        # Pass 1: prefer matches on the user's tokens; expansions only help if there's at least 1 match.
-        scored = _score_all(allow_expanded_without_match=False)
+        with etapa("pontuacao"):
+            # Pass 1: prefer matches on the user's tokens; expansions only help if there's at least 1 match.
+            scored = _score_all(allow_expanded_without_match=False)
 
-        # Pass 2 (fallback): if nothing matched, allow expansions (synonyms/corrections) to retrieve results.
-        if not scored:
-            scored = _score_all(allow_expanded_without_match=True)
+            # Pass 2 (fallback): if nothing matched, allow expansions (synonyms/corrections) to retrieve results.
+            if not scored:
+                scored = _score_all(allow_expanded_without_match=True)
 
         # If nothing matched, try per-token typo correction and suggest a better query.
         sugestao: Optional[str] = None
         if not scored and q_tokens:
-            suggestion_tokens: List[str] = []
-            changed = False
-            vocab = self.lexicon.vocab
-            for tok in q_tokens:
-                if _is_digits(tok) or tok in vocab:
-                    suggestion_tokens.append(tok)
-                    continue
-                sug = corretor.sugerir(tok)
-                if sug and sug != tok:
-                    suggestion_tokens.append(normalizar(sug))
-                    changed = True
-                else:
-                    suggestion_tokens.append(tok)
-            if changed:
-                sugestao = " ".join(suggestion_tokens).strip() or None
+            with etapa("sugestao"):
+                suggestion_tokens: List[str] = []
+                changed = False
+                vocab = self.lexicon.vocab
+                for tok in q_tokens:
+                    if _is_digits(tok) or tok in vocab:
+                        suggestion_tokens.append(tok)
+                        continue
+                    sug = corretor.sugerir(tok)
+                    if sug and sug != tok:
+                        suggestion_tokens.append(normalizar(sug))
+                        changed = True
+                    else:
+                        suggestion_tokens.append(tok)
+                if changed:
+                    sugestao = " ".join(suggestion_tokens).strip() or None
+
+        total = len(scored)
+
+        if ordenar != "relevancia":
+            with etapa("ordenacao"):
+                page_ids = self.ordered({i for _, i in scored}, ordenar)[skip : skip + limit]
+            return [self.docs[i] for i in page_ids], total, sugestao
 
         # Sort: score desc, severity, points desc, code.
-        scored.sort(
-            key=lambda x: (
-                -x[0],
-                _severity_rank(self._docs[x[1]].gravidade_norm),
-                -self._docs[x[1]].pontos,
-                self._docs[x[1]].codigo,
+        with etapa("ordenacao"):
+            scored.sort(
+                key=lambda x: (
+                    -x[0],
+                    _severity_rank(self.docs[x[1]].gravidade_norm),
+                    -self.docs[x[1]].pontos,
+                    self.docs[x[1]].codigo,
+                )
             )
-        )
 
-        total = len(scored)
         page = scored[skip : skip + limit]
-        docs_page = [self._docs[i] for _, i in page]
+        docs_page = [self.docs[i] for _, i in page]
         return docs_page, total, sugestao
 
 
+_EMPTY_SNAPSHOT = IndexSnapshot(orders=_build_orders(()))
+
+
+_SELECT_ROWS = text(
+    """
+    SELECT
+        "Código de Infração" as codigo,
+        "Infração" as descricao,
+        "Responsável" as responsavel,
+        "Valor da multa" as valor_multa,
+        "Órgão Autuador" as orgao_autuador,
+        "Artigos do CTB" as artigos_ctb,
+        "Pontos" as pontos,
+        "Gravidade" as gravidade
+    FROM bdbautos
+    """
+)
+
+
+def fetch_rows(db: Session) -> List[Sequence]:
+    """All `bdbautos` rows in the column order expected by `build_from_rows`."""
+    return db.execute(_SELECT_ROWS).fetchall()
+
+
+class InMemorySearchIndex:
+    """
+    Holder of the current `IndexSnapshot`.
+
+    A build creates a whole new snapshot and publishes it with one reference
+    assignment; readers never see a half-built or half-cleared index. Use
+    `snapshot()` once per request when several reads must agree (filter, order,
+    then fetch docs); the delegating methods below each read a single snapshot.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._snapshot = _EMPTY_SNAPSHOT
+        # Incremented on every completed build (exported as a metric)
+        self._generation = 0
+
+    def snapshot(self) -> "IndexSnapshot":
+        return self._snapshot
+
+    @property
+    def docs(self) -> Tuple[IndexedDoc, ...]:
+        return self._snapshot.docs
+
+    @property
+    def version(self) -> str:
+        """Content hash of the indexed rows (see `IndexSnapshot.version`)."""
+        return self._snapshot.version
+
+    @property
+    def generation(self) -> int:
+        """Number of builds completed by this index (survives invalidation)."""
+        return self._generation
+
+    @property
+    def built_at(self) -> float:
+        return self._snapshot.built_at
+
+    @property
+    def build_seconds(self) -> float:
+        """Duration of the last build."""
+        return self._snapshot.build_seconds
+
+    @property
+    def memory_bytes(self) -> int:
+        """Approximate size of the index structures, measured at build time."""
+        return self._snapshot.memory_bytes
+
+    @property
+    def lexicon(self) -> Lexicon:
+        return self._snapshot.lexicon
+
+    def get_by_code(self, codigo: str) -> Optional[IndexedDoc]:
+        return self._snapshot.get_by_code(codigo)
+
+    def ordered(self, ids: Iterable[int], ordenar: str) -> List[int]:
+        return self._snapshot.ordered(ids, ordenar)
+
+    def filter_ids(self, **filtros: Any) -> Set[int]:
+        return self._snapshot.filter_ids(**filtros)
+
+    def search(self, query_original: str, **kwargs: Any) -> Tuple[List[IndexedDoc], int, Optional[str]]:
+        return self._snapshot.search(query_original, **kwargs)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            # Same generation: an empty snapshot is not a build
+            self._snapshot = replace(_EMPTY_SNAPSHOT, generation=self._generation)
+
+    def build(self, db: Session) -> None:
+        self.build_from_rows(fetch_rows(db))
+
+    def build_from_rows(self, rows: Iterable[Sequence]) -> None:
+        """
+        Build the index from rows in `bdbautos` column order:
+        (codigo, descricao, responsavel, valor_multa, orgao_autuador,
+        artigos_ctb, pontos, gravidade). SQLAlchemy rows and plain tuples both work,
+        so the CSV ingestion can rebuild without reading the table back.
+        """
+        with self._lock:
+            t0 = time.time()
+            docs: List[IndexedDoc] = []
+            df: Dict[str, int] = {}
+            tf: Dict[str, int] = {}
+            phrase_counts: Dict[str, int] = {}
+
+            # Responsável/órgão/artigos/gravidade repeat across thousands of rows;
+            # normalize and tokenize each distinct value once per build.
+            field_cache: Dict[str, Tuple[str, List[str], frozenset[str]]] = {}
+
+            def field(value: str) -> Tuple[str, List[str], frozenset[str]]:
+                out = field_cache.get(value)
+                if out is None:
+                    norm = normalizar(value)
+                    toks = [t for t in _tokenize(norm) if t not in STOPWORDS]
+                    out = field_cache[value] = (norm, toks, frozenset(toks))
+                return out
+
+            def add_df(token_set: Iterable[str]) -> None:
+                for tok in token_set:
+                    df[tok] = df.get(tok, 0) + 1
+
+            for r_codigo, r_descricao, r_responsavel, r_valor, r_orgao, r_artigos, r_pontos, r_gravidade in rows:
+                codigo = str(r_codigo) if r_codigo is not None else ""
+                descricao = str(r_descricao) if r_descricao is not None else ""
+                responsavel = str(r_responsavel) if r_responsavel is not None else ""
+                orgao = str(r_orgao) if r_orgao is not None else ""
+                artigos = str(r_artigos) if r_artigos is not None else ""
+                gravidade = str(r_gravidade) if r_gravidade is not None else ""
+
+                try:
+                    valor_multa = float(r_valor) if r_valor else 0.0
+                except (TypeError, ValueError):
+                    valor_multa = 0.0
+                try:
+                    pontos = int(float(r_pontos)) if r_pontos else 0
+                except (TypeError, ValueError):
+                    pontos = 0
+
+                codigo_norm = normalizar_para_busca(codigo)
+                desc_norm = normalizar(descricao)
+                resp_norm, toks_resp, set_resp = field(responsavel)
+                orgao_norm, toks_orgao, set_orgao = field(orgao)
+                artigos_norm, toks_artigos, set_artigos = field(artigos)
+                grav_norm, toks_grav, set_grav = field(gravidade)
+
+                toks_desc = [t for t in _tokenize(desc_norm) if t not in STOPWORDS]
+                toks_code = [t for t in _tokenize(normalizar(codigo)) if t]
+
+                # Term frequencies (for "top terms")
+                for tok in toks_desc + toks_orgao + toks_artigos + toks_resp + toks_grav:
+                    if len(tok) >= 3:
+                        tf[tok] = tf.get(tok, 0) + 1
+
+                # Frequent phrases from description (bigrams/trigrams) to improve ranking.
+                for i in range(len(toks_desc) - 1):
+                    ph = f"{toks_desc[i]} {toks_desc[i + 1]}"
+                    phrase_counts[ph] = phrase_counts.get(ph, 0) + 1
+                for i in range(len(toks_desc) - 2):
+                    ph = f"{toks_desc[i]} {toks_desc[i + 1]} {toks_desc[i + 2]}"
+                    phrase_counts[ph] = phrase_counts.get(ph, 0) + 1
+
+                set_desc = frozenset(toks_desc)
+                set_all = frozenset(set_desc | set_orgao | set_artigos | set_resp | set_grav | frozenset(toks_code))
+
+                add_df(set_all)
+
+                docs.append(
+                    IndexedDoc(
+                        codigo=codigo,
+                        descricao=descricao,
+                        responsavel=responsavel,
+                        valor_multa=valor_multa,
+                        orgao_autuador=orgao,
+                        artigos_ctb=artigos,
+                        pontos=pontos,
+                        gravidade=gravidade,
+                        codigo_norm=codigo_norm,
+                        descricao_norm=desc_norm,
+                        responsavel_norm=resp_norm,
+                        orgao_norm=orgao_norm,
+                        artigos_norm=artigos_norm,
+                        gravidade_norm=grav_norm,
+                        tokens_descricao=set_desc,
+                        tokens_orgao=set_orgao,
+                        tokens_artigos=set_artigos,
+                        tokens_responsavel=set_resp,
+                        tokens_gravidade=set_grav,
+                        tokens_all=set_all,
+                    )
+                )
+
+            n = max(len(docs), 1)
+            idf = {t: (math.log((n + 1) / (df_t + 1)) + 1.0) for t, df_t in df.items()}
+            vocab = frozenset(df.keys())
+
+            top_terms = tuple(sorted(tf.items(), key=lambda x: x[1], reverse=True)[:200])
+            top_phrases = tuple(sorted(phrase_counts.items(), key=lambda x: x[1], reverse=True)[:200])
+
+            docs_t = tuple(docs)
+            orders = _build_orders(docs_t)
+            by_code = {_code_key(d.codigo): i for i, d in enumerate(docs_t)}
+            lexicon = Lexicon(vocab=vocab, df=df, idf=idf, top_terms=top_terms, top_phrases=top_phrases)
+            built_at = time.time()
+            self._generation += 1
+            # Single reference swap: readers see the old snapshot or this one, never a mix
+            self._snapshot = IndexSnapshot(
+                docs=docs_t,
+                orders=orders,
+                by_code=by_code,
+                version=_content_version(docs_t),
+                lexicon=lexicon,
+                built_at=built_at,
+                build_seconds=built_at - t0,
+                generation=self._generation,
+                # Same sizer as the caches, so the cost-eviction policy compares like with like
+                memory_bytes=medir_bytes((docs_t, lexicon, orders, by_code)),
+            )
+
+            # Update global spell corrector vocabulary with DB terms.
+            try:
+                corretor.atualizar_vocabulario(set(vocab))
+            except Exception:
+                pass
+
+            logger.info(f"[SEARCH] In-memory index built: {len(docs)} docs, {len(vocab)} tokens in {int((time.time()-t0)*1000)}ms")
+
+
+def _marker_path() -> str:
+    if settings.DATASET_MARKER_PATH:
+        return settings.DATASET_MARKER_PATH
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "multasgo-dataset.marker")
+
+
+_MARKER_PATH = _marker_path()
+
+
+def _dataset_marker() -> Optional[Tuple[int, int, int]]:
+    """Identity of the shared marker file (None until the first write)."""
+    try:
+        st = os.stat(_MARKER_PATH)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def mark_dataset_changed() -> None:
+    """
+    Tell every worker process that `bdbautos` changed.
+
+    The marker file is replaced atomically; each worker compares it on
+    `get_index()` / `get_built_index()` and rebuilds from the DB on mismatch,
+    so the index, its version and every cache keyed by it follow the write.
+    """
+    tmp = f"{_MARKER_PATH}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp, _MARKER_PATH)
+    except OSError as e:
+        logger.error(f"[SEARCH] Could not update dataset marker {_MARKER_PATH}: {e}")
+
+
 _INDEX_LOCK = threading.RLock()
 _INDEX: Optional[InMemorySearchIndex] = None
+# Marker seen when the current index was built
+_INDEX_MARKER: Optional[Tuple[int, int, int]] = None
+# Called after a rebuild triggered by another process's write (derived caches)
+_RELOAD_HOOKS: List[Callable[[], None]] = []
 
 
-def get_index(db: Session) -> InMemorySearchIndex:
-    global _INDEX
+def register_reload_hook(fn: Callable[[], None]) -> None:
+    _RELOAD_HOOKS.append(fn)
+
+
+def _run_reload_hooks() -> None:
+    for hook in _RELOAD_HOOKS:
+        try:
+            hook()
+        except Exception as e:
+            logger.debug(f"[SEARCH] Reload hook failed: {e}")
+
+
+def get_index(db: Session) -> IndexSnapshot:
+    """Current index snapshot, built (or rebuilt after a write elsewhere) if needed."""
+    global _INDEX, _INDEX_MARKER
+    # Fast path without the lock: searches only serialize when a (re)build is due
+    snapshot = get_built_index()
+    if snapshot is not None:
+        return snapshot
     with _INDEX_LOCK:
+        # Double-checked: another thread may have rebuilt while we waited
         if _INDEX is None:
             _INDEX = InMemorySearchIndex()
+        marker = _dataset_marker()
+        if not _INDEX.docs or marker != _INDEX_MARKER:
+            stale = bool(_INDEX.docs)
+            # Marker read before the rows: a write during the build triggers another one
             _INDEX.build(db)
-        elif not _INDEX.docs:
-            _INDEX.build(db)
-        return _INDEX
+            _INDEX_MARKER = marker
+            if stale:
+                logger.info("[SEARCH] Dataset changed in another process; index rebuilt")
+                _run_reload_hooks()
+        return _INDEX.snapshot()
+
+
+def get_built_index() -> Optional[IndexSnapshot]:
+    """
+    The current snapshot if already built and current, without touching the DB
+    (None otherwise: callers fall back to `get_index`, which rebuilds).
+    """
+    idx = _INDEX
+    if idx is None:
+        return None
+    snapshot = idx.snapshot()
+    if not snapshot.docs or _dataset_marker() != _INDEX_MARKER:
+        return None
+    return snapshot
+
+
+def get_dataset_version(db: Session) -> str:
+    """Current dataset version (builds the index on first use)."""
+    return get_index(db).version
+
+
+def rebuild_index(rows: Iterable[Sequence]) -> IndexSnapshot:
+    """
+    Replace the global index contents with `rows` after a catalog write
+    (single rebuild, no DB read).
+
+    Under the index lock: marks the dataset changed for the other workers,
+    builds, then clears the derived caches (reload hooks). Requests arriving
+    meanwhile see the marker mismatch, wait on the lock and get the new
+    snapshot instead of rebuilding from the DB.
+    """
+    global _INDEX, _INDEX_MARKER
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            _INDEX = InMemorySearchIndex()
+        mark_dataset_changed()
+        marker = _dataset_marker()
+        _INDEX.build_from_rows(rows)
+        _INDEX_MARKER = marker
+        _run_reload_hooks()
+        return _INDEX.snapshot()
 
 
 def invalidate_index() -> None:
@@ -1,15 +1,30 @@
 """Normalização de texto para busca."""
 import re
+import unicodedata
 from unidecode import unidecode
 
 
+_RE_ESPECIAIS = re.compile(r'[^a-z0-9\s]')
+_RE_ESPACOS = re.compile(r'\s+')
+# Marcas combinantes (acentos) separadas pelo NFKD
+_SEM_ACENTOS = {c: None for c in range(0x0300, 0x0370)}
+
+
+def _remover_acentos(texto: str) -> str:
+    """Remove acentos; NFKD resolve o português em C, unidecode cobre o resto."""
+    if texto.isascii():
+        return texto
+    sem_acento = unicodedata.normalize('NFKD', texto).translate(_SEM_ACENTOS)
+    return sem_acento if sem_acento.isascii() else unidecode(texto)
+
+
 def normalizar(texto: str) -> str:
     """Normalização completa: remove acentos, especiais, colapsa espaços."""
     if not texto:
         return ""
-    texto = unidecode(texto.strip().lower())
-    texto = re.sub(r'[^a-z0-9\s]', ' ', texto)
-    texto = re.sub(r'\s+', ' ', texto)
+    texto = _remover_acentos(texto.strip().lower())
+    texto = _RE_ESPECIAIS.sub(' ', texto)
+    texto = _RE_ESPACOS.sub(' ', texto)
     return texto.strip()
 
 
@@ -17,4 +32,4 @@ def normalizar_para_busca(texto: str) -> str:
     """Normalização leve: remove acentos e lowercase."""
     if not texto:
         return ""
-    return unidecode(texto.strip().lower())
+    return _remover_acentos(texto.strip().lower())
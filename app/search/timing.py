@@ -0,0 +1,206 @@
+"""
+Tempos por etapa das buscas (/pesquisa, /smart e /autocomplete).
+
+O endpoint abre um `TemporizadorBusca` (`medir_busca`) e o deixa visível por
+ContextVar: o motor e o índice marcam suas etapas com `etapa(nome)` sem mudar
+de assinatura, e fora de uma busca medida `etapa()` não faz nada. No fim, os
+tempos viram o header `Server-Timing`, alimentam histogramas por
+(endpoint, etapa) e, acima de SEARCH_SLOW_QUERY_MS, a consulta vai com seu
+detalhamento e suas expansões para um anel de consultas lentas.
+"""
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.core.histograma import HistogramaJanela
+
+MAX_CONSULTA_REGISTRADA = 200
+MAX_EXPANSOES_REGISTRADAS = 50
+
+_atual: ContextVar[Optional["TemporizadorBusca"]] = ContextVar("temporizador_busca", default=None)
+
+_lock = threading.Lock()
+_histogramas: Dict[Tuple[str, str], HistogramaJanela] = {}
+_lentas = deque(maxlen=settings.SEARCH_SLOW_QUERY_BUFFER)
+_total_lentas = 0
+
+
+class _Etapa:
+    __slots__ = ("temporizador", "nome", "inicio")
+
+    def __init__(self, temporizador: "TemporizadorBusca", nome: str):
+        self.temporizador = temporizador
+        self.nome = nome
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.temporizador.adicionar(self.nome, time.perf_counter() - self.inicio)
+        return False
+
+
+class _EtapaNula:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_ETAPA_NULA = _EtapaNula()
+
+
+class TemporizadorBusca:
+    """Tempos (segundos) das etapas de uma requisição de busca, na ordem em que ocorreram."""
+
+    __slots__ = ("endpoint", "consulta", "inicio", "total", "etapas", "expansoes", "resultados", "_token")
+
+    def __init__(self, endpoint: str, consulta: str):
+        self.endpoint = endpoint
+        self.consulta = consulta
+        self.inicio = time.perf_counter()
+        self.total: Optional[float] = None
+        self.etapas: Dict[str, float] = {}
+        self.expansoes: List[str] = []
+        self.resultados: Optional[int] = None
+        self._token = None
+
+    def etapa(self, nome: str) -> _Etapa:
+        return _Etapa(self, nome)
+
+    def adicionar(self, nome: str, segundos: float):
+        # Etapas repetidas (ex.: segunda passada de pontuação) se somam
+        self.etapas[nome] = self.etapas.get(nome, 0.0) + segundos
+
+    def decorrido(self) -> float:
+        return self.total if self.total is not None else time.perf_counter() - self.inicio
+
+    def server_timing(self) -> str:
+        partes = [f"{nome};dur={segundos * 1000:.2f}" for nome, segundos in self.etapas.items()]
+        partes.append(f"total;dur={self.decorrido() * 1000:.2f}")
+        return ", ".join(partes)
+
+    def aplicar(self, resposta: Response) -> Response:
+        """Adiciona o header Server-Timing à resposta (se habilitado) e a devolve."""
+        if settings.SEARCH_SERVER_TIMING:
+            resposta.headers["Server-Timing"] = self.server_timing()
+        return resposta
+
+    def __enter__(self) -> "TemporizadorBusca":
+        self._token = _atual.set(self)
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        self.total = time.perf_counter() - self.inicio
+        _atual.reset(self._token)
+        # Requisições recusadas (validação, erro) não entram nas estatísticas
+        if tipo is None:
+            _registrar(self)
+        return False
+
+
+def medir_busca(endpoint: str, consulta: str) -> TemporizadorBusca:
+    """Temporizador da requisição; usar como `with medir_busca(...) as tempos:`."""
+    return TemporizadorBusca(endpoint, consulta or "")
+
+
+def etapa(nome: str):
+    """Context manager que mede `nome` na busca em andamento (no-op fora de uma)."""
+    temporizador = _atual.get()
+    if temporizador is None:
+        return _ETAPA_NULA
+    return _Etapa(temporizador, nome)
+
+
+def registrar_expansoes(expansoes: List[str]):
+    """Anota as expansões da consulta (correções, sinônimos) na busca em andamento."""
+    temporizador = _atual.get()
+    if temporizador is not None:
+        temporizador.expansoes = list(expansoes[:MAX_EXPANSOES_REGISTRADAS])
+
+
+def registrar_resultados(total: int):
+    temporizador = _atual.get()
+    if temporizador is not None:
+        temporizador.resultados = total
+
+
+def _histograma(endpoint: str, nome: str) -> HistogramaJanela:
+    chave = (endpoint, nome)
+    histograma = _histogramas.get(chave)
+    if histograma is None:
+        histograma = _histogramas[chave] = HistogramaJanela(
+            settings.METRICS_WINDOW_SECONDS, settings.METRICS_WINDOW_SLICES
+        )
+    return histograma
+
+
+def _registrar(temporizador: TemporizadorBusca):
+    global _total_lentas
+    agora = time.time()
+    with _lock:
+        for nome, segundos in temporizador.etapas.items():
+            _histograma(temporizador.endpoint, nome).registrar(segundos, agora)
+        _histograma(temporizador.endpoint, "total").registrar(temporizador.total, agora)
+
+        if temporizador.total * 1000 >= settings.SEARCH_SLOW_QUERY_MS:
+            _total_lentas += 1
+            _lentas.append({
+                "timestamp": agora,
+                "endpoint": temporizador.endpoint,
+                "consulta": temporizador.consulta[:MAX_CONSULTA_REGISTRADA],
+                "total_ms": round(temporizador.total * 1000, 3),
+                "etapas_ms": {nome: round(s * 1000, 3) for nome, s in temporizador.etapas.items()},
+                "expansoes": temporizador.expansoes,
+                "resultados": temporizador.resultados,
+            })
+
+
+def histogramas() -> Dict[Tuple[str, str], HistogramaJanela]:
+    """Cópia rasa do mapa (endpoint, etapa) -> histograma, para exportação."""
+    return dict(_histogramas)
+
+
+def resumo_etapas(janela: Optional[float] = None) -> Dict[str, Dict[str, dict]]:
+    """Percentis por endpoint e etapa nos últimos `janela` segundos."""
+    agora = time.time()
+    with _lock:
+        snapshots = {chave: h.snapshot(janela, agora) for chave, h in _histogramas.items()}
+    resumo: Dict[str, Dict[str, dict]] = {}
+    for (endpoint, nome), histograma in sorted(snapshots.items()):
+        if histograma.total:
+            resumo.setdefault(endpoint, {})[nome] = histograma.resumo()
+    return resumo
+
+
+def consultas_lentas(limite: Optional[int] = None) -> dict:
+    """Consultas lentas mais recentes primeiro."""
+    with _lock:
+        consultas = list(_lentas)
+        total = _total_lentas
+    consultas.reverse()
+    if limite is not None:
+        consultas = consultas[:limite]
+    return {
+        "limite_ms": settings.SEARCH_SLOW_QUERY_MS,
+        "capacidade": _lentas.maxlen,
+        "total_registradas": total,
+        "consultas": consultas,
+    }
+
+
+def limpar():
+    global _total_lentas
+    with _lock:
+        _histogramas.clear()
+        _lentas.clear()
+        _total_lentas = 0
@@ -0,0 +1,173 @@
+"""
+Renderização cacheada das páginas HTML (SEO e páginas estáticas).
+
+As páginas de infração são montadas a partir do índice em memória e guardadas
+já renderizadas (bytes) no cache "paginas", com chave pela versão do dataset.
+Em um acerto de cache o handler faz só uma consulta de dicionário no event
+loop; a renderização (e a eventual construção do índice) roda no threadpool.
+"""
+import hashlib
+import re
+import unicodedata
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
+
+from app.core.cache_manager import cache_manager
+from app.core.http_cache import gerar_etag
+from app.db.database import get_db_context
+from app.search.in_memory import IndexedDoc, get_built_index, get_index
+
+PAGINAS_ESTATICAS = {
+    "home": "index.html",
+    "explorador": "explorador.html",
+    "ipva": "ipva.html",
+}
+
+GRAVIDADE_DISPLAY = {
+    "Gravissima": "Gravíssima", "Gravissima2X": "Gravíssima (2x)",
+    "Gravissima3X": "Gravíssima (3x)", "Gravissima4X": "Gravíssima (4x)",
+    "Gravissima5X": "Gravíssima (5x)", "Gravissima10X": "Gravíssima (10x)",
+    "Gravissima20X": "Gravíssima (20x)", "Gravissima60X": "Gravíssima (60x)",
+    "Grave": "Grave", "Media": "Média", "Leve": "Leve",
+    "Leve50%": "Leve (50%)", "Nao ha": "Não se aplica"
+}
+
+
+@dataclass
+class PaginaRenderizada:
+    """HTML pronto para envio."""
+    corpo: bytes
+    etag: str
+    codigo: str = ""
+    slug: str = ""
+
+
+def gerar_slug(texto: str) -> str:
+    """Gera slug SEO-friendly: 'Dirigir veículo sem CNH' -> 'dirigir-veiculo-sem-cnh'."""
+    # Remove acentos
+    t = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    t = t.lower()
+    t = re.sub(r"[^a-z0-9]+", "-", t)  # Só letras, números, hífens
+    return t.strip("-")[:80]  # Max 80 chars
+
+
+def codigo_valido(codigo: str) -> bool:
+    return codigo.isdigit() and 4 <= len(codigo) <= 5
+
+
+def dados_infracao(doc: IndexedDoc) -> Dict[str, Any]:
+    """Contexto do template infracao.html a partir de um documento do índice."""
+    cod_str = doc.codigo
+    codigo_formatado = f"{cod_str[:3]}-{cod_str[3:]}" if len(cod_str) == 5 else cod_str
+    grav = doc.gravidade
+    if "Gravissima" in grav or "gravissima" in grav:
+        gravidade_class = "gravissima"
+    elif grav == "Grave":
+        gravidade_class = "grave"
+    elif grav == "Media":
+        gravidade_class = "media"
+    elif "Leve" in grav:
+        gravidade_class = "leve"
+    else:
+        gravidade_class = "na"
+    pontos_display = "Sem pontuação" if not doc.pontos else str(doc.pontos)
+    valor = doc.valor_multa
+    valor_formatado = f"{valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    desc = doc.descricao
+    descricao_curta = desc[:57] + "..." if len(desc) > 60 else desc
+    return {
+        "codigo": cod_str, "codigo_formatado": codigo_formatado,
+        "descricao": desc, "descricao_curta": descricao_curta,
+        "responsavel": doc.responsavel,
+        "valor_multa": valor, "valor_formatado": valor_formatado,
+        "orgao_autuador": doc.orgao_autuador,
+        "artigos_ctb": doc.artigos_ctb,
+        "pontos_display": pontos_display,
+        "gravidade_display": GRAVIDADE_DISPLAY.get(grav, grav), "gravidade_class": gravidade_class,
+        "slug": gerar_slug(desc),
+    }
+
+
+def renderizar_template(templates: Jinja2Templates, nome: str, contexto: Dict[str, Any]) -> bytes:
+    # Os templates não usam `request`; renderizar fora da requisição permite reaproveitar os bytes
+    return templates.get_template(nome).render(contexto).encode("utf-8")
+
+
+def _chave_infracao(versao: str, codigo: str) -> str:
+    return f"infracao:{versao}:{codigo}"
+
+
+def pagina_infracao_em_cache(codigo: str) -> Optional[PaginaRenderizada]:
+    """Caminho rápido (event loop): só consulta dicionários, nunca banco ou template."""
+    idx = get_built_index()
+    if idx is None:
+        return None
+    return cache_manager.paginas_cache.get(_chave_infracao(idx.version, codigo))
+
+
+def infracao_existe_no_indice(codigo: str) -> Optional[bool]:
+    """True/False se o índice já está construído; None se ainda não há como saber sem o banco."""
+    idx = get_built_index()
+    if idx is None:
+        return None
+    return idx.get_by_code(codigo) is not None
+
+
+def renderizar_pagina_infracao(templates: Jinja2Templates, codigo: str) -> Optional[PaginaRenderizada]:
+    """Renderiza e guarda a página de uma infração (bloqueante: rodar no threadpool)."""
+    idx = get_built_index()
+    if idx is None:
+        with get_db_context() as db:
+            idx = get_index(db)
+
+    doc = idx.get_by_code(codigo)
+    if doc is None:
+        return None
+
+    chave = _chave_infracao(idx.version, doc.codigo)
+    pagina = cache_manager.paginas_cache.get(chave)
+    if pagina is None:
+        inicio = time.perf_counter()
+        dados = dados_infracao(doc)
+        pagina = PaginaRenderizada(
+            corpo=renderizar_template(templates, "infracao.html", dados),
+            etag=gerar_etag(idx.version, "infracao", doc.codigo),
+            codigo=doc.codigo,
+            slug=dados["slug"],
+        )
+        cache_manager.paginas_cache.set(chave, pagina, cost=(time.perf_counter() - inicio) * 1000)
+    return pagina
+
+
+async def obter_pagina_infracao(templates: Jinja2Templates, codigo: str) -> Optional[PaginaRenderizada]:
+    """Página da infração: acerto de cache no loop, renderização no threadpool."""
+    pagina = pagina_infracao_em_cache(codigo)
+    if pagina is not None:
+        return pagina
+    if infracao_existe_no_indice(codigo) is False:
+        return None
+    return await run_in_threadpool(renderizar_pagina_infracao, templates, codigo)
+
+
+def renderizar_pagina_estatica(templates: Jinja2Templates, pagina: str) -> PaginaRenderizada:
+    """Renderiza e guarda uma página estática (bloqueante: rodar no threadpool)."""
+    inicio = time.perf_counter()
+    corpo = renderizar_template(templates, PAGINAS_ESTATICAS[pagina], {})
+    renderizada = PaginaRenderizada(
+        corpo=corpo,
+        etag=gerar_etag(hashlib.sha1(corpo).hexdigest()[:16], pagina),
+    )
+    cache_manager.paginas_cache.set(f"estatica:{pagina}", renderizada, cost=(time.perf_counter() - inicio) * 1000)
+    return renderizada
+
+
+async def obter_pagina_estatica(templates: Jinja2Templates, pagina: str) -> PaginaRenderizada:
+    """Páginas sem dados (/, /explorador, /ipva): renderizadas uma vez e reaproveitadas."""
+    renderizada = cache_manager.paginas_cache.get(f"estatica:{pagina}")
+    if renderizada is not None:
+        return renderizada
+    return await run_in_threadpool(renderizar_pagina_estatica, templates, pagina)
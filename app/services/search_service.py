@@ -10,12 +10,13 @@ from app.search.engine import (
     listar_com_filtros,
     limpar_cache_palavras_banco,
 )
+from app.search.in_memory import mark_dataset_changed, register_reload_hook
 from app.core.cache_manager import cache_manager
 
 
 def pesquisar_infracoes(query: str, limit: int = 10, skip: int = 0,
-                        db: Session = None) -> Dict[str, Any]:
-    return pesquisar(query, limit=limit, skip=skip, db=db)
+                        db: Session = None, ordenar: str = "relevancia") -> Dict[str, Any]:
+    return pesquisar(query, limit=limit, skip=skip, db=db, ordenar=ordenar)
 
 
 def listar_infracoes_paginado(limit: int = 10, skip: int = 0,
@@ -29,12 +30,22 @@ def listar_infracoes_com_filtros(limit: int = 10, skip: int = 0,
     return listar_com_filtros(limit=limit, skip=skip, filtros=filtros, db=db)
 
 
+def _limpar_cache_busca():
+    search_cache = cache_manager.get_cache("search")
+    if search_cache:
+        search_cache.clear()
+
+
+# Resultados em cache não carregam a versão do dataset: saem quando outro worker escreve
+register_reload_hook(_limpar_cache_busca)
+
+
 def limpar_cache_palavras():
-    # Limpa cache interno do motor (vocabulário/fuzzy) e caches globais.
+    # Chamado após toda escrita no catálogo: avisa os demais workers e
+    # limpa o cache interno do motor (vocabulário/fuzzy) e os caches globais.
+    mark_dataset_changed()
     try:
         limpar_cache_palavras_banco()
     except Exception:
         pass
-    search_cache = cache_manager.get_cache("search")
-    if search_cache:
-        search_cache.clear()
+    _limpar_cache_busca()
@@ -0,0 +1 @@
+# Este arquivo é necessário para que o diretório seja reconhecido como um pacote Python 
\ No newline at end of file
@@ -0,0 +1,28 @@
+"""
+Gera os assets versionados em app/static/dist (fingerprint + .gz/.br + manifest.json).
+
+Uso:
+    python -m app.tools.build_assets
+
+Rode a cada deploy, antes de iniciar o app e de `python -m app.tools.export_site`,
+para os templates apontarem para os arquivos com hash.
+"""
+import sys
+from typing import List, Optional
+
+from app.core.assets import STATIC_DIR, construir_assets
+from app.core.compressao import BROTLI_DISPONIVEL
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    manifesto = construir_assets(STATIC_DIR)
+    for original, versionado in sorted(manifesto.items()):
+        print(f"{original} -> dist/{versionado}")
+    print(f"Assets versionados: {len(manifesto)}")
+    if not BROTLI_DISPONIVEL:
+        print("Aviso: pacote 'brotli' não instalado; apenas variantes .gz foram geradas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
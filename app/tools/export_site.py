@@ -0,0 +1,136 @@
+"""
+Exporta o site estático: páginas de infração, páginas principais e sitemap.xml.
+
+Cada infração do índice em memória é renderizada com o mesmo template e os
+mesmos dados usados pelo app (saída idêntica byte a byte), gravada junto com
+as variantes `.gz`/`.br` para o nginx servir com gzip_static/brotli_static.
+
+Estrutura gerada:
+    <saida>/index.html, explorador.html, ipva.html
+    <saida>/infracao/<codigo>/<slug>.html
+    <saida>/sitemap.xml
+
+Uso:
+    python -m app.tools.export_site --saida /var/www/multasgo/site
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+from datetime import date
+from pathlib import Path
+from typing import List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from fastapi.templating import Jinja2Templates
+
+from app.core.assets import configurar_templates
+from app.core.compressao import BROTLI_DISPONIVEL, escrever_variantes
+from app.core.config import settings
+from app.core.logger import logger
+
+TEMPLATES_DIR = Path(__file__).resolve().parents[1] / "templates"
+
+# Página -> (caminho público, arquivo gerado, changefreq, priority)
+PAGINAS_PRINCIPAIS = {
+    "home": ("/", "index.html", "weekly", "1.0"),
+    "explorador": ("/explorador", "explorador.html", "weekly", "0.8"),
+    "ipva": ("/ipva", "ipva.html", "monthly", "0.6"),
+}
+
+
+def gerar_sitemap(base_url: str, urls: List[Tuple[str, str, str]], lastmod: str) -> bytes:
+    """sitemap.xml a partir de (caminho, changefreq, priority)."""
+    linhas = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+    ]
+    for caminho, changefreq, priority in urls:
+        linhas += [
+            "  <url>",
+            f"    <loc>{escape(base_url + caminho)}</loc>",
+            f"    <lastmod>{lastmod}</lastmod>",
+            f"    <changefreq>{changefreq}</changefreq>",
+            f"    <priority>{priority}</priority>",
+            "  </url>",
+        ]
+    linhas.append("</urlset>")
+    return ("\n".join(linhas) + "\n").encode("utf-8")
+
+
+def exportar_site(saida: Path, base_url: str) -> dict:
+    """
+    Gera o site em um diretório temporário e troca pelo atual no final,
+    para o nginx nunca servir uma exportação pela metade.
+    """
+    from app.db.database import get_db_context
+    from app.search.in_memory import get_index
+    from app.services import paginas_service
+
+    inicio = time.time()
+    templates = configurar_templates(Jinja2Templates(directory=str(TEMPLATES_DIR)))
+    temporario = saida.with_name(saida.name + ".tmp")
+    if temporario.exists():
+        shutil.rmtree(temporario)
+
+    urls: List[Tuple[str, str, str]] = []
+    arquivos = 0
+
+    for pagina, (caminho, arquivo, changefreq, priority) in PAGINAS_PRINCIPAIS.items():
+        corpo = paginas_service.renderizar_template(templates, paginas_service.PAGINAS_ESTATICAS[pagina], {})
+        arquivos += len(escrever_variantes(temporario / arquivo, corpo))
+        urls.append((caminho, changefreq, priority))
+
+    with get_db_context() as db:
+        docs = get_index(db).docs
+
+    for doc in sorted(docs, key=lambda d: d.codigo):
+        if not paginas_service.codigo_valido(doc.codigo):
+            continue
+        dados = paginas_service.dados_infracao(doc)
+        corpo = paginas_service.renderizar_template(templates, "infracao.html", dados)
+        destino = temporario / "infracao" / doc.codigo / f"{dados['slug']}.html"
+        arquivos += len(escrever_variantes(destino, corpo))
+        urls.append((f"/infracao/{doc.codigo}/{dados['slug']}", "monthly", "0.7"))
+
+    sitemap = gerar_sitemap(base_url.rstrip("/"), urls, date.today().isoformat())
+    arquivos += len(escrever_variantes(temporario / "sitemap.xml", sitemap))
+
+    if saida.exists():
+        antigo = saida.with_name(saida.name + ".old")
+        if antigo.exists():
+            shutil.rmtree(antigo)
+        os.replace(saida, antigo)
+        os.replace(temporario, saida)
+        shutil.rmtree(antigo)
+    else:
+        os.replace(temporario, saida)
+
+    resumo = {
+        "paginas": len(urls),
+        "arquivos": arquivos,
+        "brotli": BROTLI_DISPONIVEL,
+        "tempo_s": round(time.time() - inicio, 2),
+    }
+    logger.info(f"Site exportado em {saida}: {resumo['paginas']} páginas, {resumo['arquivos']} arquivos")
+    return resumo
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pré-renderiza as páginas do MultasGO e o sitemap.xml.")
+    parser.add_argument("--saida", default="site", help="Diretório de saída (servido pelo nginx)")
+    parser.add_argument("--base-url", default=settings.SITE_URL, help="URL pública usada no sitemap")
+    args = parser.parse_args(argv)
+
+    resumo = exportar_site(Path(args.saida).resolve(), args.base_url)
+    print(f"Páginas: {resumo['paginas']}")
+    print(f"Arquivos gravados: {resumo['arquivos']}")
+    if not resumo["brotli"]:
+        print("Aviso: pacote 'brotli' não instalado; apenas variantes .gz foram geradas")
+    print(f"Tempo: {resumo['tempo_s']}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
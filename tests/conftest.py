@@ -0,0 +1,27 @@
+"""
+Ambiente comum dos testes.
+
+As variáveis são definidas antes de qualquer import de `app` (Settings lê o
+ambiente na importação): banco SQLite, marcador do dataset, tabela do rate
+limit compartilhado e logs em um diretório temporário, sem warm-up e sem
+SECRET_KEY gerada.
+"""
+import os
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIRETORIO_TESTES = tempfile.mkdtemp(prefix="multasgo-testes-")
+
+os.environ.setdefault("SECRET_KEY", "chave-de-teste")
+os.environ.setdefault("DEBUG", "true")
+os.environ.setdefault("ENABLE_WARMUP", "false")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DIRETORIO_TESTES}/multasgo.db")
+os.environ.setdefault("DATASET_MARKER_PATH", os.path.join(DIRETORIO_TESTES, "dataset.marker"))
+os.environ.setdefault("RATE_LIMIT_SHARED_PATH", os.path.join(DIRETORIO_TESTES, "ratelimit.bin"))
+
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+# O logger grava em ./logs; os testes não devem sujar a árvore
+os.chdir(DIRETORIO_TESTES)
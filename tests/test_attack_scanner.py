@@ -0,0 +1,102 @@
+"""
+ScannerAtaques contra as verificações por lista que ele substituiu: regex a
+regex no path e na query, substring por substring nos termos suspeitos.
+"""
+import random
+import re
+
+import pytest
+
+from app.middleware.attack_scanner import (
+    CAMINHOS_SUSPEITOS,
+    JANELA_SOBREPOSICAO,
+    PADROES_ATAQUE,
+    PARAMETROS_MALICIOSOS,
+    ScannerAtaques,
+)
+
+CASOS = 20_000
+
+_COMPILADOS = [re.compile(p, re.IGNORECASE) for p in PADROES_ATAQUE]
+
+# Trechos que montam as assinaturas, seus prefixos e ruído ao redor
+_FRAGMENTOS = (
+    list(CAMINHOS_SUSPEITOS) + list(PARAMETROS_MALICIOSOS) + [
+        "union select", "UNION  SELECT", "drop table", "<script>", "<SCRIPT src=x>", "javascript:",
+        "onload =", "onclick=", "eval(", "document.cookie", "../a/../", "/etc/passwd", "cmd.exe",
+        "powershell", "wget ", "curl ", "uni", "sel", "wp-", "php", "adm", "<scr", "/", "?", "&",
+        "=", ".", "-", " ", "%20", "a", "b", "x1", "infracoes", "api", "v1", "busca",
+    ]
+)
+
+
+def _texto(rnd: random.Random, maximo: int = 12) -> str:
+    partes = [rnd.choice(_FRAGMENTOS) for _ in range(rnd.randint(0, maximo))]
+    texto = "".join(partes)
+    return "".join(c.upper() if rnd.random() < 0.2 else c for c in texto)
+
+
+def _referencia(path: str, query: str):
+    path_lower = path.lower()
+    query_lower = query.lower()
+    ataque = any(p.search(path_lower) or p.search(query_lower) for p in _COMPILADOS)
+    caminho = next((c for c in CAMINHOS_SUSPEITOS if c in path_lower), "")
+    parametros = tuple(p for p in PARAMETROS_MALICIOSOS if p in query_lower)
+    return ataque, caminho, parametros
+
+
+def test_varredura_url_igual_as_listas():
+    scanner = ScannerAtaques()
+    rnd = random.Random(39)
+    for _ in range(CASOS):
+        path = "/" + _texto(rnd)
+        query = _texto(rnd) if rnd.random() < 0.7 else ""
+        resultado = scanner.varrer_url(path, query)
+        esperado = _referencia(path, query)
+        assert (resultado.ataque, resultado.caminho_suspeito, resultado.parametros) == esperado, (path, query)
+
+
+@pytest.mark.parametrize("path, query, parametros", [
+    ("/busca", "q=1 union select senha", ("union", "select")),
+    ("/busca", "q=UNION%20SELECT", ("union", "select")),
+    ("/busca", "q=drop table x", ("drop",)),
+])
+def test_termos_dentro_de_assinatura(path, query, parametros):
+    resultado = ScannerAtaques().varrer_url(path, query)
+    assert resultado.parametros == parametros
+    assert resultado.ataque == ("%20" not in query)
+
+
+def test_caminhos_sobrepostos():
+    resultado = ScannerAtaques().varrer_url("/wp-admin/setup", "")
+    # A precedência é a ordem da lista: "admin" vem antes de "wp-admin"
+    assert resultado.caminho_suspeito == "admin"
+
+
+def test_corpo_em_chunks_igual_a_busca_no_texto_inteiro():
+    scanner = ScannerAtaques()
+    rnd = random.Random(390)
+    for _ in range(2_000):
+        corpo = _texto(rnd, 40).encode()
+        varredor = scanner.varredor_corpo(limite=len(corpo) + 1)
+        cortes = sorted(rnd.sample(range(1, len(corpo)), min(4, len(corpo) - 1))) if len(corpo) > 1 else []
+        encontrado = False
+        inicio = 0
+        for fim in cortes + [len(corpo)]:
+            if varredor.alimentar(corpo[inicio:fim], final=fim == len(corpo)):
+                encontrado = True
+                break
+            inicio = fim
+
+        texto = corpo.decode()
+        casamentos = [m for p in _COMPILADOS for m in [p.search(texto)] if m]
+        if any(m.end() - m.start() <= JANELA_SOBREPOSICAO for m in casamentos):
+            assert encontrado, corpo
+        if not casamentos:
+            assert not encontrado, corpo
+
+
+def test_corpo_respeita_o_limite():
+    varredor = ScannerAtaques().varredor_corpo(limite=10)
+    assert not varredor.alimentar(b"x" * 10)
+    assert not varredor.alimentar(b"<script>alert(1)</script>", final=True)
@@ -0,0 +1,171 @@
+"""SmartCache particionado (CLOCK por segmento, limite global) e política de custo do CacheManager."""
+import pytest
+
+from app.core.cache_manager import CacheManager, ShardedSmartCache, _SegmentoClock
+from app.core.tamanho import medir_bytes
+
+VALOR = bytes(1000)
+TAMANHO = medir_bytes(VALOR)
+
+
+def _segmento(entradas: int) -> _SegmentoClock:
+    segmento = _SegmentoClock(max_memory_mb=1, default_ttl=0)
+    segmento.max_memory_bytes = entradas * TAMANHO
+    return segmento
+
+
+def test_clock_da_segunda_chance_a_entrada_lida():
+    segmento = _segmento(3)
+    for chave in "abc":
+        segmento.set(chave, VALOR)
+    assert segmento.get("a") == VALOR
+
+    segmento.set("d", VALOR)
+    # "a" foi lida: ganha segunda chance; sai "b", a próxima sem referência
+    assert segmento.get("b") is None
+    assert {chave for chave in "acd" if segmento.get(chave) is not None} == set("acd")
+    assert segmento.get_counters()["evictions"] == 1
+
+
+def test_clock_remove_a_de_menor_custo_por_byte():
+    segmento = _segmento(3)
+    segmento.set("x", VALOR, cost=50)
+    segmento.set("y", VALOR, cost=1)
+    segmento.set("z", VALOR, cost=50)
+
+    segmento.set("w", VALOR, cost=50)
+    assert segmento.get("y") is None
+    assert all(segmento.get(chave) is not None for chave in "xzw")
+
+
+def test_clock_com_todas_referenciadas_ainda_remove():
+    segmento = _segmento(2)
+    segmento.set("a", VALOR)
+    segmento.set("b", VALOR)
+    segmento.get("a")
+    segmento.get("b")
+    segmento.set("c", VALOR)
+    assert segmento.get_counters()["entries"] == 2
+    assert segmento.get("c") == VALOR
+
+
+def test_valor_grande_cabe_no_limite_total():
+    cache = ShardedSmartCache(max_memory_mb=1, default_ttl=0, shards=8)
+    grande = bytes(200_000)
+    cache.set("grande", grande)
+    # Maior que 1/8 do limite, mas cabe no total
+    assert cache.get("grande") == grande
+    assert cache.get_counters()["memory_bytes"] >= 200_000
+
+    cache.set("enorme", bytes(2 * 1024 * 1024))
+    assert cache.get("enorme") is None
+
+
+def test_limite_total_respeitado_e_segmento_ocupado_usa_o_espaco_livre():
+    cache = ShardedSmartCache(max_memory_mb=1, default_ttl=0, shards=8)
+    limite = cache.max_memory_bytes
+    cabem = limite // TAMANHO
+
+    # Todas as chaves no mesmo segmento: ele pode passar de 1/8 do limite
+    segmento = cache._segmento("k0")
+    chaves = [k for k in (f"k{i}" for i in range(20 * cabem)) if cache._segmento(k) is segmento]
+    for chave in chaves[:cabem]:
+        cache.set(chave, VALOR)
+    assert segmento.get_counters()["entries"] == cabem
+    assert cache.get_counters()["evictions"] == 0
+
+    # Acima do total, sai entrada mesmo com os outros segmentos vazios
+    for i in range(2 * cabem):
+        cache.set(f"outra{i}", VALOR)
+        assert cache._memory_usage <= limite
+    assert cache.get_counters()["evictions"] >= cabem
+
+
+def test_estatisticas_somadas_entre_segmentos():
+    cache = ShardedSmartCache(max_memory_mb=1, default_ttl=0, shards=4)
+    for i in range(40):
+        cache.set(f"k{i}", VALOR)
+    for i in range(40):
+        cache.get(f"k{i}")
+    cache.get("ausente")
+
+    contadores = cache.get_counters()
+    assert contadores["entries"] == 40
+    assert contadores["hits"] == 40
+    assert contadores["misses"] == 1
+    assert contadores["memory_bytes"] == 40 * TAMANHO
+    assert contadores["memory_limit_bytes"] == 1024 * 1024
+    assert contadores["shards"] == 4
+
+    stats = cache.get_stats()
+    assert stats["entries"] == sum(stats["shard_entries"]) == 40
+    assert stats["memory_usage_bytes"] == 40 * TAMANHO
+    assert stats["memory_limit_mb"] == 1.0
+    assert stats["hit_rate_percent"] == round(40 / 41 * 100, 2)
+    assert len(cache.eviction_candidates()) == 40
+
+
+class _Estrutura:
+    """Subsistema de teste: tamanho fixo até ser liberado."""
+
+    def __init__(self, tamanho):
+        self.tamanho = tamanho
+        self.liberacoes = 0
+
+    def liberar(self):
+        self.tamanho = 0
+        self.liberacoes += 1
+
+
+@pytest.fixture
+def gerenciador(monkeypatch):
+    monkeypatch.setattr(CacheManager, "start_monitoring", lambda self: None)
+    return CacheManager()
+
+
+def test_evict_by_cost_remove_primeiro_o_menor_custo_por_byte(gerenciador):
+    cache = gerenciador.create_cache("teste", max_memory_mb=10, default_ttl=0)
+    cache.set("barata", VALOR, cost=1)
+    cache.set("cara", VALOR, cost=1000)
+    # 500 KB que custam 1 ms: mais barato por byte que qualquer entrada
+    grande = _Estrutura(500_000)
+    gerenciador.register_subsystem("grande", lambda: grande.tamanho, 1.0, release_fn=grande.liberar)
+    fixo = _Estrutura(1_000_000)
+    gerenciador.register_subsystem("fixo", lambda: fixo.tamanho, 0.001, release_fn=fixo.liberar, pinned=True)
+    assert gerenciador.releasable_bytes() == 500_000 + 2 * TAMANHO
+
+    assert gerenciador.evict_by_cost(1) == 500_000
+    assert grande.liberacoes == 1
+    assert cache.get("barata") == VALOR
+
+    assert gerenciador.evict_by_cost(1) == TAMANHO
+    assert cache.get("barata") is None
+    assert cache.get("cara") == VALOR
+
+    # Tudo o que é descartável sai; o subsistema fixo nunca
+    assert gerenciador.evict_by_cost(10 ** 9) == TAMANHO
+    assert cache.get("cara") is None
+    assert fixo.liberacoes == 0
+    assert gerenciador.releasable_bytes() == 0
+    assert gerenciador.pressure_evictions == 3
+    assert gerenciador.pressure_freed_bytes == 500_000 + 2 * TAMANHO
+
+
+def test_subsistema_sem_release_fn_nao_e_descartado(gerenciador):
+    gerenciador.register_subsystem("indice", lambda: 10 ** 6, 0.0)
+    assert gerenciador.releasable_bytes() == 0
+    assert gerenciador.evict_by_cost(10 ** 9) == 0
+    assert gerenciador.get_global_stats()["subsystems"]["indice"] == {
+        "size_bytes": 10 ** 6, "cost_ms": 0.0, "pinned": False,
+    }
+
+
+def test_subsistemas_da_busca_medidos_como_os_caches():
+    from app.search import engine
+
+    palavras = [f"palavra{i}" for i in range(50)]
+    engine._extrair_palavras_banco._cache = palavras
+    try:
+        assert engine._tamanho_palavras_banco() == medir_bytes(palavras)
+    finally:
+        engine._liberar_palavras_banco()
@@ -0,0 +1,23 @@
+from app.core.compressao import codificacoes_aceitas
+
+
+def test_codificacoes_listadas():
+    assert codificacoes_aceitas("gzip, deflate, br") == {"gzip", "deflate", "br"}
+    assert codificacoes_aceitas("") == frozenset()
+
+
+def test_q_zero_recusa():
+    assert codificacoes_aceitas("gzip;q=0, br") == {"br"}
+    assert codificacoes_aceitas("br;q=0.0, gzip;q=0.5") == {"gzip"}
+    assert codificacoes_aceitas("GZIP; Q=0") == frozenset()
+
+
+def test_curinga_cobre_as_nao_listadas():
+    assert codificacoes_aceitas("*") == {"br", "gzip"}
+    assert codificacoes_aceitas("br;q=0, *") == {"gzip"}
+    assert codificacoes_aceitas("*;q=0") == frozenset()
+
+
+def test_alias_e_q_invalido():
+    assert codificacoes_aceitas("x-gzip") == {"gzip"}
+    assert codificacoes_aceitas("gzip;q=abc") == frozenset()
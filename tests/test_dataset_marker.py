@@ -0,0 +1,122 @@
+"""Escrita no catálogo feita por outro processo é vista pelo índice deste."""
+import multiprocessing
+import threading
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.models.infracao_model import InfracaoModel
+from app.search import in_memory
+
+_INSERT = text(
+    'INSERT INTO bdbautos ("Código de Infração", "Infração", "Responsável", "Valor da Multa", '
+    '"Órgão Autuador", "Artigos do CTB", "Pontos", "Gravidade") '
+    "VALUES (:codigo, :descricao, 'Condutor', 293.47, 'Estadual', '162, I', 7, 'Gravíssima')"
+)
+
+
+def _inserir(url: str, codigo: str, descricao: str):
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(_INSERT, {"codigo": codigo, "descricao": descricao})
+    engine.dispose()
+
+
+def _worker_escritor(url: str, codigo: str, descricao: str):
+    _inserir(url, codigo, descricao)
+    in_memory.mark_dataset_changed()
+
+
+@pytest.fixture
+def banco(tmp_path, monkeypatch):
+    monkeypatch.setattr(in_memory, "_INDEX", None)
+    monkeypatch.setattr(in_memory, "_INDEX_MARKER", None)
+    monkeypatch.setattr(in_memory, "_RELOAD_HOOKS", [])
+    url = f"sqlite:///{tmp_path}/catalogo.db"
+    engine = create_engine(url)
+    InfracaoModel.__table__.create(engine)
+    _inserir(url, "50110", "Dirigir veiculo sem possuir carteira")
+    yield url, sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_escrita_em_outro_processo_reconstroi_o_indice(banco):
+    url, Session = banco
+    recarregados = []
+    in_memory.register_reload_hook(lambda: recarregados.append(True))
+
+    with Session() as db:
+        idx = in_memory.get_index(db)
+        versao = idx.version
+        assert idx.get_by_code("60501") is None
+        assert in_memory.get_built_index() is idx
+
+        processo = multiprocessing.get_context("spawn").Process(
+            target=_worker_escritor, args=(url, "60501", "Avancar o sinal vermelho")
+        )
+        processo.start()
+        processo.join(60)
+        assert processo.exitcode == 0
+
+        # Sem o banco, o índice desatualizado não é oferecido
+        assert in_memory.get_built_index() is None
+
+        idx = in_memory.get_index(db)
+        assert idx.get_by_code("60501") is not None
+        assert idx.version != versao
+        assert recarregados == [True]
+        assert in_memory.get_built_index() is idx
+
+
+def test_reconstrucao_local_nao_repete_o_build(banco, monkeypatch):
+    url, Session = banco
+    recarregados = []
+    in_memory.register_reload_hook(lambda: recarregados.append(True))
+    with Session() as db:
+        in_memory.get_index(db)
+        marcador = in_memory._dataset_marker()
+        _inserir(url, "60501", "Avancar o sinal vermelho")
+        linhas = in_memory.fetch_rows(db)
+
+        # Nenhuma leitura do banco pelo índice: só as linhas passadas
+        def build_do_banco(self, db):
+            raise AssertionError("índice reconstruído a partir do banco")
+
+        monkeypatch.setattr(in_memory.InMemorySearchIndex, "build", build_do_banco)
+        idx = in_memory.rebuild_index(linhas)
+
+        # Os outros workers veem a mudança; os caches derivados foram limpos uma vez
+        assert in_memory._dataset_marker() != marcador
+        assert recarregados == [True]
+        assert idx.get_by_code("60501") is not None
+        assert in_memory.get_index(db) is idx
+        assert in_memory.get_built_index() is idx
+
+
+def test_indice_atual_nao_espera_o_lock(banco):
+    url, Session = banco
+    with Session() as db:
+        idx = in_memory.get_index(db)
+
+        # Outra thread reconstruindo (lock ocupado): quem lê um índice atual não espera
+        ocupado = threading.Event()
+        liberar = threading.Event()
+
+        def segurar_lock():
+            with in_memory._INDEX_LOCK:
+                ocupado.set()
+                liberar.wait(10)
+
+        thread = threading.Thread(target=segurar_lock)
+        thread.start()
+        ocupado.wait(10)
+        try:
+            resultado = []
+            leitor = threading.Thread(target=lambda: resultado.append(in_memory.get_index(db)))
+            leitor.start()
+            leitor.join(2)
+            assert resultado == [idx]
+        finally:
+            liberar.set()
+            thread.join()
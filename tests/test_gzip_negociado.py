@@ -0,0 +1,42 @@
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+from app.core.http_cache import cabecalhos_cache
+from app.middleware.gzip_negociado import GZipNegociado
+
+CORPO = "x" * 5000
+
+app = FastAPI()
+app.add_middleware(GZipNegociado, minimum_size=1000)
+
+
+@app.get("/pagina")
+def pagina():
+    return PlainTextResponse(CORPO, headers=cabecalhos_cache('W/"v1-abc"', 60))
+
+
+@app.get("/sem-vary")
+def sem_vary():
+    return PlainTextResponse(CORPO)
+
+
+cliente = TestClient(app)
+
+
+def test_vary_sem_repeticao():
+    r = cliente.get("/pagina", headers={"accept-encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["vary"] == "Accept-Encoding"
+    assert r.text == CORPO
+
+
+def test_vary_adicionado_quando_ausente():
+    r = cliente.get("/sem-vary", headers={"accept-encoding": "gzip"})
+    assert r.headers["vary"] == "Accept-Encoding"
+
+
+def test_gzip_q_zero_nao_comprime():
+    r = cliente.get("/pagina", headers={"accept-encoding": "gzip;q=0, br"})
+    assert "content-encoding" not in r.headers
+    assert r.text == CORPO
@@ -0,0 +1,88 @@
+import random
+
+from app.core.histograma import (
+    TOTAL_BUCKETS,
+    Histograma,
+    HistogramaJanela,
+    indice_bucket,
+    limites_bucket,
+)
+
+
+def test_bucket_contem_o_valor():
+    rnd = random.Random(42)
+    valores = list(range(0, 5000)) + [rnd.randrange(1, 1 << 33) for _ in range(50_000)]
+    valores += [(1 << e) + d for e in range(5, 33) for d in (-1, 0, 1)]
+    for micros in valores:
+        inferior, superior = limites_bucket(indice_bucket(micros))
+        assert inferior <= micros < superior, micros
+
+
+def test_buckets_contiguos_e_ultimo_cobre_143_min():
+    anterior = 0
+    for i in range(TOTAL_BUCKETS):
+        inferior, superior = limites_bucket(i)
+        assert inferior == anterior
+        anterior = superior
+    assert anterior == 1 << 33
+    # Acima do último limite o valor cai no último bucket
+    assert indice_bucket(1 << 40) == TOTAL_BUCKETS - 1
+
+
+def _exato(ordenados, p):
+    alvo = max(1, int(len(ordenados) * p / 100.0 + 0.5))
+    return ordenados[alvo - 1]
+
+
+def test_erro_relativo_dos_percentis():
+    rnd = random.Random(7)
+    for distribuicao in (
+        lambda: rnd.lognormvariate(-5, 1.5),
+        lambda: rnd.expovariate(50),
+        lambda: rnd.uniform(0.0001, 2.0),
+    ):
+        histograma = Histograma()
+        amostras = [distribuicao() for _ in range(20_000)]
+        for s in amostras:
+            histograma.registrar(s)
+        ordenados = sorted(amostras)
+        for p in (1, 25, 50, 90, 95, 99, 99.9):
+            exato = _exato(ordenados, p)
+            estimado = histograma.percentil(p)
+            # Metade da largura do bucket (1/32 da base) mais o truncamento para µs
+            assert abs(estimado - exato) <= exato * 0.0315 + 1e-6, (p, exato, estimado)
+
+
+def test_mesclar_soma_contagens():
+    a, b = Histograma(), Histograma()
+    for s in (0.001, 0.002, 0.003):
+        a.registrar(s)
+    b.registrar(0.5)
+    total = a.copiar().mesclar(b)
+    assert total.total == 4
+    assert total.maximo == 0.5
+    assert sum(c for _, c in total.buckets()) == 4
+    assert a.total == 3
+
+
+def test_janela_exclui_fatias_antigas():
+    janela = HistogramaJanela(janela=60, fatias=6)  # fatias de 10s
+    janela.registrar(0.001, agora=1000.0)   # época 100
+    janela.registrar(0.002, agora=1035.0)   # época 103
+    janela.registrar(0.003, agora=1059.0)   # época 105
+
+    assert janela.snapshot(agora=1059.0).total == 3
+    assert janela.snapshot(janela=30, agora=1059.0).total == 2
+    assert janela.snapshot(janela=10, agora=1059.0).total == 1
+    # Em t=1065 (época 106) a fatia da época 100 já saiu da janela
+    assert janela.snapshot(agora=1065.0).total == 2
+    assert janela.acumulado.total == 3
+
+
+def test_fatia_reaproveitada_e_zerada():
+    janela = HistogramaJanela(janela=60, fatias=6)
+    janela.registrar(0.001, agora=1000.0)   # época 100, posição 4
+    janela.registrar(0.005, agora=1060.0)   # época 106, mesma posição
+    snapshot = janela.snapshot(agora=1060.0)
+    assert snapshot.total == 1
+    assert snapshot.maximo == 0.005
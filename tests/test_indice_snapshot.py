@@ -0,0 +1,65 @@
+"""O índice é publicado como um snapshot imutável: leitores nunca misturam builds."""
+import threading
+
+from app.search.in_memory import ORDENACOES, InMemorySearchIndex
+
+
+def _linhas(n, prefixo="5"):
+    return [
+        (f"{prefixo}{i:04d}", f"Conduzir veiculo com farol apagado caso {i}", "Condutor",
+         100.0 + i, "Estadual", "162, I", i % 8, ("Leve", "Media", "Grave", "Gravissima")[i % 4])
+        for i in range(n)
+    ]
+
+
+def test_snapshot_capturado_sobrevive_a_rebuild_e_invalidate():
+    indice = InMemorySearchIndex()
+    indice.build_from_rows(_linhas(50))
+    antigo = indice.snapshot()
+
+    indice.invalidate()
+    assert indice.docs == ()
+    assert indice.generation == 1
+    indice.build_from_rows(_linhas(10, prefixo="6"))
+
+    assert len(antigo.docs) == 50
+    assert antigo.get_by_code("50042").codigo == "50042"
+    assert antigo.ordered(set(range(50)), "codigo")[0] == 0
+    assert indice.get_by_code("50042") is None
+    assert indice.get_by_code("60003").codigo == "60003"
+    assert indice.generation == 2 == indice.snapshot().generation
+    assert antigo.version != indice.version
+
+
+def test_leitores_concorrentes_com_rebuilds():
+    indice = InMemorySearchIndex()
+    indice.build_from_rows(_linhas(400))
+    erros = []
+    parar = threading.Event()
+
+    def leitor():
+        while not parar.is_set():
+            try:
+                snap = indice.snapshot()
+                for ordenar in ORDENACOES[1:]:
+                    ids = snap.ordered(snap.filter_ids(busca="farol"), ordenar)
+                    assert len(ids) == len(snap.docs)
+                    for i in ids[:3]:
+                        doc = snap.docs[i]
+                        assert snap.get_by_code(doc.codigo) is doc
+                docs, total, _ = indice.search("farol apagado", limit=5, skip=0, ordenar="valor_desc")
+                assert len(docs) == min(5, total)
+            except Exception as e:  # pragma: no cover - falha do teste
+                erros.append(repr(e))
+                parar.set()
+
+    threads = [threading.Thread(target=leitor) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for k in range(40):
+        indice.invalidate()
+        indice.build_from_rows(_linhas(400 - (k % 5) * 70, prefixo=str(5 + k % 2)))
+    parar.set()
+    for thread in threads:
+        thread.join()
+    assert erros == []
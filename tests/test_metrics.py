@@ -0,0 +1,34 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+
+NAVEGADOR = {"user-agent": "Mozilla/5.0 (X11; Linux x86_64) Chrome/120.0", "accept": "*/*"}
+
+
+@pytest.fixture
+def cliente():
+    return TestClient(app)
+
+
+def test_sem_token_em_producao_responde_404(cliente, monkeypatch):
+    monkeypatch.setattr(settings, "DEBUG", False)
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "")
+    assert cliente.get("/metrics", headers=NAVEGADOR).status_code == 404
+
+
+def test_sem_token_em_debug_responde(cliente, monkeypatch):
+    monkeypatch.setattr(settings, "DEBUG", True)
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "")
+    resposta = cliente.get("/metrics", headers=NAVEGADOR)
+    assert resposta.status_code == 200
+    assert "multasgo_cache_hits_total" in resposta.text
+
+
+def test_com_token_exige_bearer(cliente, monkeypatch):
+    monkeypatch.setattr(settings, "DEBUG", False)
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "segredo")
+    assert cliente.get("/metrics", headers=NAVEGADOR).status_code == 403
+    resposta = cliente.get("/metrics", headers={**NAVEGADOR, "authorization": "Bearer segredo"})
+    assert resposta.status_code == 200
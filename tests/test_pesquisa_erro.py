@@ -0,0 +1,44 @@
+"""Falha do motor na pesquisa não é guardada no cache de respostas nem validada por ETag."""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+
+from app.api.endpoints import infracoes
+from app.main import app
+from app.search import engine
+
+NAVEGADOR = {"user-agent": "Mozilla/5.0 (X11; Linux x86_64) Chrome/120.0", "accept": "*/*"}
+
+
+class _IndiceInstavel:
+    def __init__(self, erro):
+        self.erro = erro
+
+    def search(self, query, limit=10, skip=0, ordenar="relevancia"):
+        if self.erro is not None:
+            erro, self.erro = self.erro, None
+            raise erro
+        return [], 0, None
+
+
+@pytest.mark.parametrize("erro, status_esperado", [
+    (RuntimeError("índice indisponível"), 500),
+    (OperationalError("SELECT 1", {}, Exception("database is locked")), 503),
+])
+def test_falha_temporaria_nao_fica_em_cache(monkeypatch, erro, status_esperado):
+    indice = _IndiceInstavel(erro)
+    # Versão própria do teste: nenhuma entrada de outros testes no cache de respostas
+    monkeypatch.setattr(infracoes, "get_dataset_version", lambda db: f"falha-{status_esperado}")
+    monkeypatch.setattr(engine, "get_index", lambda db: indice)
+    cliente = TestClient(app)
+    url = "/api/v1/infracoes/pesquisa?q=farol+apagado"
+
+    falha = cliente.get(url, headers=NAVEGADOR)
+    assert falha.status_code == status_esperado
+    assert "etag" not in falha.headers
+    assert "max-age" not in falha.headers.get("cache-control", "")
+
+    resposta = cliente.get(url, headers=NAVEGADOR)
+    assert resposta.status_code == 200
+    assert resposta.json()["mensagem"].startswith("Nenhuma infração encontrada")
+    assert resposta.headers.get("etag")
@@ -0,0 +1,179 @@
+"""Token bucket por processo e tabela compartilhada entre processos (mmap + flock)."""
+import multiprocessing
+
+import pytest
+
+from app.middleware.rate_limit import TokenBucketLimiter
+from app.middleware.shared_limiter import SharedTokenBucketLimiter
+
+# Janela longa: entre as chamadas de um mesmo teste a reposição é desprezível
+JANELA = 3600
+ROTAS = [("/api", 10), ("/api/v1/infracoes/pesquisa", 4)]
+INSTANTE = 1_000_000.0
+
+
+def _contexto():
+    return multiprocessing.get_context("spawn")
+
+
+def _worker_consumir(caminho, requisicoes, rotas, tentativas, barreira, fila):
+    limiter = SharedTokenBucketLimiter(requisicoes, JANELA, rotas, max_entradas=1024, caminho=caminho)
+    barreira.wait()
+    permitidos = dict.fromkeys(("/", "/api/v1/infracoes/smart", "/api/v1/infracoes/pesquisa"), 0)
+    for _ in range(tentativas):
+        for path in permitidos:
+            permitidos[path] += limiter.permitir("203.0.113.7", path, INSTANTE)
+    fila.put(permitidos)
+
+
+def _worker_bloquear(caminho, ip, instante):
+    SharedTokenBucketLimiter(20, JANELA, max_entradas=1024, caminho=caminho).bloquear(ip, instante)
+
+
+def _worker_consultar_bloqueio(caminho, ip, fila):
+    fila.put(SharedTokenBucketLimiter(20, JANELA, max_entradas=1024, caminho=caminho).bloqueado_em(ip))
+
+
+def _executar(processo):
+    processo.start()
+    processo.join(60)
+    assert processo.exitcode == 0
+
+
+@pytest.fixture
+def caminho(tmp_path):
+    return str(tmp_path / "ratelimit.bin")
+
+
+@pytest.fixture(params=["memory", "shared"])
+def limiter(request, caminho):
+    if request.param == "memory":
+        return TokenBucketLimiter(20, JANELA, ROTAS, max_entradas=1024)
+    return SharedTokenBucketLimiter(20, JANELA, ROTAS, max_entradas=1024, caminho=caminho)
+
+
+def test_prefixo_mais_longo_define_o_grupo(limiter):
+    assert limiter.grupo("/api/v1/infracoes/pesquisa?q=x") == "/api/v1/infracoes/pesquisa"
+    assert limiter.grupo("/api/v1/infracoes/smart") == "/api"
+    assert limiter.grupo("/explorador") == ""
+    assert limiter.route_limits() == {"default": 20, "/api": 10, "/api/v1/infracoes/pesquisa": 4}
+
+
+def test_cada_grupo_tem_seu_balde(limiter):
+    def consumir(path, ip="198.51.100.1"):
+        return sum(limiter.permitir(ip, path, INSTANTE) for _ in range(30))
+
+    assert consumir("/api/v1/infracoes/pesquisa") == 4
+    # O grupo "/api" não foi tocado pelo grupo mais específico
+    assert consumir("/api/v1/infracoes/smart") == 10
+    assert consumir("/") == 20
+    # Outro IP começa com os baldes cheios
+    assert consumir("/api/v1/infracoes/pesquisa", "198.51.100.2") == 4
+
+
+def test_reposicao_e_resetar(limiter):
+    ip = "198.51.100.3"
+    assert sum(limiter.permitir(ip, "/api/x", INSTANTE) for _ in range(15)) == 10
+    # 10 requisições por hora: um token a cada 360s
+    assert limiter.permitir(ip, "/api/x", INSTANTE + 360)
+    assert not limiter.permitir(ip, "/api/x", INSTANTE + 360)
+    limiter.resetar(ip)
+    assert sum(limiter.permitir(ip, "/api/x", INSTANTE + 360) for _ in range(15)) == 10
+
+
+def test_total_permitido_entre_processos_igual_a_capacidade(caminho):
+    # O primeiro a abrir cria a tabela; os workers só a mapeiam
+    SharedTokenBucketLimiter(2000, JANELA, ROTAS, max_entradas=1024, caminho=caminho)
+    ctx = _contexto()
+    workers = 4
+    barreira = ctx.Barrier(workers)
+    fila = ctx.Queue()
+    processos = [
+        ctx.Process(target=_worker_consumir, args=(caminho, 2000, ROTAS, 1500, barreira, fila))
+        for _ in range(workers)
+    ]
+    for processo in processos:
+        processo.start()
+    resultados = [fila.get(timeout=60) for _ in processos]
+    for processo in processos:
+        processo.join(60)
+        assert processo.exitcode == 0
+
+    totais = {path: sum(r[path] for r in resultados) for path in resultados[0]}
+    # Todos disputam os mesmos registros: sem o flock, leituras-escritas concorrentes permitiriam a mais
+    assert totais == {"/": 2000, "/api/v1/infracoes/smart": 10, "/api/v1/infracoes/pesquisa": 4}
+
+
+def test_bloqueio_visivel_entre_processos(caminho):
+    limiter = SharedTokenBucketLimiter(20, JANELA, max_entradas=1024, caminho=caminho)
+    ctx = _contexto()
+
+    _executar(ctx.Process(target=_worker_bloquear, args=(caminho, "192.0.2.10", INSTANTE)))
+    assert limiter.bloqueado_em("192.0.2.10") == INSTANTE
+    assert limiter.contar_bloqueios(INSTANTE + 1, 300) == (1, 1)
+
+    limiter.bloquear("192.0.2.11", INSTANTE + 5)
+    limiter.desbloquear("192.0.2.10")
+    fila = ctx.Queue()
+    for ip, esperado in (("192.0.2.11", INSTANTE + 5), ("192.0.2.10", None)):
+        _executar(ctx.Process(target=_worker_consultar_bloqueio, args=(caminho, ip, fila)))
+        assert fila.get(timeout=10) == esperado
+
+
+def test_slot_ocioso_reaproveitado_depois_da_janela(caminho):
+    # 8 slots: a sondagem (8) cobre a tabela inteira
+    limiter = SharedTokenBucketLimiter(5, 10, max_entradas=8, caminho=caminho, duracao_bloqueio=100)
+    for i in range(8):
+        limiter.permitir(f"10.0.0.{i}", "/", INSTANTE)
+
+    # Dentro da janela nenhum registro pode ser reaproveitado: o mais antigo é sobrescrito
+    limiter.permitir("10.0.1.0", "/", INSTANTE + 5)
+    assert limiter.descartados == 1
+
+    # Depois da janela todos os registros ociosos estão livres
+    for i in range(8):
+        assert limiter.permitir(f"10.0.2.{i}", "/", INSTANTE + 20)
+    assert limiter.descartados == 1
+
+
+def test_slot_bloqueado_so_reaproveitado_depois_do_bloqueio(caminho):
+    limiter = SharedTokenBucketLimiter(5, 10, max_entradas=8, caminho=caminho, duracao_bloqueio=100)
+    limiter.bloquear("10.0.0.99", INSTANTE)
+    for i in range(7):
+        limiter.permitir(f"10.0.0.{i}", "/", INSTANTE)
+
+    # Ociosos há mais de uma janela: os 7 slots de balde são reaproveitados, o bloqueio fica
+    for i in range(7):
+        limiter.permitir(f"10.0.1.{i}", "/", INSTANTE + 50)
+    assert limiter.descartados == 0
+    assert limiter.bloqueado_em("10.0.0.99") == INSTANTE
+
+    # Bloqueio vencido: o slot dele também volta a ser livre (8 novos, nenhum descarte)
+    for i in range(8):
+        limiter.permitir(f"10.0.2.{i}", "/", INSTANTE + 150)
+    assert limiter.descartados == 0
+    assert limiter.bloqueado_em("10.0.0.99") is None
+
+
+def test_outro_tamanho_usa_outro_arquivo_sem_truncar_o_mapeado(caminho):
+    limiter = SharedTokenBucketLimiter(5, 10, max_entradas=8, caminho=caminho)
+    limiter.bloquear("10.0.0.1", INSTANTE)
+    # Deploy gradual: workers novos com outro RATE_LIMIT_MAX_CLIENTS
+    maior = SharedTokenBucketLimiter(5, 10, max_entradas=16, caminho=caminho)
+    assert maior.slots == 16
+    assert maior.caminho != limiter.caminho
+    assert maior.bloqueado_em("10.0.0.1") is None
+
+    # Os workers antigos continuam com a tabela deles intacta
+    assert limiter.bloqueado_em("10.0.0.1") == INSTANTE
+    assert limiter.permitir("10.0.0.2", "/", INSTANTE)
+    assert SharedTokenBucketLimiter(5, 10, max_entradas=8, caminho=caminho).bloqueado_em("10.0.0.1") == INSTANTE
+
+
+def test_arquivo_incompleto_e_reinicializado(caminho):
+    destino = SharedTokenBucketLimiter(5, 10, max_entradas=8, caminho=caminho).caminho
+    with open(destino, "r+b") as arquivo:
+        arquivo.truncate(10)
+    limiter = SharedTokenBucketLimiter(5, 10, max_entradas=8, caminho=caminho)
+    assert limiter.permitir("10.0.0.1", "/", INSTANTE)
+    assert limiter.bloqueado_em("10.0.0.1") is None
@@ -0,0 +1,34 @@
+from app.core.prometheus import gerar_metricas
+from app.middleware.contexto import ContextoRequisicao
+from app.middleware.ip_state import TabelaEstadoIP
+from app.middleware.security import SecurityMiddleware
+
+
+def _contexto(ip: str = "203.0.113.7") -> ContextoRequisicao:
+    return ContextoRequisicao({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/v1/infracoes",
+        "query_string": b"",
+        "client": (ip, 40000),
+        "headers": [
+            (b"user-agent", b"Mozilla/5.0 (X11; Linux x86_64) Chrome/120.0"),
+            (b"accept", b"*/*"),
+            (b"accept-language", b"pt-BR"),
+        ],
+    })
+
+
+def test_um_429_conta_uma_rejeicao_e_um_bloqueio():
+    seguranca = SecurityMiddleware(rate_limit_requests=3, rate_limit_window=60, estado_ips=TabelaEstadoIP())
+    respostas = [seguranca.verificar(_contexto()) for _ in range(6)]
+    recusadas = [r for r in respostas if r is not None and r.status_code == 429]
+
+    assert len(recusadas) == 3
+    assert dict(seguranca.bloqueios) == {"rate_limited": 3}
+    # O bloqueio é aplicado uma vez; as demais recusas são do bloqueio ativo
+    assert seguranca.bloqueios_aplicados == 1
+
+    texto = gerar_metricas(seguranca=seguranca)
+    assert 'multasgo_security_rejections_total{reason="rate_limited"} 3' in texto
+    assert "multasgo_rate_limiter_blocks_total 1" in texto
@@ -0,0 +1,172 @@
+"""TimingWheel contra um modelo por força bruta, e a expiração dos seus usuários."""
+import math
+import random
+import time
+
+import pytest
+
+from app.core import cache_manager as modulo_cache
+from app.core.cache_manager import ShardedSmartCache, SmartCache
+from app.core.timing_wheel import TimingWheel
+from app.middleware.ip_state import TabelaEstadoIP
+
+
+class Modelo:
+    """Mesma semântica do wheel: prazo arredondado para o tick de cima, nunca o atual."""
+
+    def __init__(self, resolucao: float, agora: float):
+        self.resolucao = resolucao
+        self.tick = int(agora / resolucao)
+        self.alvos = {}
+
+    def agendar(self, chave, prazo: float):
+        self.alvos[chave] = max(math.ceil(prazo / self.resolucao), self.tick + 1)
+
+    def cancelar(self, chave):
+        self.alvos.pop(chave, None)
+
+    def avancar(self, agora: float):
+        destino = int(agora / self.resolucao)
+        if destino <= self.tick:
+            return set()
+        self.tick = destino
+        vencidos = {c for c, alvo in self.alvos.items() if alvo <= destino}
+        for chave in vencidos:
+            del self.alvos[chave]
+        return vencidos
+
+
+@pytest.mark.parametrize("slots, niveis", [(2, 1), (2, 3), (4, 2), (8, 3), (64, 4), (16, 1)])
+@pytest.mark.parametrize("resolucao", [1.0, 0.25])
+def test_igual_a_forca_bruta(slots, niveis, resolucao):
+    rnd = random.Random(slots * 100 + niveis + int(resolucao * 10))
+    agora = 1_000_000.0 + rnd.random() * 1000
+    wheel = TimingWheel(resolucao, slots=slots, niveis=niveis, agora=agora)
+    modelo = Modelo(resolucao, agora)
+    alcance = slots ** niveis * resolucao
+    # Avanços dentro do alcance andam tick a tick: limitados para o teste ser rápido
+    passo_medio = min(alcance, 2000 * resolucao)
+
+    for _ in range(4000):
+        operacao = rnd.random()
+        chave = rnd.randrange(300)
+        if operacao < 0.5:
+            # Prazos no passado, dentro do alcance e além dele (lista de distantes)
+            escala = rnd.choice((resolucao * 3, alcance, alcance * 4))
+            prazo = agora + rnd.uniform(-resolucao * 2, escala)
+            wheel.agendar(chave, prazo)
+            modelo.agendar(chave, prazo)
+        elif operacao < 0.65:
+            wheel.cancelar(chave)
+            modelo.cancelar(chave)
+        else:
+            # Passos curtos, dentro do alcance e saltos maiores que ele
+            passo = rnd.choice((resolucao * rnd.random() * 3, rnd.random() * passo_medio, alcance * rnd.uniform(1, 3)))
+            agora += passo
+            assert set(wheel.avancar(agora)) == modelo.avancar(agora)
+        assert len(wheel) == len(modelo.alvos)
+
+    agora += alcance * 10
+    assert set(wheel.avancar(agora)) == modelo.avancar(agora)
+    assert len(wheel) == 0
+
+
+def test_vencidos_saem_uma_vez_e_avanco_para_tras_e_noop():
+    wheel = TimingWheel(1.0, slots=4, niveis=2, agora=100.0)
+    wheel.agendar("a", 102.5)
+    wheel.agendar("b", 150.0)
+    assert wheel.avancar(102.0) == []
+    assert wheel.avancar(103.0) == ["a"]
+    assert wheel.avancar(103.0) == []
+    assert wheel.avancar(50.0) == []
+    assert "b" in wheel
+    assert wheel.avancar(150.0) == ["b"]
+
+
+def test_reagendar_substitui_o_prazo():
+    wheel = TimingWheel(1.0, slots=8, niveis=2, agora=0.0)
+    wheel.agendar("a", 5)
+    wheel.agendar("a", 40)
+    assert wheel.avancar(10) == []
+    assert len(wheel) == 1
+    assert wheel.avancar(40) == ["a"]
+
+
+def test_slots_invalidos():
+    with pytest.raises(ValueError):
+        TimingWheel(1.0, slots=6)
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = time.time()
+
+    def time(self):
+        return self.agora
+
+
+@pytest.mark.parametrize("fabrica", [
+    lambda: SmartCache(max_memory_mb=1, default_ttl=10),
+    lambda: ShardedSmartCache(max_memory_mb=1, default_ttl=10, shards=4),
+])
+def test_smart_cache_expira(monkeypatch, fabrica):
+    relogio = Relogio()
+    monkeypatch.setattr(modulo_cache, "time", relogio)
+    cache = fabrica()
+
+    cache.set("curta", 1, ttl=5)
+    cache.set("padrao", 2)
+    cache.set("eterna", 3, ttl=0)
+    assert cache.get("curta") == 1
+
+    relogio.agora += 6
+    assert cache.get("curta") is None
+    assert cache.get("padrao") == 2
+
+    relogio.agora += 5
+    cache.cleanup_expired()
+    assert cache.get_counters()["entries"] == 1
+    assert cache.get("eterna") == 3
+    assert cache.get_counters()["expirations"] == 2
+    assert cache._memory_usage == cache.get_counters()["memory_bytes"] > 0
+
+
+def test_smart_cache_regravar_cancela_o_prazo_antigo(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(modulo_cache, "time", relogio)
+    cache = SmartCache(max_memory_mb=1, default_ttl=10)
+
+    cache.set("k", "v1", ttl=2)
+    cache.set("k", "v2", ttl=100)
+    relogio.agora += 5
+    cache.cleanup_expired()
+    assert cache.get("k") == "v2"
+
+
+def test_estado_ip_expira_e_renova():
+    inicio = time.time()
+    tabela = TabelaEstadoIP(capacidade=100, ttl=60)
+    tabela.obter("10.0.0.1", inicio)
+    tabela.obter("10.0.0.2", inicio)
+
+    # Renovado em t+50: vence só em t+110
+    tabela.obter("10.0.0.2", inicio + 50)
+    tabela.obter("10.0.0.3", inicio + 61)
+    assert len(tabela) == 2
+    assert tabela.expirados == 1
+
+    tabela.obter("10.0.0.3", inicio + 100)
+    tabela.obter("10.0.0.4", inicio + 111)
+    ips = {estado.ip for estado in tabela}
+    assert ips == {"10.0.0.3", "10.0.0.4"}
+    assert tabela.expirados == 2
+
+
+def test_estado_ip_descartado_por_capacidade_sai_do_wheel():
+    inicio = time.time()
+    tabela = TabelaEstadoIP(capacidade=2, ttl=60)
+    for i in range(5):
+        tabela.obter(f"10.0.0.{i}", inicio)
+    assert len(tabela) == 2
+    assert tabela.descartados == 3
+    assert len(tabela._wheel) == 2
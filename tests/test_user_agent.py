@@ -0,0 +1,44 @@
+import random
+
+from app.middleware.user_agent import (
+    PADROES_ALTO_RISCO,
+    VEREDITO_BOT,
+    VEREDITO_NAVEGADOR,
+    VEREDITO_SCANNER,
+    _TERMOS,
+    _termos_encontrados,
+    classificar_user_agent,
+)
+
+
+def _por_substring(ua: str):
+    return frozenset(t for t in _TERMOS if t in ua)
+
+
+def test_regex_igual_a_busca_por_substring():
+    rnd = random.Random(40)
+    pedacos = list(_TERMOS) + ["a", " ", "/", "x", ";", "5.0", "("]
+    for _ in range(20_000):
+        ua = "".join(rnd.choice(pedacos)[: rnd.randint(1, 12)] for _ in range(rnd.randint(0, 15)))
+        assert _termos_encontrados(ua) == _por_substring(ua), ua
+
+
+def test_termos_sobrepostos_e_prefixos():
+    assert _termos_encontrados("googlebot/2.1") >= {"googlebot", "bot"}
+    assert _termos_encontrados("python-requests/2.31") >= {"python-requests"}
+    assert _termos_encontrados("curl/8.0") >= {"curl", "curl/"}
+
+
+def test_vereditos():
+    navegador = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36"
+    assert classificar_user_agent(navegador).veredito == VEREDITO_NAVEGADOR
+    assert classificar_user_agent("sqlmap/1.7").veredito == VEREDITO_SCANNER
+    perfil = classificar_user_agent("curl/8.0")
+    assert perfil.veredito == VEREDITO_BOT
+    assert perfil.alto_risco in PADROES_ALTO_RISCO
+    assert classificar_user_agent("Googlebot/2.1").alto_risco == ""
+
+
+def test_ua_longo_classificado_sem_cache():
+    ua = "Mozilla/5.0 " + "x" * 1000 + " nikto"
+    assert classificar_user_agent(ua).veredito == VEREDITO_SCANNER